@@ -11,16 +11,25 @@ class VoucherCategoryAdmin(admin.ModelAdmin):
 
 @admin.register(Voucher)
 class VoucherAdmin(admin.ModelAdmin):
-    list_display = ('title', 'category', 'points', 'discount_percentage', 'rating', 'featured', 'is_active')
+    list_display = ('title', 'category', 'points', 'discount_percentage', 'rating', 'featured', 'is_active', 'stock_shard_count')
     list_filter = ('category', 'featured', 'is_active', 'created_at')
     search_fields = ('title', 'description')
     list_editable = ('featured', 'is_active')
+    readonly_fields = ('stock_shard_count',)
+
+    def get_readonly_fields(self, request, obj=None):
+        # Sharded stock lives in the shards; change it with the rebalance_stock command
+        if obj is not None and obj.stock_shard_count > 0:
+            return self.readonly_fields + ('quantity_available',)
+        return self.readonly_fields
 
 @admin.register(UserProfile)
 class UserProfileAdmin(admin.ModelAdmin):
     list_display = ('user', 'points', 'created_at', 'updated_at')
     search_fields = ('user__email', 'user__first_name', 'user__last_name')
     list_filter = ('created_at', 'updated_at')
+    # Balances change only through the points ledger (accounts.points)
+    readonly_fields = ('points',)
 
 @admin.register(Cart)
 class CartAdmin(admin.ModelAdmin):
@@ -0,0 +1,244 @@
+"""
+Per-voucher admission control for redemptions.
+
+When a popular voucher goes live, most concurrent redemptions would fail
+after doing all of their database work. Each worker process keeps a small
+gate per voucher that decides, in memory, whether a redemption may reach
+the database at all:
+
+* A request for more units than the catalog snapshot still lists is
+  rejected as sold out. The snapshot is rebuilt on every voucher save and
+  whenever stock runs out, and stock only goes down between rebuilds, so
+  it never under-states what is left.
+* At most ``MAX_CONCURRENT`` redemptions of one voucher run at a time.
+* New redemptions are admitted at ``RATE`` per second with bursts of up to
+  ``BURST`` (a token bucket).
+
+Clients that are turned away can join a waiting room: ``join`` hands out a
+signed ticket holding a place in the voucher's queue, ``status`` reports
+the ticket's position, and tickets are admitted in order as tokens become
+available. An admitted ticket lets one redemption skip the token bucket;
+it lapses if it is not spent within ``ADMITTED_TICKET_TTL`` seconds. Each
+user holds at most one live ticket per voucher, and joining again returns
+it, so one client cannot fill the queue. While anyone is waiting,
+redemptions without an admitted ticket are queued behind them.
+
+Only vouchers in the catalog snapshot (active ones) get a gate; any other
+id is answered with ``not_found`` before a gate or ticket is created, so
+unknown ids cannot grow a worker's memory. Gates are per process. A ticket records the process that issued it, and a
+ticket presented to another worker is reported as ``expired`` so the
+client can join again there.
+"""
+import threading
+import time
+import uuid
+from typing import NamedTuple
+
+from django.core import signing
+
+from accounts import catalog
+
+RATE = 20.0
+BURST = 20
+MAX_CONCURRENT = 8
+TICKET_MAX_AGE = 600
+# An admitted ticket not spent within this many seconds lapses
+ADMITTED_TICKET_TTL = 30
+RETRY_AFTER_SECONDS = 1
+
+ADMITTED = 'admitted'
+WAITING = 'waiting'
+BUSY = 'busy'
+SOLD_OUT = 'sold_out'
+EXPIRED = 'expired'
+NOT_FOUND = 'not_found'
+
+_SALT = 'accounts.admission'
+# Identifies this process's gates inside the tickets it signs
+_EPOCH = uuid.uuid4().hex
+
+
+class Decision(NamedTuple):
+    """Outcome of asking a gate for admission."""
+    status: str
+    position: int = 0
+
+    @property
+    def admitted(self) -> bool:
+        return self.status == ADMITTED
+
+
+class _Gate:
+    """Token bucket, concurrency cap and ticket queue for one voucher."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tokens = float(BURST)
+        self.refilled_at = time.monotonic()
+        self.in_flight = 0
+        self.issued = 0
+        self.served = 0
+        # Admitted tickets not yet spent on a redemption, oldest first: number -> admitted at
+        self.admitted_at = {}
+        # Live tickets (waiting, or admitted and unspent): user id -> number, and back
+        self.holders = {}
+        self.owners = {}
+
+    def _retire(self, ticket: int) -> None:
+        self.admitted_at.pop(ticket, None)
+        user_id = self.owners.pop(ticket, None)
+        if self.holders.get(user_id) == ticket:
+            del self.holders[user_id]
+
+    def _advance(self) -> None:
+        """Refill the bucket, admit waiting tickets in order and lapse unspent ones."""
+        now = time.monotonic()
+        self.tokens = min(float(BURST), self.tokens + (now - self.refilled_at) * RATE)
+        self.refilled_at = now
+        while self.served < self.issued and self.tokens >= 1:
+            self.served += 1
+            self.tokens -= 1
+            self.admitted_at[self.served] = now
+        for ticket, admitted_at in list(self.admitted_at.items()):
+            if now - admitted_at < ADMITTED_TICKET_TTL:
+                break
+            self._retire(ticket)
+
+    def _live(self, ticket: int) -> bool:
+        return ticket > self.served or ticket in self.admitted_at
+
+    def join(self, user_id: str) -> int:
+        """Issue a ticket to ``user_id``, or return the live one they already hold."""
+        with self.lock:
+            self._advance()
+            ticket = self.holders.get(user_id)
+            if ticket is None:
+                self.issued += 1
+                ticket = self.issued
+                self.holders[user_id] = ticket
+                self.owners[ticket] = user_id
+                self._advance()
+            return ticket
+
+    def position(self, ticket: int) -> int | None:
+        """Tickets still ahead of ``ticket``; 0 once it is admitted, None once spent or lapsed."""
+        with self.lock:
+            self._advance()
+            if not self._live(ticket):
+                return None
+            return max(0, ticket - self.served)
+
+    def enter(self, ticket: int | None) -> Decision:
+        with self.lock:
+            self._advance()
+            if ticket is not None and not self._live(ticket):
+                return Decision(EXPIRED)
+            if ticket is not None and ticket > self.served:
+                return Decision(WAITING, ticket - self.served)
+            if self.in_flight >= MAX_CONCURRENT:
+                return Decision(BUSY)
+            if ticket is None:
+                if self.served < self.issued:
+                    return Decision(WAITING, self.issued - self.served + 1)
+                if self.tokens < 1:
+                    return Decision(BUSY)
+                self.tokens -= 1
+            else:
+                self._retire(ticket)
+            self.in_flight += 1
+            return Decision(ADMITTED)
+
+    def leave(self) -> None:
+        with self.lock:
+            self.in_flight -= 1
+
+
+_gates = {}
+_gates_lock = threading.Lock()
+
+
+def _gate(voucher_id: int) -> _Gate:
+    gate = _gates.get(voucher_id)
+    if gate is None:
+        with _gates_lock:
+            gate = _gates.setdefault(voucher_id, _Gate())
+    return gate
+
+
+def reset() -> None:
+    """Forget every gate in this process (tests, or after a config change)."""
+    with _gates_lock:
+        _gates.clear()
+
+
+def _refusal(voucher_id: int, quantity: int = 1) -> Decision | None:
+    """NOT_FOUND for vouchers outside the catalog snapshot, SOLD_OUT if it lists too few units, else None."""
+    entry = catalog.get_catalog().by_id.get(voucher_id)
+    if entry is None:
+        return Decision(NOT_FOUND)
+    if entry.card['quantity_available'] < quantity:
+        return Decision(SOLD_OUT)
+    return None
+
+
+def join(voucher_id: int, user_id: str) -> tuple[str, Decision]:
+    """Take ``user_id``'s place in the voucher's waiting room; return the signed ticket and its state."""
+    refusal = _refusal(voucher_id)
+    if refusal is not None:
+        return '', refusal
+    gate = _gate(voucher_id)
+    number = gate.join(user_id)
+    ticket = signing.dumps({'v': voucher_id, 'n': number, 'u': user_id, 'e': _EPOCH}, salt=_SALT)
+    position = gate.position(number)
+    return ticket, Decision(ADMITTED if position == 0 else WAITING, position or 0)
+
+
+def _ticket_number(voucher_id: int, ticket: str, user_id: str | None) -> int | None:
+    """The queue number inside ``ticket``, or None if it is not valid here or not ``user_id``'s."""
+    try:
+        payload = signing.loads(ticket, salt=_SALT, max_age=TICKET_MAX_AGE)
+    except signing.BadSignature:
+        return None
+    if payload.get('v') != voucher_id or payload.get('e') != _EPOCH or payload.get('u') != user_id:
+        return None
+    return payload.get('n')
+
+
+def status(voucher_id: int, ticket: str, user_id: str) -> Decision:
+    """Report where ``user_id``'s ``ticket`` stands in the voucher's waiting room."""
+    number = _ticket_number(voucher_id, ticket, user_id)
+    if number is None:
+        return Decision(EXPIRED)
+    refusal = _refusal(voucher_id)
+    if refusal is not None:
+        return refusal
+    position = _gate(voucher_id).position(number)
+    if position is None:
+        return Decision(EXPIRED)
+    return Decision(ADMITTED if position == 0 else WAITING, position)
+
+
+def enter(voucher_id: int, quantity: int = 1, ticket: str | None = None, user_id: str | None = None) -> Decision:
+    """
+    Ask to start a redemption of ``quantity`` units of ``voucher_id``.
+
+    A ``ticket`` is only honoured for the user it was issued to. An
+    admitted decision must be paired with a call to ``leave`` once the
+    redemption has finished, whether it succeeded or not.
+    """
+    refusal = _refusal(voucher_id, quantity)
+    if refusal is not None:
+        return refusal
+    number = None
+    if ticket:
+        number = _ticket_number(voucher_id, ticket, user_id)
+        if number is None:
+            return Decision(EXPIRED)
+    return _gate(voucher_id).enter(number)
+
+
+def leave(voucher_id: int) -> None:
+    """Release the concurrency slot taken by an admitted ``enter``."""
+    gate = _gates.get(voucher_id)
+    if gate is not None:
+        gate.leave()
@@ -0,0 +1,255 @@
+"""
+Cart read model and mutations.
+
+Each Cart row carries a running ``total_points`` (at list price) and
+``item_count``. Every mutation in this module adjusts them in the same
+transaction with an F-expression update, so the totals are available
+without loading the items. Reading a cart for display loads the cart, its
+items and their vouchers in one LEFT JOIN query. It also prices each line
+under the active promotion, and repairs the running totals if they have
+drifted, e.g. after a voucher's price changed or a voucher was deleted.
+"""
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from accounts.models import Cart, CartItem, Voucher
+
+
+def get_cart(user) -> Cart:
+    """Get or create the cart for ``user``."""
+    cart, _ = Cart.objects.get_or_create(user=user)
+    return cart
+
+
+def _adjust(cart_id: int, points_delta: int, count_delta: int) -> None:
+    Cart.objects.filter(id=cart_id).update(
+        total_points=F('total_points') + points_delta,
+        item_count=F('item_count') + count_delta,
+        updated_at=timezone.now(),
+    )
+
+
+def add_item(cart: Cart, voucher, quantity: int) -> CartItem:
+    """Add ``quantity`` of ``voucher`` to the cart, merging with an existing line."""
+    with transaction.atomic():
+        item, created = CartItem.objects.get_or_create(cart=cart, voucher=voucher, defaults={'quantity': quantity})
+        if not created:
+            CartItem.objects.filter(id=item.id).update(quantity=F('quantity') + quantity)
+            item.quantity += quantity
+        _adjust(cart.id, quantity * voucher.points, quantity)
+    return item
+
+
+def set_quantity(item: CartItem, quantity: int) -> None:
+    """Change a line's quantity."""
+    delta = quantity - item.quantity
+    with transaction.atomic():
+        CartItem.objects.filter(id=item.id).update(quantity=quantity)
+        _adjust(item.cart_id, delta * item.voucher.points, delta)
+    item.quantity = quantity
+
+
+def remove_item(item: CartItem) -> None:
+    """Delete a line from its cart."""
+    with transaction.atomic():
+        CartItem.objects.filter(id=item.id).delete()
+        _adjust(item.cart_id, -item.quantity * item.voucher.points, -item.quantity)
+
+
+def clear(cart: Cart) -> None:
+    """Remove every line and reset the running totals."""
+    with transaction.atomic():
+        CartItem.objects.filter(cart=cart).delete()
+        Cart.objects.filter(id=cart.id).update(total_points=0, item_count=0, updated_at=timezone.now())
+
+
+READ_FIELDS = (
+    'id', 'total_points', 'item_count', 'created_at', 'updated_at',
+    'items__id', 'items__quantity', 'items__added_at',
+    'items__voucher__id', 'items__voucher__title', 'items__voucher__points',
+    'items__voucher__image_url', 'items__voucher__category_id',
+)
+
+
+def read_cart(user, price=None) -> dict:
+    """
+    Return the cart for display, loaded with one joined query.
+
+    ``price(points, category_id)`` returns a voucher's promotion-adjusted
+    points; without it effective totals equal list totals.
+    """
+    rows = list(
+        Cart.objects.filter(user=user)
+        .values(*READ_FIELDS)
+        .order_by('items__added_at', 'items__id')
+    )
+    if not rows:
+        cart = get_cart(user)
+        rows = [{
+            'id': cart.id, 'total_points': 0, 'item_count': 0,
+            'created_at': cart.created_at, 'updated_at': cart.updated_at, 'items__id': None,
+        }]
+
+    head = rows[0]
+    items = []
+    total_points = item_count = effective_total = 0
+    for row in rows:
+        if row['items__id'] is None:
+            continue
+        quantity = row['items__quantity']
+        points = row['items__voucher__points']
+        effective = price(points, row['items__voucher__category_id']) if price else points
+        total_points += quantity * points
+        effective_total += quantity * effective
+        item_count += quantity
+        items.append({
+            'id': row['items__id'],
+            'voucher': {
+                'id': row['items__voucher__id'],
+                'title': row['items__voucher__title'],
+                'points': points,
+                'effective_points': effective,
+                'image_url': row['items__voucher__image_url'],
+            },
+            'quantity': quantity,
+            'added_at': row['items__added_at'].isoformat(),
+        })
+
+    if (head['total_points'], head['item_count']) != (total_points, item_count):
+        # Prices or lines changed outside this module; repair the running totals
+        Cart.objects.filter(id=head['id']).update(total_points=total_points, item_count=item_count)
+
+    return {
+        'id': head['id'],
+        'items': items,
+        'item_count': item_count,
+        'total_points': total_points,
+        'effective_total_points': effective_total,
+        'created_at': head['created_at'].isoformat(),
+        'updated_at': head['updated_at'].isoformat(),
+    }
+
+
+class CartBatchError(Exception):
+    """An operation in a cart batch is invalid; the whole batch is rejected."""
+
+    def __init__(self, message: str, index: int = None):
+        super().__init__(message)
+        self.message = message
+        self.index = index
+
+
+BATCH_OPS = ('add', 'set', 'remove')
+
+
+def _positive_int(value, index: int) -> int:
+    if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+        raise CartBatchError('quantity must be a positive integer', index)
+    return value
+
+
+def _parse_operations(operations) -> list:
+    """Validate the request body into ``(op, voucher_id, item_id, quantity)`` tuples."""
+    if not isinstance(operations, list) or not operations:
+        raise CartBatchError('operations must be a non-empty list')
+    parsed = []
+    for index, operation in enumerate(operations):
+        if not isinstance(operation, dict) or operation.get('op') not in BATCH_OPS:
+            raise CartBatchError(f"op must be one of {', '.join(BATCH_OPS)}", index)
+        op = operation['op']
+        voucher_id, item_id = operation.get('voucher_id'), operation.get('item_id')
+        if op == 'add' and item_id is not None:
+            raise CartBatchError('add takes voucher_id, not item_id', index)
+        if (voucher_id is None) == (item_id is None):
+            raise CartBatchError('Exactly one of voucher_id or item_id is required', index)
+        for value in (voucher_id, item_id):
+            if value is not None and (isinstance(value, bool) or not isinstance(value, int)):
+                raise CartBatchError('voucher_id and item_id must be integers', index)
+        quantity = None
+        if op == 'add':
+            quantity = _positive_int(operation.get('quantity', 1), index)
+        elif op == 'set':
+            quantity = _positive_int(operation.get('quantity'), index)
+        parsed.append((op, voucher_id, item_id, quantity))
+    return parsed
+
+
+def apply_batch(user, operations) -> int:
+    """
+    Apply an ordered list of cart operations atomically.
+
+    Each operation is ``{'op': 'add', 'voucher_id', 'quantity'}``,
+    ``{'op': 'set', 'voucher_id' | 'item_id', 'quantity'}`` or
+    ``{'op': 'remove', 'voucher_id' | 'item_id'}``. Operations are applied
+    in memory against the cart's lines and the vouchers they touch, which
+    are loaded in one query, so every stock check sees the result of the
+    operations before it. The lines are then written with at most one
+    delete, one bulk insert and one bulk update, and the running totals
+    with one cart update.
+
+    Raises CartBatchError, leaving the cart unchanged, if any operation is
+    invalid. Returns the number of units added.
+    """
+    parsed = _parse_operations(operations)
+    with transaction.atomic():
+        # Locking the cart row serializes concurrent batches for one user
+        cart, _ = Cart.objects.select_for_update().get_or_create(user=user)
+        lines, stale, folded = {}, [], set()
+        for item in CartItem.objects.filter(cart=cart).order_by('added_at', 'id'):
+            if item.voucher_id in lines:
+                # Fold duplicate lines for one voucher into the first
+                lines[item.voucher_id].quantity += item.quantity
+                stale.append(item.id)
+                folded.add(item.voucher_id)
+            else:
+                lines[item.voucher_id] = item
+        by_item_id = {item.id: voucher_id for voucher_id, item in lines.items()}
+        voucher_ids = set(lines) | {voucher_id for _, voucher_id, _, _ in parsed if voucher_id is not None}
+        vouchers = Voucher.objects.in_bulk(list(voucher_ids))
+
+        quantities = {voucher_id: item.quantity for voucher_id, item in lines.items()}
+        added = 0
+        for index, (op, voucher_id, item_id, quantity) in enumerate(parsed):
+            if item_id is not None:
+                if item_id not in by_item_id:
+                    raise CartBatchError('Cart item not found', index)
+                voucher_id = by_item_id[item_id]
+            voucher = vouchers.get(voucher_id)
+            if op == 'remove':
+                if voucher_id not in quantities:
+                    raise CartBatchError('Cart item not found', index)
+                del quantities[voucher_id]
+                continue
+            if voucher is None or (op == 'add' and not voucher.is_active):
+                raise CartBatchError('Voucher not found', index)
+            if op == 'set' and voucher_id not in quantities:
+                raise CartBatchError('Cart item not found', index)
+            new_quantity = quantities.get(voucher_id, 0) + quantity if op == 'add' else quantity
+            if voucher.quantity_available < new_quantity:
+                raise CartBatchError(f'Insufficient quantity available for {voucher.title}', index)
+            quantities[voucher_id] = new_quantity
+            if op == 'add':
+                added += quantity
+
+        removed = stale + [item.id for voucher_id, item in lines.items() if voucher_id not in quantities]
+        created, changed = [], []
+        for voucher_id, quantity in quantities.items():
+            item = lines.get(voucher_id)
+            if item is None:
+                created.append(CartItem(cart=cart, voucher_id=voucher_id, quantity=quantity))
+            elif item.quantity != quantity or voucher_id in folded:
+                item.quantity = quantity
+                changed.append(item)
+        if removed:
+            CartItem.objects.filter(id__in=removed).delete()
+        if created:
+            CartItem.objects.bulk_create(created)
+        if changed:
+            CartItem.objects.bulk_update(changed, ['quantity'])
+        Cart.objects.filter(id=cart.id).update(
+            total_points=sum(quantity * vouchers[voucher_id].points for voucher_id, quantity in quantities.items()),
+            item_count=sum(quantities.values()),
+            updated_at=timezone.now(),
+        )
+    return added
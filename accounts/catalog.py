@@ -0,0 +1,170 @@
+"""
+Process-local, immutable snapshot of the active voucher catalog.
+
+Every worker keeps one snapshot of pre-serialized voucher cards and
+categories, tagged with the catalog version stamp it was built from.
+Reads cost a single stamp lookup; the snapshot is rebuilt lazily (two
+queries) only after a Voucher, VoucherCategory or Promotion change has
+bumped the stamp.
+
+Listings may ask for a subset of card fields (``fields=``) or the
+predefined ``card`` projection, which omits the long description and terms
+text. The ``card`` projection is pre-built alongside each full card so
+serving it costs no per-request key filtering.
+"""
+import threading
+from datetime import datetime
+from types import MappingProxyType
+from typing import Any, Mapping, NamedTuple
+
+from accounts import versioning
+from accounts.models import Voucher, VoucherCategory
+
+# Every key of a full voucher card, in response order
+CARD_FIELDS = (
+    'id', 'title', 'category', 'points', 'original_points', 'discount', 'rating',
+    'image_url', 'description', 'terms', 'quantity_available', 'featured', 'created_at',
+)
+# Lean projection for grid/list views: no long text columns
+PROJECTIONS = {
+    'full': CARD_FIELDS,
+    'card': tuple(field for field in CARD_FIELDS if field not in ('description', 'terms')),
+}
+
+
+class FieldSelectionError(ValueError):
+    """Raised for an unknown ``view`` or ``fields`` query parameter."""
+
+
+class CatalogEntry(NamedTuple):
+    """A catalog voucher plus the raw fields needed to filter and price it."""
+    id: int
+    category_id: int
+    category_name: str
+    points: int
+    featured: bool
+    created_at: datetime
+    card: Mapping[str, Any]
+    lean_card: Mapping[str, Any]
+
+    @property
+    def sort_key(self) -> tuple:
+        """Key of the catalog ordering (-featured, -created_at, -id)."""
+        return (self.featured, self.created_at, self.id)
+
+    def project(self, fields: tuple | None = None) -> dict:
+        """Return a mutable copy of the card restricted to ``fields`` (None for all)."""
+        if fields is None or fields == CARD_FIELDS:
+            return dict(self.card)
+        if fields == PROJECTIONS['card']:
+            return dict(self.lean_card)
+        card = self.card
+        return {field: card[field] for field in fields}
+
+
+class CatalogSnapshot(NamedTuple):
+    """Immutable view of the active catalog at one version stamp."""
+    stamp: str
+    entries: tuple
+    by_id: Mapping[int, CatalogEntry]
+    categories: tuple
+
+
+def parse_fields(view: str | None = None, fields: str | None = None) -> tuple | None:
+    """
+    Resolve the ``view`` and ``fields`` query parameters into card fields.
+
+    Returns None for the full card. ``fields`` is a comma-separated list
+    of card keys; ``id`` is always included so clients can key the rows.
+    """
+    if fields:
+        requested = {field.strip() for field in fields.split(',') if field.strip()}
+        unknown = requested.difference(CARD_FIELDS)
+        if unknown:
+            raise FieldSelectionError(f"Unknown fields: {', '.join(sorted(unknown))}")
+        requested.add('id')
+        return tuple(field for field in CARD_FIELDS if field in requested)
+    if view:
+        if view not in PROJECTIONS:
+            raise FieldSelectionError(f"Unknown view '{view}'; expected one of {', '.join(PROJECTIONS)}")
+        return PROJECTIONS[view] if view != 'full' else None
+    return None
+
+
+_snapshot = None
+_lock = threading.Lock()
+
+
+def _build_snapshot(stamp: str) -> CatalogSnapshot:
+    """Load every active voucher and category and freeze them into a snapshot."""
+    rows = (
+        Voucher.objects.filter(is_active=True)
+        .order_by('-featured', '-created_at', '-id')
+        .values(
+            'id', 'title', 'category_id', 'category__name', 'points', 'original_points',
+            'discount_percentage', 'rating', 'image_url', 'description', 'terms',
+            'quantity_available', 'featured', 'created_at',
+        )
+    )
+    entries = []
+    for row in rows:
+        card = MappingProxyType({
+            'id': row['id'],
+            'title': row['title'],
+            'category': row['category__name'],
+            'points': row['points'],
+            'original_points': row['original_points'],
+            'discount': f"{row['discount_percentage']}% off",
+            'rating': row['rating'],
+            'image_url': row['image_url'],
+            'description': row['description'],
+            'terms': row['terms'],
+            # Stock as of this build. It only goes down until the next rebuild, so it
+            # never under-states what is left: the admission gate may use it to turn
+            # away requests that cannot succeed, but listings overlay live stock.
+            'quantity_available': row['quantity_available'],
+            'featured': row['featured'],
+            'created_at': row['created_at'].isoformat(),
+        })
+        lean_card = MappingProxyType({field: card[field] for field in PROJECTIONS['card']})
+        entries.append(CatalogEntry(
+            id=row['id'],
+            category_id=row['category_id'],
+            category_name=row['category__name'] or '',
+            points=row['points'],
+            featured=row['featured'],
+            created_at=row['created_at'],
+            card=card,
+            lean_card=lean_card,
+        ))
+
+    categories = tuple(
+        MappingProxyType({'id': cat.id, 'name': cat.name, 'icon': cat.icon})
+        for cat in VoucherCategory.objects.all()
+    )
+    return CatalogSnapshot(
+        stamp=stamp,
+        entries=tuple(entries),
+        by_id=MappingProxyType({entry.id: entry for entry in entries}),
+        categories=categories,
+    )
+
+
+def get_catalog() -> CatalogSnapshot:
+    """Return the current catalog snapshot, rebuilding it if the stamp moved."""
+    global _snapshot
+    stamp = versioning.get_stamp(versioning.CATALOG)
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.stamp == stamp:
+        return snapshot
+    with _lock:
+        if _snapshot is None or _snapshot.stamp != stamp:
+            _snapshot = _build_snapshot(stamp)
+        return _snapshot
+
+
+def invalidate() -> None:
+    """Drop this process's snapshot and bump the shared stamp for all workers."""
+    global _snapshot
+    versioning.bump(versioning.CATALOG)
+    _snapshot = None
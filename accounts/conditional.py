@@ -0,0 +1,147 @@
+"""
+Conditional GET support for read-mostly API endpoints.
+
+``conditional_etag`` derives a strong ETag from the data version stamps an
+endpoint depends on (plus the request path and query string, and the active
+promotion window for promotion-priced payloads). A request whose
+``If-None-Match`` matches is answered with 304 Not Modified before the view
+runs; the stamps come from the cache, so no ORM query is made. Successful
+responses get ``ETag``, ``Last-Modified`` and ``Cache-Control`` headers.
+With a per-process cache, a worker's ETags can lag a data change by up to
+``DATA_VERSION_CACHE_SECONDS`` (see ``accounts.versioning``). Payloads that
+include data no stamp tracks, such as live stock levels, pass ``live_key``;
+it runs on every request, so those endpoints pay its query even for a 304.
+
+Apply it beneath ``@api_view``/``@permission_classes`` so authentication
+and permission checks still run first::
+
+    @api_view(['GET'])
+    @permission_classes([AllowAny])
+    @conditional_etag(versioning.CATALOG)
+    def category_list(request):
+        ...
+
+``versioned_page_cache`` is the HTML counterpart: it stores whole rendered
+pages for anonymous visitors under a key that includes the same stamps, so
+a data change retires every cached copy without explicit deletes.
+"""
+import functools
+import hashlib
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+from accounts import promotions, versioning
+
+
+def _promotion_key(request, stamp: str) -> str:
+    """Identify the promotion window active for the request's timezone."""
+    window = promotions.resolve(request.query_params.get('tz'), stamp=stamp or None)
+    if window is None:
+        return 'none'
+    return f'{window.promotion_id}:{window.name}:{window.discount_percentage}:{window.start_time}:{window.end_time}'
+
+
+def compute_etag(request, versions: list, promotion_key: str = '') -> str:
+    """Build a strong ETag for ``request`` at the given data versions."""
+    digest = hashlib.sha256()
+    digest.update(request.path.encode())
+    digest.update(b'?')
+    digest.update('&'.join(sorted(request.GET.urlencode().split('&'))).encode())
+    for info in versions:
+        digest.update(b'|')
+        digest.update(info.stamp.encode())
+    digest.update(b'|')
+    digest.update(promotion_key.encode())
+    return f'"{digest.hexdigest()[:32]}"'
+
+
+def _matches(request, etag: str) -> bool:
+    header = request.META.get('HTTP_IF_NONE_MATCH')
+    if not header:
+        return False
+    candidates = parse_etags(header)
+    return '*' in candidates or etag in candidates or f'W/{etag}' in candidates
+
+
+def conditional_etag(*version_names, promotion_aware: bool = False, max_age=0, private: bool = False,
+                     live_key=None):
+    """
+    Decorate a view so it answers If-None-Match with 304 and sets validators.
+
+    ``version_names`` are versioning stamp names the payload depends on.
+    ``promotion_aware`` adds the active promotion window (for ``?tz=``) to the
+    ETag. ``max_age`` is a number of seconds or a callable taking the request.
+    ``private`` marks responses for authenticated users as uncacheable by
+    shared caches. ``live_key`` is a callable taking the request and
+    returning a string that changes whenever untracked data in the payload does.
+    """
+    names = tuple(version_names) + ((versioning.PROMOTIONS,) if promotion_aware else ())
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            versions = [versioning.get_version(name) for name in names]
+            promotion_key = ''
+            if promotion_aware:
+                promotion_key = _promotion_key(request, versions[-1].stamp)
+            if live_key is not None:
+                promotion_key = f'{promotion_key}|{live_key(request)}'
+            etag = compute_etag(request, versions, promotion_key)
+            modified = [info.updated_at for info in versions if info.updated_at]
+
+            if _matches(request, etag):
+                response = Response(status=status.HTTP_304_NOT_MODIFIED)
+            else:
+                response = view(request, *args, **kwargs)
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+
+            response['ETag'] = etag
+            if modified:
+                response['Last-Modified'] = http_date(max(modified).timestamp())
+            cache_kwargs = {'private': True} if private else {'public': True}
+            seconds = max_age(request) if callable(max_age) else max_age
+            patch_cache_control(response, max_age=seconds, must_revalidate=True, **cache_kwargs)
+            return response
+        return wrapper
+    return decorator
+
+
+def versioned_page_cache(*version_names, timeout: int = 300):
+    """
+    Cache a plain Django view's full response for anonymous GET requests.
+
+    The cache key combines the request path and query with the current
+    stamps of ``version_names``, so entries expire as soon as the data they
+    were rendered from changes. Authenticated requests bypass the cache.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            user = getattr(request, 'user', None)
+            if request.method not in ('GET', 'HEAD') or (user is not None and user.is_authenticated):
+                return view(request, *args, **kwargs)
+
+            stamps = '|'.join(versioning.get_version(name).stamp for name in version_names)
+            digest = hashlib.sha256(f'{request.get_full_path()}|{stamps}'.encode()).hexdigest()
+            key = f'page:{view.__module__}.{view.__name__}:{digest[:32]}'
+            cached = cache.get(key)
+            if cached is not None:
+                content, content_type = cached
+                response = HttpResponse(content, content_type=content_type)
+                response['X-Page-Cache'] = 'hit'
+            else:
+                response = view(request, *args, **kwargs)
+                if response.status_code != status.HTTP_200_OK or getattr(response, 'streaming', False):
+                    return response
+                cache.set(key, (response.content, response['Content-Type']), timeout)
+                response['X-Page-Cache'] = 'miss'
+            patch_vary_headers(response, ('Cookie',))
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,104 @@
+"""
+Collision-free coupon code allocation.
+
+Codes are encoded from a database counter instead of being drawn at random
+and probed for uniqueness. Allocating ``n`` codes reserves ``n`` counter
+values with one conditional ``UPDATE`` (so concurrent checkouts get
+disjoint ranges), then encodes each value locally:
+
+* the 45-bit value is scrambled by a fixed bijection, so consecutive
+  coupons do not look consecutive;
+* the result is written as 9 Crockford base32 symbols;
+* a check symbol is appended, giving a 10-character code.
+
+Because the scramble is a bijection and the counter never repeats, codes
+are unique without any existence query. Codes are 10 characters while
+legacy random codes are 8, so the two can never collide.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from accounts.models import CouponSequence
+
+SEQUENCE_NAME = 'coupon'
+
+# Crockford base32: no I, L, O or U
+ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+SYMBOL_VALUES = {symbol: value for value, symbol in enumerate(ALPHABET)}
+# Look-alike letters accepted when validating user input
+ALIASES = {'O': '0', 'I': '1', 'L': '1'}
+
+VALUE_BITS = 45
+VALUE_SYMBOLS = VALUE_BITS // 5
+VALUE_MASK = (1 << VALUE_BITS) - 1
+CODE_LENGTH = VALUE_SYMBOLS + 1
+
+# Odd multipliers make each multiply a bijection modulo 2**45
+_MULTIPLIERS = (0x1B873593A2F1, 0x0D2B74407B1D)
+_SHIFTS = (23, 19)
+
+# Check symbol modulus; prime, so every single-symbol substitution that is
+# not 0<->Z, and every adjacent transposition, changes the check symbol
+CHECK_MODULUS = 31
+
+
+def _scramble(value: int) -> int:
+    """Bijectively mix a counter value within the 45-bit space."""
+    for multiplier, shift in zip(_MULTIPLIERS, _SHIFTS):
+        value = (value * multiplier) & VALUE_MASK
+        value ^= value >> shift
+    return value
+
+
+def _check_symbol(symbols: str) -> str:
+    total = sum((position + 1) * SYMBOL_VALUES[symbol] for position, symbol in enumerate(symbols))
+    return ALPHABET[total % CHECK_MODULUS]
+
+
+def encode(value: int) -> str:
+    """Encode a counter value as a 10-character coupon code."""
+    if not 0 <= value <= VALUE_MASK:
+        raise ValueError(f'Coupon sequence value out of range: {value}')
+    scrambled = _scramble(value)
+    symbols = ''.join(
+        ALPHABET[(scrambled >> (5 * (VALUE_SYMBOLS - 1 - index))) & 31]
+        for index in range(VALUE_SYMBOLS)
+    )
+    return symbols + _check_symbol(symbols)
+
+
+def normalize(code: str) -> str:
+    """Upper-case a user-entered code, drop separators and map look-alike letters."""
+    cleaned = (code or '').strip().upper().replace('-', '').replace(' ', '')
+    return ''.join(ALIASES.get(symbol, symbol) for symbol in cleaned)
+
+
+def is_valid(code: str) -> bool:
+    """Return True if ``code`` is a well-formed allocator code with a matching check symbol."""
+    code = normalize(code)
+    if len(code) != CODE_LENGTH or any(symbol not in SYMBOL_VALUES for symbol in code):
+        return False
+    return _check_symbol(code[:-1]) == code[-1]
+
+
+def reserve(count: int, name: str = SEQUENCE_NAME) -> range:
+    """Reserve ``count`` consecutive counter values and return them."""
+    if count < 1:
+        return range(0)
+    with transaction.atomic():
+        updated = CouponSequence.objects.filter(name=name).update(next_value=F('next_value') + count)
+        if not updated:
+            try:
+                with transaction.atomic():
+                    CouponSequence.objects.create(name=name, next_value=1 + count)
+                return range(1, 1 + count)
+            except IntegrityError:
+                # Another worker created the row first
+                CouponSequence.objects.filter(name=name).update(next_value=F('next_value') + count)
+        end = CouponSequence.objects.filter(name=name).values_list('next_value', flat=True).get()
+    return range(end - count, end)
+
+
+def allocate(count: int) -> list:
+    """Return ``count`` new, unique coupon codes."""
+    return [encode(value) for value in reserve(count)]
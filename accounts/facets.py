@@ -0,0 +1,129 @@
+"""
+Facet counts for the voucher catalog sidebar.
+
+All facets (per category, per promotion-adjusted points bucket, featured vs
+standard) come from one grouped aggregate over active vouchers. The
+effective price is computed in SQL with a CASE over the categories the
+active promotion covers, so buckets match the prices ``voucher_list``
+shows (both round half up, see ``promotions.discounted_points``). A
+search filter's ids are sent in batches of ``ID_BATCH_SIZE``, one
+aggregate per batch, to stay under SQLite's bound-variable limit. Results
+are cached per catalog version, promotion window and filter combination;
+a catalog or promotion change moves the key.
+"""
+import hashlib
+
+from django.core.cache import cache
+from django.db.models import Case, Count, F, IntegerField, Value, When
+
+from accounts import versioning
+from accounts.models import Voucher
+from accounts.search import search_voucher_ids
+
+FACET_CACHE_SECONDS = 300
+ID_BATCH_SIZE = 500
+
+# (key, lower bound, upper bound exclusive or None), on effective points
+POINTS_BUCKETS = (
+    ('0-999', 0, 1000),
+    ('1000-2499', 1000, 2500),
+    ('2500-4999', 2500, 5000),
+    ('5000+', 5000, None),
+)
+
+
+def _discount(promo) -> int:
+    try:
+        return max(0, min(100, int(getattr(promo, 'discount_percentage', 0) or 0))) if promo else 0
+    except (TypeError, ValueError):
+        return 0
+
+
+def _effective_points_expression(promo):
+    """Points after the promotion discount, as ``promotions.discounted_points`` computes them."""
+    discount = _discount(promo)
+    if not discount or not promo.category_ids:
+        return F('points')
+    return Case(
+        When(
+            category_id__in=promo.category_ids,
+            then=(F('points') * (100 - discount) + 50) / 100,
+        ),
+        default=F('points'),
+        output_field=IntegerField(),
+    )
+
+
+def _bucket_expression():
+    """Index into POINTS_BUCKETS for the annotated effective points."""
+    return Case(
+        *[
+            When(effective_points__lt=upper, then=Value(index))
+            for index, (_key, _lower, upper) in enumerate(POINTS_BUCKETS) if upper is not None
+        ],
+        default=Value(len(POINTS_BUCKETS) - 1),
+        output_field=IntegerField(),
+    )
+
+
+def compute_facets(category_name: str | None = None, search: str | None = None, promo=None) -> dict:
+    """Return facet counts for active vouchers matching the filters (one grouped query per id batch)."""
+    vouchers = Voucher.objects.filter(is_active=True)
+    if category_name:
+        vouchers = vouchers.filter(category__name=category_name)
+    batches = [vouchers]
+    if search:
+        ids = search_voucher_ids(search)
+        batches = [vouchers.filter(id__in=ids[start:start + ID_BATCH_SIZE])
+                   for start in range(0, len(ids), ID_BATCH_SIZE)]
+
+    rows = [
+        row
+        for batch in batches
+        for row in (
+            batch
+            .annotate(effective_points=_effective_points_expression(promo))
+            .annotate(bucket=_bucket_expression())
+            .values('category_id', 'category__name', 'featured', 'bucket')
+            .annotate(count=Count('id'))
+            .order_by()
+        )
+    ]
+
+    categories = {}
+    buckets = [0] * len(POINTS_BUCKETS)
+    featured = {'featured': 0, 'standard': 0}
+    total = 0
+    for row in rows:
+        count = row['count']
+        total += count
+        entry = categories.setdefault(
+            row['category_id'], {'id': row['category_id'], 'name': row['category__name'], 'count': 0}
+        )
+        entry['count'] += count
+        buckets[row['bucket']] += count
+        featured['featured' if row['featured'] else 'standard'] += count
+
+    return {
+        'total': total,
+        'categories': sorted(categories.values(), key=lambda entry: (-entry['count'], entry['name'])),
+        'points': [
+            {'key': key, 'min': lower, 'max': upper - 1 if upper is not None else None, 'count': buckets[index]}
+            for index, (key, lower, upper) in enumerate(POINTS_BUCKETS)
+        ],
+        'featured': featured,
+        'promotion': promo.name if _discount(promo) and promo.category_ids else None,
+    }
+
+
+def get_facets(category_name: str | None = None, search: str | None = None, promo=None) -> dict:
+    """Return facet counts, cached per catalog version, promotion and filters."""
+    stamp = versioning.get_version(versioning.CATALOG).stamp
+    promo_key = f'{promo.promotion_id}:{promo.name}:{promo.discount_percentage}' if promo else 'none'
+    raw = f'{stamp}|{promo_key}|{category_name or ""}|{(search or "").strip().lower()}'
+    key = f'facets:{hashlib.sha256(raw.encode()).hexdigest()[:32]}'
+    facets = cache.get(key)
+    if facets is None:
+        facets = compute_facets(category_name, search, promo)
+        cache.set(key, facets, FACET_CACHE_SECONDS)
+    return facets
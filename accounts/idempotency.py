@@ -0,0 +1,152 @@
+"""
+Idempotency-Key support for retried POST endpoints.
+
+A client that may retry a request (mobile apps on flaky networks) sends an
+``Idempotency-Key`` header. The first request with a given key claims it by
+inserting an ``IdempotencyRecord`` (unique per user and key), runs the view,
+and stores the response. Retries are answered from that record with one
+indexed lookup and the view does not run again. A retry that arrives while
+the first request is still running waits for it to finish, up to
+``WAIT_SECONDS``, then gets 409.
+
+A claim is a lease: an in-progress record older than ``LEASE`` (counted
+from its ``created_at``, the time of the claim) is assumed to belong to a
+worker that was killed or timed out, and the next retry takes the key
+over and runs the view. ``LEASE`` must stay well above the longest a
+request can run (the gunicorn worker timeout).
+
+Only responses below 500 are stored; server errors, 429 and responses
+passed through ``not_stored`` (e.g. turned away by admission control)
+release the key so the client can retry for real.
+Records expire after ``TTL`` and are evicted lazily.
+"""
+import functools
+import hashlib
+import json
+import time
+from datetime import timedelta
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from accounts.models import IdempotencyRecord
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+TTL = timedelta(hours=24)
+WAIT_SECONDS = 10.0
+LEASE = timedelta(minutes=5)
+POLL_SECONDS = 0.1
+PURGE_INTERVAL_SECONDS = 60
+
+_last_purge = 0.0
+
+
+def purge_expired() -> int:
+    """Delete expired records; return how many were removed."""
+    deleted, _ = IdempotencyRecord.objects.filter(expires_at__lt=timezone.now()).delete()
+    return deleted
+
+
+def _maybe_purge() -> None:
+    global _last_purge
+    if time.monotonic() - _last_purge >= PURGE_INTERVAL_SECONDS:
+        _last_purge = time.monotonic()
+        purge_expired()
+
+
+def _fingerprint(request) -> str:
+    """Hash of what the request asks for, so a reused key with a different body is caught."""
+    payload = json.dumps(
+        [request.method, request.path, sorted(request.query_params.items()), request.data],
+        sort_keys=True, cls=DjangoJSONEncoder, default=str,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _claim(request, key: str, endpoint: str, fingerprint: str) -> IdempotencyRecord | None:
+    """Insert the in-progress record; return None if the key is already taken."""
+    try:
+        with transaction.atomic():
+            return IdempotencyRecord.objects.create(
+                user=request.user, key=key, endpoint=endpoint, fingerprint=fingerprint,
+                expires_at=timezone.now() + TTL,
+            )
+    except IntegrityError:
+        return None
+
+
+def _replay(record: IdempotencyRecord) -> Response:
+    response = Response(record.response_body, status=record.response_status)
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def not_stored(response: Response) -> Response:
+    """Mark ``response`` as one that must not be replayed for the request's key."""
+    response.idempotency_not_stored = True
+    return response
+
+
+def idempotent(view):
+    """
+    Make a DRF view replay its stored response for a repeated Idempotency-Key.
+
+    Apply beneath ``@permission_classes`` so the key is scoped to an
+    authenticated user. Requests without the header run normally.
+    """
+    endpoint = view.__name__
+
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return view(request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return Response({'error': f'{HEADER} must be at most {MAX_KEY_LENGTH} characters'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        _maybe_purge()
+        fingerprint = _fingerprint(request)
+        deadline = time.monotonic() + WAIT_SECONDS
+        while True:
+            record = _claim(request, key, endpoint, fingerprint)
+            if record is not None:
+                break
+            existing = IdempotencyRecord.objects.filter(user=request.user, key=key).first()
+            if existing is None:
+                continue  # released by a failed first attempt; claim it ourselves
+            if existing.expires_at < timezone.now():
+                existing.delete()
+                continue
+            if existing.endpoint != endpoint or existing.fingerprint != fingerprint:
+                return Response({'error': f'{HEADER} was already used for a different request'},
+                                status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+            if existing.status == 'completed':
+                return _replay(existing)
+            if existing.created_at < timezone.now() - LEASE:
+                # Abandoned by its worker; by id, so a fresh claim by another retry is left alone
+                IdempotencyRecord.objects.filter(id=existing.id, status='in_progress').delete()
+                continue
+            if time.monotonic() >= deadline:
+                return Response({'error': 'A request with this Idempotency-Key is still in progress'},
+                                status=status.HTTP_409_CONFLICT)
+            time.sleep(POLL_SECONDS)
+
+        try:
+            response = view(request, *args, **kwargs)
+        except Exception:
+            record.delete()
+            raise
+        if (response.status_code >= 500 or response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+                or getattr(response, 'idempotency_not_stored', False)):
+            record.delete()
+            return response
+        IdempotencyRecord.objects.filter(id=record.id).update(
+            status='completed', response_status=response.status_code, response_body=response.data,
+        )
+        return response
+    return wrapper
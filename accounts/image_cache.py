@@ -0,0 +1,189 @@
+"""
+Local disk cache of voucher images, prepared for PDF embedding.
+
+Every PDF renderer used to download the voucher's image on every render,
+and the fallback chain could download it up to three times for one
+redemption. Images are now fetched once, decoded, scaled down to at most
+``MAX_PIXELS`` on either side, re-encoded as RGB JPEG and stored on disk.
+Later renders read the prepared file and do no network I/O.
+
+Files are content-addressed: ``objects/<aa>/<sha256>.jpg`` holds the
+prepared bytes, so vouchers sharing an image share one file. A small
+``urls/<sha256 of url>`` file points each URL at its object. Every hit
+bumps the object's mtime, and once the objects exceed
+``VOUCHER_IMAGE_CACHE_MAX_BYTES`` the least recently used are evicted.
+Each process keeps a running total of the bytes it has stored and only
+walks the cache to evict when that total passes the budget, or every
+``SWEEP_SECONDS`` to pick up other workers' writes, so a miss on a full
+cache does not stat every file.
+Writes go to a temporary file and are renamed into place, so concurrent
+workers never see a partial image.
+
+URLs that fail to download are remembered in-process for
+``FAILURE_TTL_SECONDS`` so a fallback renderer does not retry them at once.
+The ``prewarm_voucher_images`` command fills the cache for the catalog.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from io import BytesIO
+
+import requests
+from django.conf import settings
+from PIL import Image as PILImage
+
+MAX_PIXELS = 600
+JPEG_QUALITY = 85
+FETCH_TIMEOUT = 10
+FAILURE_TTL_SECONDS = 300
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024
+# Walk the cache at least this often, to count objects other workers stored
+SWEEP_SECONDS = 300
+
+_failures = {}
+_failures_lock = threading.Lock()
+# Cache directory -> (bytes stored as of the last walk plus writes since, time of that walk)
+_usage = {}
+_usage_lock = threading.Lock()
+
+
+def cache_dir() -> str:
+    return getattr(settings, 'VOUCHER_IMAGE_CACHE_DIR', os.path.join(settings.BASE_DIR, 'cache', 'voucher_images'))
+
+
+def max_bytes() -> int:
+    return getattr(settings, 'VOUCHER_IMAGE_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES)
+
+
+def _url_path(url: str) -> str:
+    return os.path.join(cache_dir(), 'urls', hashlib.sha256(url.encode()).hexdigest())
+
+
+def _object_path(digest: str) -> str:
+    return os.path.join(cache_dir(), 'objects', digest[:2], f'{digest}.jpg')
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def prepare(data: bytes) -> bytes:
+    """Decode an image, shrink it to ``MAX_PIXELS`` and re-encode it as RGB JPEG."""
+    with PILImage.open(BytesIO(data)) as img:
+        img = img.convert('RGB')
+        img.thumbnail((MAX_PIXELS, MAX_PIXELS))
+        out = BytesIO()
+        img.save(out, format='JPEG', quality=JPEG_QUALITY, optimize=True)
+        return out.getvalue()
+
+
+def lookup(url: str) -> str | None:
+    """Return the prepared image's path for ``url`` if it is cached, bumping its recency."""
+    try:
+        with open(_url_path(url), encoding='ascii') as f:
+            path = _object_path(f.read().strip())
+        os.utime(path)
+        return path
+    except (OSError, ValueError):
+        return None
+
+
+def _recently_failed(url: str) -> bool:
+    with _failures_lock:
+        failed_at = _failures.get(url)
+        if failed_at is not None and time.monotonic() - failed_at >= FAILURE_TTL_SECONDS:
+            del _failures[url]
+            failed_at = None
+        return failed_at is not None
+
+
+def store(url: str, data: bytes) -> str:
+    """Prepare ``data`` and cache it as ``url``'s image; return the object's path."""
+    prepared = prepare(data)
+    digest = hashlib.sha256(prepared).hexdigest()
+    path = _object_path(digest)
+    written = 0
+    if os.path.exists(path):
+        os.utime(path)
+    else:
+        _write_atomic(path, prepared)
+        written = len(prepared)
+    _write_atomic(_url_path(url), digest.encode())
+    if _over_budget(written):
+        evict()
+    return path
+
+
+def _over_budget(written: int) -> bool:
+    """Count ``written`` new bytes; True if the cache should be walked and trimmed."""
+    with _usage_lock:
+        usage = _usage.get(cache_dir())
+        if usage is None:
+            return True
+        total, measured_at = usage[0] + written, usage[1]
+        _usage[cache_dir()] = (total, measured_at)
+        return total > max_bytes() or time.monotonic() - measured_at >= SWEEP_SECONDS
+
+
+def get(url: str, fetch: bool = True) -> str | None:
+    """
+    Return a local path to ``url``'s prepared image, or None if unavailable.
+
+    On a miss the image is downloaded and cached, unless ``fetch`` is False
+    or the URL failed recently.
+    """
+    if not url:
+        return None
+    path = lookup(url)
+    if path is not None or not fetch or _recently_failed(url):
+        return path
+    try:
+        response = requests.get(url, timeout=FETCH_TIMEOUT)
+        response.raise_for_status()
+        return store(url, response.content)
+    except Exception as e:
+        print(f"Voucher image unavailable ({url}): {e}")
+        with _failures_lock:
+            _failures[url] = time.monotonic()
+        return None
+
+
+def evict() -> int:
+    """Delete least recently used objects until the cache fits its budget; return bytes freed."""
+    objects_dir = os.path.join(cache_dir(), 'objects')
+    entries = []
+    for root, _dirs, files in os.walk(objects_dir):
+        for name in files:
+            if name.startswith('.tmp-'):
+                continue
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    budget = max_bytes()
+    freed = 0
+    for _mtime, size, path in sorted(entries):
+        if total - freed <= budget:
+            break
+        try:
+            os.remove(path)
+            freed += size
+        except OSError:
+            pass
+    with _usage_lock:
+        _usage[cache_dir()] = (total - freed, time.monotonic())
+    # URL pointers to evicted objects are rewritten on the next miss
+    return freed
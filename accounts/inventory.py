@@ -0,0 +1,158 @@
+"""
+Sharded stock counters for flash-sale vouchers.
+
+Normally a voucher's stock is the single ``Voucher.quantity_available``
+column, so every redemption of a hot voucher queues on the same row lock.
+A voucher can opt in to sharded mode, which splits its stock across
+``stock_shard_count`` ``VoucherStockShard`` rows. A redemption decrements
+one randomly chosen shard that can cover it, so concurrent redemptions
+mostly lock different rows. Availability is the sum of the shards.
+
+While a voucher is sharded, ``quantity_available`` is a snapshot of that
+sum for cart checks. It is refreshed whenever a shard runs dry and by
+``rebalance``, never on every redemption, so writing it directly has no
+effect on what can be sold. Use ``set_stock`` or the ``rebalance_stock``
+command instead. Listings read ``live_stock``, which sums the shards.
+"""
+import random
+
+from django.db import transaction
+from django.db.models import F, Q, Sum
+
+from accounts import catalog
+from accounts.models import Voucher, VoucherStockShard
+
+MAX_SHARDS = 64
+
+
+def is_sharded(voucher) -> bool:
+    return voucher.stock_shard_count > 0
+
+
+def available(voucher) -> int:
+    """Units of ``voucher`` that can still be sold."""
+    if not is_sharded(voucher):
+        return Voucher.objects.filter(id=voucher.id).values_list('quantity_available', flat=True).get()
+    return VoucherStockShard.objects.filter(voucher_id=voucher.id).aggregate(total=Sum('quantity'))['total'] or 0
+
+
+def live_stock(voucher_ids) -> dict:
+    """Units left of each of ``voucher_ids`` in one query, summing the shards of sharded vouchers."""
+    rows = (
+        Voucher.objects.filter(id__in=list(voucher_ids))
+        .values('id', 'quantity_available', 'stock_shard_count')
+        .annotate(shard_total=Sum('stock_shards__quantity'))
+        .values_list('id', 'quantity_available', 'stock_shard_count', 'shard_total')
+    )
+    return {
+        voucher_id: (shard_total or 0) if shard_count else quantity
+        for voucher_id, quantity, shard_count, shard_total in rows
+    }
+
+
+def stock_version() -> str:
+    """
+    A key that changes whenever any active voucher's stock does.
+
+    Stock only goes down between voucher saves, and every save bumps the
+    catalog stamp, so the total left is enough to tell stock levels apart.
+    """
+    totals = Voucher.objects.filter(is_active=True).aggregate(
+        unsharded=Sum('quantity_available', filter=Q(stock_shard_count=0)),
+        sharded=Sum('stock_shards__quantity', filter=Q(stock_shard_count__gt=0)),
+    )
+    return f"{totals['unsharded'] or 0}:{totals['sharded'] or 0}"
+
+
+def _sync_snapshot(voucher_id: int) -> None:
+    """Copy the shard total into ``quantity_available``; refresh listings on sell-out."""
+    total = VoucherStockShard.objects.filter(voucher_id=voucher_id).aggregate(total=Sum('quantity'))['total'] or 0
+    Voucher.objects.filter(id=voucher_id).update(quantity_available=total)
+    if total == 0:
+        transaction.on_commit(catalog.invalidate)
+
+
+def _take_spread(voucher_id: int, quantity: int) -> bool:
+    """Take ``quantity`` units across several shards when no single shard holds enough."""
+    shards = list(VoucherStockShard.objects.select_for_update().filter(voucher_id=voucher_id).order_by('shard'))
+    if sum(shard.quantity for shard in shards) < quantity:
+        return False
+    remaining = quantity
+    for shard in shards:
+        taken = min(shard.quantity, remaining)
+        shard.quantity -= taken
+        remaining -= taken
+    VoucherStockShard.objects.bulk_update(shards, ['quantity'])
+    _sync_snapshot(voucher_id)
+    return True
+
+
+def take(voucher, quantity: int) -> bool:
+    """
+    Decrement ``quantity`` units from a sharded voucher's stock.
+
+    Tries the shards that can cover the whole amount in random order with a
+    conditional update each; only if none can does it lock every shard and
+    drain them in order. Returns False, changing nothing, if stock is short.
+    Call it inside the redemption's transaction.
+    """
+    candidates = list(
+        VoucherStockShard.objects
+        .filter(voucher_id=voucher.id, quantity__gte=quantity)
+        .values_list('shard', flat=True)
+    )
+    random.shuffle(candidates)
+    for shard in candidates:
+        # Another redemption may have drained this shard since the read above
+        updated = (
+            VoucherStockShard.objects
+            .filter(voucher_id=voucher.id, shard=shard, quantity__gte=quantity)
+            .update(quantity=F('quantity') - quantity)
+        )
+        if updated:
+            if VoucherStockShard.objects.filter(voucher_id=voucher.id, shard=shard, quantity=0).exists():
+                _sync_snapshot(voucher.id)
+            return True
+    with transaction.atomic():
+        return _take_spread(voucher.id, quantity)
+
+
+def _split(total: int, shards: int) -> list:
+    base, extra = divmod(total, shards)
+    return [base + (1 if index < extra else 0) for index in range(shards)]
+
+
+def set_stock(voucher, shards: int = None, total: int = None) -> int:
+    """
+    Re-split a voucher's stock evenly across ``shards`` rows and return the total.
+
+    ``shards=None`` keeps the current shard count; ``shards=0`` turns
+    sharding off and moves the stock back into ``quantity_available``.
+    ``total`` replaces the stock level; by default the current stock is
+    kept. Concurrent redemptions wait on the row locks taken here and then
+    see the new layout.
+    """
+    if shards is not None and not 0 <= shards <= MAX_SHARDS:
+        raise ValueError(f'shards must be between 0 and {MAX_SHARDS}')
+    with transaction.atomic():
+        locked = Voucher.objects.select_for_update().get(id=voucher.id)
+        if shards is None:
+            shards = locked.stock_shard_count
+        existing = list(VoucherStockShard.objects.select_for_update().filter(voucher_id=voucher.id))
+        if total is None:
+            total = sum(shard.quantity for shard in existing) if locked.stock_shard_count else locked.quantity_available
+        VoucherStockShard.objects.filter(voucher_id=voucher.id).delete()
+        VoucherStockShard.objects.bulk_create([
+            VoucherStockShard(voucher_id=voucher.id, shard=index, quantity=quantity)
+            for index, quantity in enumerate(_split(total, shards) if shards else [])
+        ])
+        Voucher.objects.filter(id=voucher.id).update(stock_shard_count=shards, quantity_available=total)
+        transaction.on_commit(catalog.invalidate)
+    voucher.stock_shard_count = shards
+    voucher.quantity_available = total
+    return total
+
+
+def rebalance(voucher) -> int:
+    """Even out a sharded voucher's shards, keeping its shard count and stock."""
+    return set_stock(voucher)
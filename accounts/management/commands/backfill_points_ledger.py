@@ -0,0 +1,69 @@
+"""
+Django management command that opens the points ledger for profiles created
+before it existed.
+
+Migration 0014 records opening balances when it creates the ledger; this
+command covers databases migrated before it did. Each profile without an
+``opening_balance`` entry gets one for its current points less whatever
+entries it already has (points earned or spent since the migration), and a
+snapshot at that entry, so the ledger sums to the cached balance. Profiles
+that already have an opening entry are left alone, so the command is safe
+to re-run.
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Sum
+
+from accounts import points
+from accounts.models import PointsLedger, PointsSnapshot, UserProfile
+
+
+class Command(BaseCommand):
+    help = 'Record existing balances as opening entries in the points ledger'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch', type=int, default=500, help='Profiles per transaction')
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be written')
+
+    def handle(self, *args, **options):
+        pending = (
+            UserProfile.objects
+            .exclude(user__in=PointsLedger.objects.filter(reason=points.OPENING_BALANCE).values('user'))
+            .order_by('id')
+        )
+        total = pending.count()
+        self.stdout.write(f'{total} profile(s) without an opening balance')
+        if options['dry_run'] or not total:
+            return
+
+        opened = 0
+        last_id = 0
+        while True:
+            with transaction.atomic():
+                # Lock the batch so no ledger write lands between the read and the opening entry
+                batch = list(
+                    pending.filter(id__gt=last_id).select_for_update()[:options['batch']]
+                    .values_list('id', 'user_id', 'points')
+                )
+                if not batch:
+                    break
+                last_id = batch[-1][0]
+                recorded = dict(
+                    PointsLedger.objects
+                    .filter(user_id__in=[user_id for _, user_id, _ in batch])
+                    .values('user_id').annotate(total=Sum('amount')).values_list('user_id', 'total')
+                )
+                entries = PointsLedger.objects.bulk_create([
+                    PointsLedger(
+                        user_id=user_id, amount=balance - recorded.get(user_id, 0), reason=points.OPENING_BALANCE,
+                    )
+                    for _, user_id, balance in batch
+                ])
+                balances = {user_id: balance for _, user_id, balance in batch}
+                PointsSnapshot.objects.bulk_create([
+                    PointsSnapshot(user_id=entry.user_id, balance=balances[entry.user_id], last_entry_id=entry.id)
+                    for entry in entries
+                ])
+            opened += len(batch)
+            self.stdout.write(f'  opened {opened}/{total}')
+        self.stdout.write(self.style.SUCCESS(f'Opened the ledger for {opened} profile(s)'))
@@ -0,0 +1,107 @@
+"""
+Django management command to compare the per-item checkout write path with
+the bulk checkout engine, in queries and latency, for several cart sizes.
+
+Each run happens inside a transaction that is rolled back, and PDF
+rendering is excluded so only the database work is measured.
+"""
+import statistics
+import time
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from accounts import redemption
+from accounts.models import Redemption, UserProfile, Voucher, VoucherCategory
+
+User = get_user_model()
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _per_item_checkout(user, lines):
+    """The previous write path: one create, stock save and re-save per item."""
+    profile = UserProfile.objects.get(user=user)
+    redemptions = []
+    for line in lines:
+        created = Redemption.objects.create(
+            user=user, voucher=line.voucher, quantity=line.quantity,
+            points_used=line.unit_points * line.quantity, status='completed',
+            completed_at=timezone.now(),
+        )
+        line.voucher.quantity_available -= line.quantity
+        line.voucher.save()
+        redemptions.append(created)
+    for created in redemptions:
+        created.pdf_url = 'https://example.com/voucher.pdf'
+        created.save()
+    profile.points -= sum(line.unit_points * line.quantity for line in lines)
+    profile.save()
+
+
+def _bulk_checkout(user, lines):
+    redemptions = redemption.checkout(user, lines)
+    Redemption.objects.filter(id__in=[r.id for r in redemptions]).update(
+        pdf_url='https://example.com/voucher.pdf'
+    )
+
+
+class Command(BaseCommand):
+    help = 'Benchmark per-item vs bulk checkout (queries and latency)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1,5,20', help='Comma-separated cart sizes')
+        parser.add_argument('--iterations', type=int, default=10, help='Runs per size and path')
+
+    def _measure(self, path, user, vouchers, size):
+        lines = [redemption.CheckoutLine(voucher, 1, voucher.points) for voucher in vouchers[:size]]
+        start = time.perf_counter()
+        try:
+            with transaction.atomic():
+                with CaptureQueriesContext(connection) as queries:
+                    path(user, lines)
+                elapsed = (time.perf_counter() - start) * 1000
+                raise _Rollback
+        except _Rollback:
+            pass
+        for voucher in vouchers[:size]:
+            voucher.refresh_from_db(fields=['quantity_available'])
+        return len(queries), elapsed
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',') if size.strip()]
+        run = uuid.uuid4().hex[:8]
+        category, _ = VoucherCategory.objects.get_or_create(name='Benchmark')
+        vouchers = [
+            Voucher.objects.create(
+                title=f'Benchmark voucher {run}-{i}', category=category, points=100,
+                original_points=100, discount_percentage=0, image_url='https://example.com/b.png',
+                description='Benchmark', terms='Benchmark', quantity_available=1000,
+            )
+            for i in range(max(sizes))
+        ]
+        user = User.objects.create_user(
+            email=f'bench-{run}@example.com', password=uuid.uuid4().hex,
+            first_name='Bench', last_name='Checkout', phone_number='+10000000000',
+        )
+        UserProfile.objects.update_or_create(user=user, defaults={'points': 10 ** 9})
+
+        try:
+            self.stdout.write(f"{'items':>5}  {'path':<9}{'queries':>8}{'median ms':>11}")
+            for size in sizes:
+                for label, path in (('per-item', _per_item_checkout), ('bulk', _bulk_checkout)):
+                    results = [self._measure(path, user, vouchers, size) for _ in range(options['iterations'])]
+                    self.stdout.write(
+                        f"{size:>5}  {label:<9}{results[-1][0]:>8}"
+                        f"{statistics.median(r[1] for r in results):>11.2f}"
+                    )
+        finally:
+            Voucher.objects.filter(id__in=[v.id for v in vouchers]).delete()
+            user.delete()
+        self.stdout.write(self.style.SUCCESS('Benchmark complete'))
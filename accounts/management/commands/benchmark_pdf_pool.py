@@ -0,0 +1,84 @@
+"""
+Django management command that measures PDF rendering throughput with the
+render pool at several process counts.
+
+Two workloads are timed: one large multi-voucher collection, rendered in
+parallel parts and stitched, and a bulk run of single-voucher PDFs as
+``regenerate_voucher_pdfs`` does. Renders use unsaved in-memory
+redemptions without images and nothing is written to disk. Process start-up
+is excluded; each pool is warmed up before timing.
+"""
+import os
+import time
+from io import BytesIO
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from pypdf import PdfReader
+
+from accounts import pdf_pool, premium_pdf
+from accounts.models import Redemption, Voucher, VoucherCategory
+
+
+def _redemptions(count):
+    category = VoucherCategory(name='Benchmark')
+    return [
+        Redemption(
+            voucher=Voucher(
+                title=f'Benchmark Voucher {index}', category=category, points=1000, original_points=1200,
+                discount_percentage=15, image_url='',
+                description='A free coffee at any outlet. ' * 8, terms='Not exchangeable for cash. ' * 8,
+            ),
+            coupon_code=f'BENCH{index:06d}', points_used=1000, quantity=1, completed_at=timezone.now(),
+        )
+        for index in range(count)
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark PDF rendering throughput across render pool sizes'
+
+    def add_arguments(self, parser):
+        default = sorted({1, 2, min(4, os.cpu_count() or 1), os.cpu_count() or 1})
+        parser.add_argument('--processes', type=int, nargs='+', default=default, help='Pool sizes to compare')
+        parser.add_argument('--vouchers', type=int, default=100, help='Vouchers in the collection')
+        parser.add_argument('--bulk', type=int, default=100, help='Single-voucher PDFs in the bulk run')
+
+    def handle(self, *args, **options):
+        collection = _redemptions(options['vouchers'])
+        singles = [(redemption,) for redemption in _redemptions(options['bulk'])]
+        expected_pages = len(PdfReader(BytesIO(premium_pdf.render_premium_multi_voucher(collection))).pages)
+        self.stdout.write(
+            f"{len(collection)}-voucher collection ({expected_pages} pages serially), "
+            f"{len(singles)} single-voucher PDFs, {os.cpu_count()} CPU(s)"
+        )
+        baseline = None
+        try:
+            for count in options['processes']:
+                pdf_pool.resize(count)
+                pdf_pool.run(premium_pdf.render_premium_voucher, singles[:max(1, count)])  # start the workers
+
+                start = time.perf_counter()
+                pdf = premium_pdf.render_premium_collection(collection)
+                collection_s = time.perf_counter() - start
+
+                start = time.perf_counter()
+                pdf_pool.run(premium_pdf.render_premium_voucher, singles, wait=pdf_pool.FOREVER)
+                bulk_s = time.perf_counter() - start
+
+                rates = (len(collection) / collection_s, len(singles) / bulk_s)
+                baseline = baseline or rates
+                self.stdout.write(
+                    f"processes={count:<3} collection {rates[0]:7.0f} vouchers/s x{rates[0] / baseline[0]:4.1f}  "
+                    f"bulk {rates[1]:7.0f} PDFs/s x{rates[1] / baseline[1]:4.1f}"
+                )
+                pages = len(PdfReader(BytesIO(pdf)).pages)
+                checks = {
+                    # Parallel parts each start on a new page, so never fewer pages than a serial layout
+                    'stitched collection keeps every page': pages >= expected_pages,
+                }
+                for label, passed in checks.items():
+                    style = self.style.SUCCESS if passed else self.style.ERROR
+                    self.stdout.write(style(f"  {'PASS' if passed else 'FAIL'}  {label}"))
+        finally:
+            pdf_pool.resize(None)
@@ -0,0 +1,66 @@
+"""
+Django management command that compares a full layout of a premium voucher
+PDF with stamping a redemption onto the voucher's cached page layout.
+
+The benchmark voucher has no image, so no image I/O is measured; it is
+created for the run and deleted afterwards.
+"""
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from accounts import pdf_templates, premium_pdf
+from accounts.models import Redemption, Voucher, VoucherCategory
+
+
+class Command(BaseCommand):
+    help = 'Benchmark full premium voucher layouts against stamped templates'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--renders', type=int, default=200, help='Renders per measurement')
+
+    def handle(self, *args, **options):
+        renders = options['renders']
+        category, _ = VoucherCategory.objects.get_or_create(name='Benchmark')
+        voucher = Voucher.objects.create(
+            title=f'Template benchmark {uuid.uuid4().hex[:8]}', category=category, points=1000,
+            original_points=1200, discount_percentage=15, image_url='',
+            description='\n'.join(f'Description line {index} of a long-winded voucher.' for index in range(12)),
+            terms='\n'.join(f'{index}. A term and condition that applies.' for index in range(25)),
+            quantity_available=0,
+        )
+        redemptions = [
+            Redemption(voucher=voucher, coupon_code=f'BENCH{index:06d}', points_used=1000 * (index % 5 + 1),
+                       quantity=index % 5 + 1, completed_at=timezone.now())
+            for index in range(renders)
+        ]
+        try:
+            premium_pdf.render_premium_voucher(redemptions[0])  # warm up fonts and the theme
+
+            start = time.perf_counter()
+            for redemption in redemptions:
+                premium_pdf.render_premium_voucher(redemption)
+            full_ms = (time.perf_counter() - start) * 1000 / renders
+
+            pdf_templates.reset()
+            start = time.perf_counter()
+            premium_pdf.stamp_premium_voucher(redemptions[0])
+            first_ms = (time.perf_counter() - start) * 1000
+
+            start = time.perf_counter()
+            for redemption in redemptions:
+                premium_pdf.stamp_premium_voucher(redemption)
+            stamped_ms = (time.perf_counter() - start) * 1000 / renders
+        finally:
+            voucher.delete()
+            pdf_templates.reset()
+
+        self.stdout.write(f'{renders} renders of one voucher')
+        self.stdout.write(f'full layout      {full_ms:7.2f} ms/render')
+        self.stdout.write(f'first stamp      {first_ms:7.2f} ms (records the template)')
+        self.stdout.write(f'stamped          {stamped_ms:7.2f} ms/render  ({stamped_ms / full_ms:.0%} of a full layout)')
+        passed = stamped_ms < full_ms
+        style = self.style.SUCCESS if passed else self.style.ERROR
+        self.stdout.write(style(f"  {'PASS' if passed else 'FAIL'}  stamping is cheaper than a full layout"))
@@ -0,0 +1,83 @@
+"""
+Django management command that measures what sharing PDF themes saves per
+render: CPU time, and peak memory allocated while rendering (tracemalloc).
+
+Each premium renderer runs with a theme built from scratch for every
+render, as before the registry existed, and with the shared theme from
+``pdf_theme.get``. Renders use unsaved in-memory redemptions without
+images, so no database writes or image I/O are measured.
+"""
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from accounts import pdf_theme, premium_pdf
+from accounts.models import Redemption, Voucher, VoucherCategory
+
+
+def _redemption(index):
+    voucher = Voucher(
+        title=f'Benchmark Voucher {index}', category=VoucherCategory(name='Benchmark'), points=1000,
+        original_points=1200, discount_percentage=15, image_url='',
+        description='A free coffee at any outlet.\nValid in store and online.',
+        terms='One per customer.\nNot exchangeable for cash.\nSubject to availability.',
+    )
+    return Redemption(
+        voucher=voucher, coupon_code=f'BENCH{index:06d}', points_used=1000, quantity=1,
+        completed_at=timezone.now(),
+    )
+
+
+class Command(BaseCommand):
+    help = 'Benchmark voucher PDF renders with per-render versus shared themes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--renders', type=int, default=200, help='Renders per measurement')
+        parser.add_argument('--collection-size', type=int, default=5, help='Vouchers in each multi-voucher PDF')
+
+    def measure(self, render, renders):
+        """Return (CPU ms per render, peak KiB per render)."""
+        render()  # warm up imports, fonts and the shared theme
+        start = time.process_time()
+        for _ in range(renders):
+            render()
+        cpu_ms = (time.process_time() - start) * 1000 / renders
+
+        # Timed separately: tracing slows allocation down considerably
+        peaks = 0
+        tracemalloc.start()
+        try:
+            for _ in range(renders):
+                tracemalloc.reset_peak()
+                baseline, _peak = tracemalloc.get_traced_memory()
+                render()
+                _current, peak = tracemalloc.get_traced_memory()
+                peaks += peak - baseline
+        finally:
+            tracemalloc.stop()
+        return cpu_ms, peaks / 1024 / renders
+
+    def handle(self, *args, **options):
+        renders = options['renders']
+        single = _redemption(1)
+        collection = [_redemption(index) for index in range(options['collection_size'])]
+        cases = [
+            ('single', 'premium', lambda theme: premium_pdf.render_premium_voucher(single, theme)),
+            ('collection', 'premium_collection',
+             lambda theme: premium_pdf.render_premium_multi_voucher(collection, theme)),
+        ]
+        self.stdout.write(f'{renders} renders per measurement, {len(collection)} vouchers per collection')
+        for label, theme_name, render in cases:
+            before = self.measure(lambda render=render, name=theme_name: render(pdf_theme.build(name)), renders)
+            after = self.measure(lambda render=render, name=theme_name: render(pdf_theme.get(name)), renders)
+            for mode, (cpu_ms, peak_kib) in (('per-render', before), ('shared', after)):
+                self.stdout.write(f'{label:<10} {mode:<10} {cpu_ms:7.2f} ms CPU  {peak_kib:8.1f} KiB peak')
+            checks = {
+                f'{label}: shared theme uses less CPU per render': after[0] < before[0],
+                f'{label}: shared theme allocates less per render': after[1] < before[1],
+            }
+            for check, passed in checks.items():
+                style = self.style.SUCCESS if passed else self.style.ERROR
+                self.stdout.write(style(f"  {'PASS' if passed else 'FAIL'}  {check}"))
@@ -0,0 +1,97 @@
+"""
+Django management command to fire concurrent redemptions at one voucher and
+check that conditional updates neither oversell stock nor double-spend points.
+"""
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, close_old_connections
+
+from accounts import redemption
+from accounts.models import Redemption, UserProfile, Voucher, VoucherCategory
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Benchmark concurrent voucher redemptions and verify stock/points invariants'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=300, help='Total redemption attempts')
+        parser.add_argument('--workers', type=int, default=16, help='Concurrent threads')
+        parser.add_argument('--users', type=int, default=20, help='Distinct redeeming users')
+        parser.add_argument('--stock', type=int, default=100, help='Units of the benchmark voucher')
+        parser.add_argument('--points', type=int, default=5000, help='Starting balance per user')
+        parser.add_argument('--cost', type=int, default=1000, help='Points per redemption')
+
+    def handle(self, *args, **options):
+        run = uuid.uuid4().hex[:8]
+        category, _ = VoucherCategory.objects.get_or_create(name='Benchmark')
+        voucher = Voucher.objects.create(
+            title=f'Benchmark voucher {run}', category=category, points=options['cost'],
+            original_points=options['cost'], discount_percentage=0, image_url='https://example.com/b.png',
+            description='Benchmark', terms='Benchmark', quantity_available=options['stock'],
+        )
+        users = []
+        for i in range(options['users']):
+            user = User.objects.create_user(
+                email=f'bench-{run}-{i}@example.com', password=uuid.uuid4().hex,
+                first_name='Bench', last_name=str(i), phone_number='+10000000000',
+            )
+            UserProfile.objects.update_or_create(user=user, defaults={'points': options['points']})
+            users.append(user)
+
+        outcomes = {'ok': 0, 'no_points': 0, 'no_stock': 0, 'locked': 0}
+
+        def attempt(index):
+            user = users[index % len(users)]
+            try:
+                redemption.redeem(user, voucher, 1, options['cost'])
+                return 'ok'
+            except redemption.InsufficientPointsError:
+                return 'no_points'
+            except redemption.InsufficientStockError:
+                return 'no_stock'
+            except OperationalError:
+                return 'locked'
+            finally:
+                close_old_connections()
+
+        try:
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+                for result in pool.map(attempt, range(options['requests'])):
+                    outcomes[result] += 1
+            elapsed = time.perf_counter() - start
+
+            voucher.refresh_from_db()
+            redeemed = Redemption.objects.filter(voucher=voucher).count()
+            spent = sum(options['points'] - p for p in
+                        UserProfile.objects.filter(user__in=users).values_list('points', flat=True))
+            overdrawn = UserProfile.objects.filter(user__in=users, points__lt=0).count()
+
+            self.stdout.write(
+                f"{options['requests']} attempts in {elapsed:.2f}s "
+                f"({options['requests'] / elapsed:.0f} req/s, {options['workers']} workers)"
+            )
+            self.stdout.write(
+                f"succeeded={outcomes['ok']} insufficient_points={outcomes['no_points']} "
+                f"sold_out={outcomes['no_stock']} lock_timeouts={outcomes['locked']}"
+            )
+            checks = {
+                'stock never negative': voucher.quantity_available >= 0,
+                'stock matches redemptions': voucher.quantity_available == options['stock'] - redeemed,
+                'points match redemptions': spent == redeemed * options['cost'],
+                'no overdrawn balances': overdrawn == 0,
+                'successes recorded': redeemed == outcomes['ok'],
+            }
+            for label, passed in checks.items():
+                style = self.style.SUCCESS if passed else self.style.ERROR
+                self.stdout.write(style(f"  {'PASS' if passed else 'FAIL'}  {label}"))
+        finally:
+            Redemption.objects.filter(voucher=voucher).delete()
+            voucher.delete()
+            User.objects.filter(id__in=[user.id for user in users]).delete()
@@ -0,0 +1,83 @@
+"""
+Django management command to load-test stock decrements on one voucher at
+several shard counts and check that sharding never oversells.
+
+Row-level locking is what sharding relieves, so throughput only scales with
+the shard count on a database that has it (PostgreSQL, MySQL). SQLite locks
+the whole file per write and will show flat numbers.
+"""
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, close_old_connections, transaction
+
+from accounts import inventory, redemption
+from accounts.models import Voucher, VoucherCategory
+
+
+class Command(BaseCommand):
+    help = 'Benchmark concurrent stock decrements across shard counts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--shards', type=int, nargs='+', default=[0, 1, 4, 16],
+                            help='Shard counts to compare (0 = plain quantity_available)')
+        parser.add_argument('--requests', type=int, default=2000, help='Decrements per run')
+        parser.add_argument('--workers', type=int, default=32, help='Concurrent threads')
+        parser.add_argument('--stock', type=int, default=1500, help='Units of the benchmark voucher')
+        parser.add_argument('--hold-ms', type=float, default=2.0,
+                            help='Time each transaction keeps running after its decrement, as other redemption work would')
+
+    def run(self, shards, options):
+        category, _ = VoucherCategory.objects.get_or_create(name='Benchmark')
+        voucher = Voucher.objects.create(
+            title=f'Shard benchmark {uuid.uuid4().hex[:8]}', category=category, points=1,
+            original_points=1, discount_percentage=0, image_url='https://example.com/b.png',
+            description='Benchmark', terms='Benchmark', quantity_available=options['stock'],
+        )
+        inventory.set_stock(voucher, shards)
+        outcomes = {'ok': 0, 'no_stock': 0, 'locked': 0}
+
+        def attempt(_index):
+            try:
+                with transaction.atomic():
+                    redemption.reserve_stock(voucher, 1)
+                    time.sleep(options['hold_ms'] / 1000)
+                return 'ok'
+            except redemption.InsufficientStockError:
+                return 'no_stock'
+            except OperationalError:
+                return 'locked'
+            finally:
+                close_old_connections()
+
+        try:
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+                for result in pool.map(attempt, range(options['requests'])):
+                    outcomes[result] += 1
+            elapsed = time.perf_counter() - start
+            left = inventory.available(voucher)
+            return elapsed, outcomes, left
+        finally:
+            voucher.delete()
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{options['requests']} decrements, {options['workers']} workers, {options['stock']} units")
+        baseline = None
+        for shards in options['shards']:
+            elapsed, outcomes, left = self.run(shards, options)
+            rate = options['requests'] / elapsed
+            baseline = baseline or rate
+            self.stdout.write(
+                f"shards={shards:<3} {rate:8.0f} req/s  x{rate / baseline:4.1f}  "
+                f"succeeded={outcomes['ok']} sold_out={outcomes['no_stock']} lock_timeouts={outcomes['locked']}"
+            )
+            checks = {
+                'stock never negative': left >= 0,
+                'stock matches successes': left == options['stock'] - outcomes['ok'],
+            }
+            for label, passed in checks.items():
+                style = self.style.SUCCESS if passed else self.style.ERROR
+                self.stdout.write(style(f"  {'PASS' if passed else 'FAIL'}  {label}"))
@@ -0,0 +1,54 @@
+"""
+Django management command to compare voucher list payload size and latency
+for the full rows, the lean card projection and a custom field set.
+"""
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from rest_framework.test import APIRequestFactory
+
+from accounts.views import voucher_list
+
+VARIANTS = (
+    ('full', {}),
+    ('view=card', {'view': 'card'}),
+    ('fields=id,title,points', {'fields': 'id,title,points'}),
+)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark voucher_list payload bytes and latency per projection'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50, help='Requests per variant')
+        parser.add_argument('--category', help='Optional category filter')
+
+    def handle(self, *args, **options):
+        factory = APIRequestFactory()
+        iterations = max(1, options['iterations'])
+        baseline = None
+
+        # Warm the catalog snapshot and promotion schedule
+        voucher_list(factory.get('/accounts/vouchers/')).render()
+
+        self.stdout.write(f"{'variant':<26}{'rows':>6}{'bytes':>10}{'vs full':>9}{'median ms':>11}{'p95 ms':>9}")
+        for label, params in VARIANTS:
+            if options['category']:
+                params = {**params, 'category': options['category']}
+            timings = []
+            for _ in range(iterations):
+                request = factory.get('/accounts/vouchers/', params)
+                start = time.perf_counter()
+                response = voucher_list(request)
+                response.render()
+                timings.append((time.perf_counter() - start) * 1000)
+            size = len(response.content)
+            baseline = baseline or size
+            timings.sort()
+            p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+            self.stdout.write(
+                f"{label:<26}{len(response.data):>6}{size:>10}{size / baseline:>8.0%}"
+                f"{statistics.median(timings):>11.2f}{p95:>9.2f}"
+            )
+        self.stdout.write(self.style.SUCCESS(f'Benchmark complete ({iterations} requests per variant)'))
@@ -0,0 +1,56 @@
+"""
+Django management command that moves voucher PDFs from the old flat
+``MEDIA_ROOT/vouchers`` directory into the content-addressed PDF store.
+
+Each file is stored first, then the redemptions and jobs pointing at it
+are updated, and only then is the old file removed, so an interrupted run
+can simply be repeated. ``--prune`` afterwards deletes stored PDFs that
+nothing points at any more.
+"""
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from accounts import pdf_store
+from accounts.models import PdfJob, Redemption
+
+
+class Command(BaseCommand):
+    help = 'Move voucher PDFs from media/vouchers into the sharded PDF store'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep', action='store_true', help='Leave the old files in place')
+        parser.add_argument('--prune', action='store_true', help='Then delete stored PDFs nothing refers to')
+
+    def handle(self, *args, **options):
+        legacy_dir = pdf_store.legacy_dir()
+        try:
+            entries = sorted(
+                entry.name for entry in os.scandir(legacy_dir)
+                if entry.is_file() and entry.name.endswith('.pdf')
+            )
+        except FileNotFoundError:
+            entries = []
+
+        moved = repointed = 0
+        for filename in entries:
+            path = os.path.join(legacy_dir, filename)
+            with open(path, 'rb') as f:
+                new_url = pdf_store.save(f.read())
+            old_url = f'{settings.MEDIA_URL}vouchers/{filename}'
+            with transaction.atomic():
+                repointed += Redemption.objects.filter(pdf_url=old_url).update(pdf_url=new_url)
+                PdfJob.objects.filter(pdf_url=old_url).update(pdf_url=new_url)
+            if not options['keep']:
+                os.remove(path)
+            moved += 1
+        self.stdout.write(self.style.SUCCESS(f'Moved {moved} PDF(s), {repointed} redemption(s) repointed'))
+
+        if options['prune']:
+            referenced = set(
+                Redemption.objects.exclude(pdf_url__isnull=True).values_list('pdf_url', flat=True)
+            ) | set(PdfJob.objects.exclude(pdf_url__isnull=True).values_list('pdf_url', flat=True))
+            deleted = pdf_store.prune(referenced)
+            self.stdout.write(f'Pruned {deleted} unreferenced PDF(s)')
@@ -0,0 +1,41 @@
+"""
+Django management command that fills the voucher image cache so PDF
+renders do no network I/O for known vouchers.
+
+Run it after deploys and after bulk image updates.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from accounts import image_cache
+from accounts.models import Voucher
+
+
+class Command(BaseCommand):
+    help = 'Download and prepare the images of active vouchers for PDF rendering'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8, help='Concurrent downloads (default 8)')
+        parser.add_argument('--all', action='store_true', help='Include inactive vouchers')
+
+    def handle(self, *args, **options):
+        vouchers = Voucher.objects.exclude(image_url='')
+        if not options['all']:
+            vouchers = vouchers.filter(is_active=True)
+        urls = sorted(set(vouchers.values_list('image_url', flat=True)))
+
+        missing = [url for url in urls if image_cache.lookup(url) is None]
+        with ThreadPoolExecutor(max_workers=max(1, options['workers'])) as pool:
+            results = list(pool.map(image_cache.get, missing))
+        failed = [url for url, path in zip(missing, results) if path is None]
+        for url in failed:
+            self.stdout.write(self.style.WARNING(f'  failed: {url}'))
+
+        freed = image_cache.evict()
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(urls)} image(s): {len(urls) - len(missing)} already cached, '
+            f'{len(missing) - len(failed)} fetched, {len(failed)} failed'
+        ))
+        if freed:
+            self.stdout.write(f'Evicted {freed} byte(s) to stay within the cache budget')
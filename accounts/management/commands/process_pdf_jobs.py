@@ -0,0 +1,33 @@
+"""
+Django management command that renders queued voucher PDFs.
+
+Run it alongside the web process (see the ``worker`` line in the Procfile).
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from accounts import pdf_jobs
+
+
+class Command(BaseCommand):
+    help = 'Render queued voucher PDFs (runs until stopped unless --once is given)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Drain the queue once and exit')
+        parser.add_argument('--sleep', type=float, default=2.0, help='Seconds to wait when the queue is idle')
+        parser.add_argument('--batch', type=int, default=20, help='Jobs to process between idle checks')
+
+    def handle(self, *args, **options):
+        self.stdout.write('Processing PDF jobs...')
+        while True:
+            close_old_connections()
+            succeeded, failed = pdf_jobs.run_pending(limit=None if options['once'] else options['batch'])
+            if succeeded or failed:
+                self.stdout.write(f'Rendered {succeeded} PDF(s), {failed} failed (will retry if attempts remain)')
+            if options['once']:
+                break
+            if not (succeeded or failed):
+                time.sleep(options['sleep'])
+        self.stdout.write(self.style.SUCCESS('PDF queue drained'))
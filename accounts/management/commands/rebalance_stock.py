@@ -0,0 +1,43 @@
+"""
+Django management command to enable, resize, disable or even out sharded
+stock counters for flash-sale vouchers.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts import inventory
+from accounts.models import Voucher
+
+
+class Command(BaseCommand):
+    help = 'Rebalance sharded voucher stock (all sharded vouchers unless ids are given)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('voucher_ids', nargs='*', type=int, help='Vouchers to act on')
+        parser.add_argument('--shards', type=int, help=f'Split stock across this many rows (1-{inventory.MAX_SHARDS})')
+        parser.add_argument('--off', action='store_true', help='Turn sharding off and fold stock back into the voucher')
+        parser.add_argument('--stock', type=int, help='Set the total stock level while rebalancing')
+
+    def handle(self, *args, **options):
+        if options['off'] and options['shards'] is not None:
+            raise CommandError('Use either --shards or --off, not both')
+        shards = 0 if options['off'] else options['shards']
+        if shards is not None and not options['off'] and not 1 <= shards <= inventory.MAX_SHARDS:
+            raise CommandError(f'--shards must be between 1 and {inventory.MAX_SHARDS}')
+        if options['stock'] is not None and options['stock'] < 0:
+            raise CommandError('--stock cannot be negative')
+
+        if options['voucher_ids']:
+            vouchers = list(Voucher.objects.filter(id__in=options['voucher_ids']))
+            missing = set(options['voucher_ids']) - {voucher.id for voucher in vouchers}
+            if missing:
+                raise CommandError(f"Unknown voucher id(s): {', '.join(map(str, sorted(missing)))}")
+        elif shards is not None or options['stock'] is not None:
+            raise CommandError('Name the vouchers to reshard or restock')
+        else:
+            vouchers = list(Voucher.objects.filter(stock_shard_count__gt=0))
+
+        for voucher in vouchers:
+            total = inventory.set_stock(voucher, shards, options['stock'])
+            layout = f'{voucher.stock_shard_count} shard(s)' if voucher.stock_shard_count else 'unsharded'
+            self.stdout.write(f'{voucher.title}: {total} unit(s), {layout}')
+        self.stdout.write(self.style.SUCCESS(f'Rebalanced {len(vouchers)} voucher(s)'))
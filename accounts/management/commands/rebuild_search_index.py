@@ -0,0 +1,16 @@
+"""
+Django management command to rebuild the voucher full-text search index.
+"""
+from django.core.management.base import BaseCommand
+
+from accounts import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the voucher search index (run after bulk imports that bypass model signals)'
+
+    def handle(self, *args, **options):
+        backend = 'SQLite FTS5' if search.fts_available() else 'in-process inverted index'
+        self.stdout.write(f'Rebuilding voucher search index ({backend})...')
+        count = search.rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} active vouchers'))
@@ -0,0 +1,47 @@
+"""
+Django management command that re-renders finished voucher PDFs across the
+PDF render pool, e.g. after a change to the voucher design.
+
+Redemptions and jobs are pointed at the new files as each render finishes.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts import pdf_jobs, pdf_pool
+from accounts.models import PdfJob
+
+
+class Command(BaseCommand):
+    help = 'Re-render finished voucher PDFs in parallel'
+
+    def add_arguments(self, parser):
+        parser.add_argument('job_ids', nargs='*', type=int, help='PdfJob ids to re-render')
+        parser.add_argument('--all', action='store_true', help='Re-render every finished job')
+        parser.add_argument('--processes', type=int, help='Worker processes (default PDF_RENDER_PROCESSES)')
+
+    def handle(self, *args, **options):
+        if not options['job_ids'] and not options['all']:
+            raise CommandError('Give job ids or --all')
+        jobs = PdfJob.objects.filter(status='done')
+        if options['job_ids']:
+            jobs = jobs.filter(id__in=options['job_ids'])
+        job_ids = list(jobs.order_by('id').values_list('id', flat=True))
+
+        if options['processes'] is not None:
+            pdf_pool.resize(options['processes'])
+        self.stdout.write(f'Re-rendering {len(job_ids)} PDF(s) with {max(1, pdf_pool.processes())} process(es)')
+        try:
+            # Submission waits for free slots, so at most max_pending() renders are in flight
+            futures = [
+                (job_id, pdf_pool.submit(pdf_jobs.rerender, job_id, wait=pdf_pool.FOREVER)) for job_id in job_ids
+            ]
+            failed = 0
+            for job_id, future in futures:
+                try:
+                    pdf_pool.result(future)
+                except Exception as e:
+                    failed += 1
+                    self.stdout.write(self.style.WARNING(f'  job {job_id}: {e}'))
+        finally:
+            # Also shuts the pool down
+            pdf_pool.resize(None)
+        self.stdout.write(self.style.SUCCESS(f'Re-rendered {len(job_ids) - failed} PDF(s), {failed} failed'))
@@ -4,6 +4,7 @@ This ensures all existing users have the same starting point balance.
 """
 
 from django.core.management.base import BaseCommand
+from accounts import points
 from accounts.models import UserProfile, TierActivity
 from django.contrib.auth import get_user_model
 
@@ -62,8 +63,7 @@ class Command(BaseCommand):
                 if profile.points != 10000:
                     old_points = profile.points
                     if not dry_run:
-                        profile.points = 10000
-                        profile.save()
+                        points.set_balance(user, 10000)
                     updated_count += 1
                     self.stdout.write(
                         f'  {"Would reset" if dry_run else "Reset"} {user.email}: '
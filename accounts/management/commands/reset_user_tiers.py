@@ -4,6 +4,7 @@ This will reset users to Bronze tier and clear their tier activity history.
 """
 
 from django.core.management.base import BaseCommand
+from accounts import points
 from accounts.models import UserProfile, TierActivity, UserTier, RewardTier, Notification
 from django.contrib.auth import get_user_model
 from django.utils import timezone
@@ -76,8 +77,7 @@ class Command(BaseCommand):
             if not keep_points and not created:
                 old_points = profile.points
                 if not dry_run:
-                    profile.points = 10000
-                    profile.save()
+                    points.set_balance(user, 10000)
                 reset_profiles += 1
                 self.stdout.write(f'  Reset profile points: {old_points} -> 10,000')
             
@@ -0,0 +1,38 @@
+"""
+Django management command that snapshots points balances so ledger replays
+stay short, and optionally checks the cached balances against the ledger.
+
+Schedule it periodically (e.g. nightly).
+"""
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from accounts import points
+from accounts.models import PointsLedger
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Snapshot points balances and optionally verify them against the ledger'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true', help='Compare cached balances with a ledger replay')
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(id__in=PointsLedger.objects.values('user')).order_by('id').iterator()
+        taken = drifted = 0
+        for user in users:
+            if points.take_snapshot(user) is not None:
+                taken += 1
+            if options['verify']:
+                cached, replayed = points.verify(user)
+                if cached != replayed:
+                    drifted += 1
+                    self.stdout.write(self.style.WARNING(
+                        f'  {user.email}: cached {cached}, ledger {replayed} ({cached - replayed:+d})'
+                    ))
+        self.stdout.write(self.style.SUCCESS(f'Took {taken} snapshot(s)'))
+        if options['verify']:
+            style = self.style.ERROR if drifted else self.style.SUCCESS
+            self.stdout.write(style(f'{drifted} balance(s) differ from the ledger'))
@@ -1,4 +1,5 @@
 from django.core.management.base import BaseCommand
+from accounts import points
 from accounts.models import Voucher, UserProfile, Redemption
 from users.models import CustomUser as User
 from django.utils import timezone
@@ -31,8 +32,7 @@ class Command(BaseCommand):
         )
         
         if profile.points < 100000:
-            profile.points = 100000
-            profile.save()
+            points.set_balance(test_user, 100000)
             self.stdout.write('Updated test user points to 100,000')
         
         vouchers = Voucher.objects.filter(is_active=True)
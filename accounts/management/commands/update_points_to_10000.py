@@ -1,5 +1,6 @@
 from django.core.management.base import BaseCommand
 from django.contrib.auth import get_user_model
+from accounts import points
 from accounts.models import UserProfile
 
 class Command(BaseCommand):
@@ -14,16 +15,13 @@ class Command(BaseCommand):
         created_count = 0
 
         for user in users:
-            profile, created = UserProfile.objects.get_or_create(user=user)
+            profile, created = UserProfile.objects.get_or_create(user=user, defaults={'points': 10000})
             if created:
-                profile.points = 10000
-                profile.save()
                 self.stdout.write(f'Created profile for {user.email} with {profile.points} points')
                 created_count += 1
             elif profile.points != 10000:
                 self.stdout.write(f'Updated {user.email} from {profile.points} to 10,000 points')
-                profile.points = 10000
-                profile.save()
+                points.set_balance(user, 10000)
                 updated_count += 1
             else:
                 self.stdout.write(f'{user.email} already has {profile.points} points')
@@ -3,6 +3,7 @@ Django management command to update all existing users to have 6000 points.
 """
 from django.core.management.base import BaseCommand
 from django.contrib.auth import get_user_model
+from accounts import points
 from accounts.models import UserProfile
 
 class Command(BaseCommand):
@@ -40,8 +41,7 @@ class Command(BaseCommand):
                 self.stdout.write(f'Created profile for {user.email} with 6000 points')
             elif profile.points != 6000:
                 if not dry_run:
-                    profile.points = 6000
-                    profile.save()
+                    points.set_balance(user, 6000)
                     updated_count += 1
                     self.stdout.write(f'Updated {user.email} from {profile.points} to 6000 points')
                 else:
@@ -0,0 +1,45 @@
+from django.db import migrations
+
+FTS_TABLE = 'accounts_voucher_search'
+
+
+def create_search_index(apps, schema_editor):
+    """Create and populate the FTS5 voucher index on SQLite builds that support it."""
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        try:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+                "voucher_id UNINDEXED, title, category, description, terms, "
+                "tokenize = 'unicode61 remove_diacritics 2')"
+            )
+        except Exception:
+            # SQLite compiled without FTS5: accounts.search falls back to Python
+            return
+        Voucher = apps.get_model('accounts', 'Voucher')
+        for voucher in Voucher.objects.filter(is_active=True).select_related('category'):
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (voucher_id, title, category, description, terms) "
+                "VALUES (%s, %s, %s, %s, %s)",
+                [voucher.id, voucher.title, voucher.category.name, voucher.description, voucher.terms],
+            )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_dataversion'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.6 on 2026-10-16 21:07
+
+from django.db import migrations, models
+from django.db.models import F, Sum
+
+
+def backfill_totals(apps, schema_editor):
+    """Compute the running totals for existing carts."""
+    Cart = apps.get_model('accounts', 'Cart')
+    CartItem = apps.get_model('accounts', 'CartItem')
+    totals = (
+        CartItem.objects.values('cart_id')
+        .annotate(points=Sum(F('quantity') * F('voucher__points')), count=Sum('quantity'))
+    )
+    for row in totals:
+        Cart.objects.filter(id=row['cart_id']).update(total_points=row['points'] or 0, item_count=row['count'] or 0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0011_idempotencyrecord'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cart',
+            name='item_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='cart',
+            name='total_points',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.6 on 2026-10-16 21:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0012_cart_totals'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='voucher',
+            name='stock_shard_count',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='VoucherStockShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.PositiveSmallIntegerField()),
+                ('quantity', models.IntegerField(default=0)),
+                ('voucher', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_shards', to='accounts.voucher')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('voucher', 'shard'), name='unique_stock_shard_per_voucher')],
+            },
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.6 on 2026-10-16 21:41
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def open_ledger(apps, schema_editor):
+    """Record every existing profile's points as its opening balance, with a snapshot at that entry."""
+    UserProfile = apps.get_model('accounts', 'UserProfile')
+    PointsLedger = apps.get_model('accounts', 'PointsLedger')
+    PointsSnapshot = apps.get_model('accounts', 'PointsSnapshot')
+    for profile in UserProfile.objects.only('user_id', 'points').iterator():
+        entry = PointsLedger.objects.create(user_id=profile.user_id, amount=profile.points, reason='opening_balance')
+        PointsSnapshot.objects.create(user_id=profile.user_id, balance=profile.points, last_entry_id=entry.id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0013_voucher_stock_shards'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PointsLedger',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.IntegerField()),
+                ('reason', models.CharField(choices=[('opening_balance', 'Opening balance'), ('tier_activity', 'Tier activity'), ('game', 'Mini-game'), ('redemption', 'Voucher redemption'), ('checkout', 'Cart checkout'), ('adjustment', 'Manual adjustment')], max_length=20)),
+                ('reference', models.CharField(blank=True, max_length=100)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='points_ledger', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'id'], name='accounts_po_user_id_5a62c8_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='PointsSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('balance', models.IntegerField()),
+                ('last_entry_id', models.BigIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='points_snapshots', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', '-last_entry_id'], name='accounts_po_user_id_5395d6_idx')],
+            },
+        ),
+        migrations.RunPython(open_ledger, migrations.RunPython.noop),
+    ]
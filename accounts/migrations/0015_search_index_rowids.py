@@ -0,0 +1,36 @@
+from django.db import migrations
+
+FTS_TABLE = 'accounts_voucher_search'
+
+
+def key_search_index_by_voucher(apps, schema_editor):
+    """Re-insert every FTS5 row with rowid = voucher id, so updates delete by rowid."""
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+        if cursor.fetchone() is None:
+            return
+        cursor.execute(
+            f"CREATE TEMP TABLE {FTS_TABLE}_copy AS "
+            f"SELECT voucher_id, title, category, description, terms FROM {FTS_TABLE}"
+        )
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, voucher_id, title, category, description, terms) "
+            f"SELECT voucher_id, voucher_id, title, category, description, terms FROM {FTS_TABLE}_copy "
+            f"GROUP BY voucher_id"
+        )
+        cursor.execute(f"DROP TABLE {FTS_TABLE}_copy")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0014_points_ledger'),
+    ]
+
+    operations = [
+        migrations.RunPython(key_search_index_by_voucher, migrations.RunPython.noop),
+    ]
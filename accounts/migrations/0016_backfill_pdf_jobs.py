@@ -0,0 +1,25 @@
+from django.db import migrations
+from django.db.models import Q
+
+
+def backfill_pdf_jobs(apps, schema_editor):
+    """Queue a PDF job for every completed redemption from before the queue that still lacks a PDF."""
+    Redemption = apps.get_model('accounts', 'Redemption')
+    PdfJob = apps.get_model('accounts', 'PdfJob')
+    missing = Redemption.objects.filter(
+        Q(pdf_url__isnull=True) | Q(pdf_url=''), status='completed', pdf_jobs__isnull=True,
+    )
+    for redemption in missing.iterator():
+        job = PdfJob.objects.create()
+        job.redemptions.add(redemption)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0015_search_index_rowids'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_pdf_jobs, migrations.RunPython.noop),
+    ]
@@ -2,12 +2,11 @@
 Django models for the accounts app.
 Defines voucher categories, vouchers, user profiles, cart, and redemption models.
 """
-import random
-import string
 import uuid
 from typing import TYPE_CHECKING
 
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from django.utils import timezone
 
@@ -35,6 +34,9 @@ class Voucher(models.Model):
     description = models.TextField()
     terms = models.TextField()
     quantity_available = models.IntegerField(default=0)
+    # Non-zero for flash-sale vouchers whose stock lives in VoucherStockShard
+    # rows (see accounts.inventory); quantity_available is then a snapshot
+    stock_shard_count = models.PositiveSmallIntegerField(default=0)
     featured = models.BooleanField(default=False)
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -48,6 +50,20 @@ class Voucher(models.Model):
         """Return formatted discount percentage."""
         return f"{self.discount_percentage}% off"
 
+class VoucherStockShard(models.Model):
+    """One slice of a sharded voucher's stock, so concurrent redemptions update different rows."""
+    voucher = models.ForeignKey(Voucher, on_delete=models.CASCADE, related_name='stock_shards')
+    shard = models.PositiveSmallIntegerField()
+    quantity = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['voucher', 'shard'], name='unique_stock_shard_per_voucher'),
+        ]
+
+    def __str__(self) -> str:
+        return f"Voucher {self.voucher_id} shard {self.shard}: {self.quantity}"
+
 class Promotion(models.Model):
     """A time-based promotion that applies a percentage discount to selected voucher categories."""
     name = models.CharField(max_length=200)
@@ -90,6 +106,9 @@ class UserProfile(models.Model):
 class Cart(models.Model):
     """Model representing user's shopping cart."""
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    # Running totals at list price, maintained by accounts.carts
+    total_points = models.IntegerField(default=0)
+    item_count = models.IntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -97,16 +116,6 @@ class Cart(models.Model):
         user_email = getattr(self.user, 'email', 'Unknown')
         return f"Cart for {user_email}"
 
-    @property
-    def total_points(self) -> int:
-        """Calculate total points for all items in cart."""
-        # items is created by the related_name='items' in CartItem model
-        # Using getattr to safely access the related manager
-        items = getattr(self, 'items', None)
-        if items is None:
-            return 0
-        return sum(item.quantity * item.voucher.points for item in items.all())
-
 class CartItem(models.Model):
     """Model representing individual items in a user's cart."""
     cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name='items')
@@ -149,15 +158,9 @@ class Redemption(models.Model):
         super().save(*args, **kwargs)
 
     def generate_coupon_code(self) -> str:
-        """Generate a unique coupon code."""
-        while True:
-            code = ''.join(random.choices(string.ascii_uppercase + string.digits, k=8))
-            # Using getattr to safely access the Django manager
-            manager = getattr(self.__class__, 'objects', None)
-            if manager is None:
-                return code  # Fallback if manager is not available
-            if not manager.filter(coupon_code=code).exists():
-                return code
+        """Allocate a unique coupon code from the coupon sequence."""
+        from accounts import coupons  # imported lazily: coupons imports this module
+        return coupons.allocate(1)[0]
 
 class Notification(models.Model):
     """Model representing user notifications."""
@@ -363,12 +366,13 @@ class TierActivity(models.Model):
 
     def save(self, *args, **kwargs):
         """Update user tier when activity is saved."""
+        from accounts import points  # imported lazily: points imports this module
+        adding = self._state.adding
         super().save(*args, **kwargs)
         
-        # Update user's total points and check for tier upgrade
-        user_profile, created = UserProfile.objects.get_or_create(user=self.user)
-        user_profile.points += self.points_earned
-        user_profile.save()
+        # Credit the activity's points once, when it is first recorded
+        if adding:
+            points.credit(self.user, self.points_earned, points.TIER_ACTIVITY, self.pk)
         
         # Update or create user tier
         user_tier, created = UserTier.objects.get_or_create(
@@ -428,4 +432,132 @@ class LeaderboardEntry(models.Model):
     last_updated = models.DateTimeField(auto_now=True)
     
     class Meta:
-        ordering = ['-total_points', 'last_updated']
\ No newline at end of file
+        ordering = ['-total_points', 'last_updated']
+
+# -------------------------
+# Cache Versioning
+# -------------------------
+
+class DataVersion(models.Model):
+    """Version stamp for a cached dataset, shared by every worker process."""
+    name = models.CharField(max_length=50, unique=True)
+    stamp = models.CharField(max_length=32)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self) -> str:
+        return f"{self.name} @ {self.stamp}"
+
+
+# -------------------------
+# Coupon Codes
+# -------------------------
+
+class CouponSequence(models.Model):
+    """Monotonic counter that coupon codes are encoded from (see accounts.coupons)."""
+    name = models.CharField(max_length=50, unique=True)
+    next_value = models.BigIntegerField(default=1)
+
+    def __str__(self) -> str:
+        return f"{self.name} -> {self.next_value}"
+
+
+# -------------------------
+# PDF Jobs
+# -------------------------
+
+class PdfJob(models.Model):
+    """Queued rendering of one voucher PDF covering one or more redemptions."""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    redemptions = models.ManyToManyField(Redemption, related_name='pdf_jobs')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    pdf_url = models.URLField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'run_after'])]
+
+    def __str__(self) -> str:
+        return f"PdfJob {self.pk} ({self.status}, attempt {self.attempts})"
+
+
+# -------------------------
+# Idempotency
+# -------------------------
+
+class IdempotencyRecord(models.Model):
+    """Stored outcome of a POST sent with an Idempotency-Key, replayed on retries."""
+    STATUS_CHOICES = [
+        ('in_progress', 'In progress'),
+        ('completed', 'Completed'),
+    ]
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    key = models.CharField(max_length=255)
+    endpoint = models.CharField(max_length=100)
+    fingerprint = models.CharField(max_length=64)
+    status = models.CharField(max_length=12, choices=STATUS_CHOICES, default='in_progress')
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='unique_idempotency_key_per_user'),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.endpoint} [{self.key}] {self.status}"
+
+
+# -------------------------
+# Points ledger
+# -------------------------
+
+class PointsLedger(models.Model):
+    """One signed change to a user's points balance; rows are only ever appended."""
+    REASON_CHOICES = [
+        ('opening_balance', 'Opening balance'),
+        ('tier_activity', 'Tier activity'),
+        ('game', 'Mini-game'),
+        ('redemption', 'Voucher redemption'),
+        ('checkout', 'Cart checkout'),
+        ('adjustment', 'Manual adjustment'),
+    ]
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='points_ledger')
+    amount = models.IntegerField()
+    reason = models.CharField(max_length=20, choices=REASON_CHOICES)
+    reference = models.CharField(max_length=100, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['user', 'id'])]
+
+    def __str__(self) -> str:
+        return f"{self.user_id} {self.amount:+d} ({self.reason})"
+
+class PointsSnapshot(models.Model):
+    """A user's balance as of a ledger entry, so history replays from here instead of the start."""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='points_snapshots')
+    balance = models.IntegerField()
+    last_entry_id = models.BigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['user', '-last_entry_id'])]
+
+    def __str__(self) -> str:
+        return f"{self.user_id} balance {self.balance} at entry {self.last_entry_id}"
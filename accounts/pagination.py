@@ -0,0 +1,169 @@
+"""
+Keyset (cursor) pagination shared by the list endpoints.
+
+A cursor is an opaque, URL-safe token encoding the sort-key values of the
+last row on the previous page, always ending with the row id as a
+tie-breaker. The next page is "rows strictly after that key" in the
+endpoint's ordering, so pages stay stable while new rows are inserted and
+each page costs one indexed query (or one scan of the in-memory catalog)
+no matter how deep the client pages.
+
+Endpoints opt in when the client sends ``limit`` or ``cursor``; responses
+then carry ``results`` and a ``next`` link (None on the last page).
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, NamedTuple
+
+from django.db.models import Q
+
+MAX_PAGE_SIZE = 100
+
+
+class PaginationError(ValueError):
+    """Raised for a malformed ``limit`` or ``cursor`` query parameter."""
+
+
+class PageParams(NamedTuple):
+    """Parsed pagination parameters for one request."""
+    limit: int
+    cursor: list | None
+
+
+class Page(NamedTuple):
+    """One page of results plus the key to resume after, if there is more."""
+    items: list
+    next_key: list | None
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot encode {type(value).__name__} in a cursor")
+
+
+def encode_cursor(values: list) -> str:
+    """Encode sort-key values into an opaque cursor token."""
+    raw = json.dumps(values, default=_json_default, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token: str) -> list:
+    """Decode a cursor token produced by :func:`encode_cursor`."""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw)
+    except Exception as exc:
+        raise PaginationError('Invalid cursor') from exc
+    if not isinstance(values, list) or not values:
+        raise PaginationError('Invalid cursor')
+    return values
+
+
+def is_paginated(request) -> bool:
+    """Return True if the client asked for a paged response."""
+    return 'limit' in request.query_params or 'cursor' in request.query_params
+
+
+def get_page_params(request, default_limit: int = 20) -> PageParams:
+    """Parse ``limit`` (1..MAX_PAGE_SIZE) and ``cursor`` from the query string."""
+    raw_limit = request.query_params.get('limit')
+    try:
+        limit = int(raw_limit) if raw_limit else default_limit
+    except (TypeError, ValueError) as exc:
+        raise PaginationError('limit must be an integer') from exc
+    if limit < 1:
+        raise PaginationError('limit must be positive')
+    token = request.query_params.get('cursor')
+    cursor = decode_cursor(token) if token else None
+    return PageParams(min(limit, MAX_PAGE_SIZE), cursor)
+
+
+def next_link(request, page: Page) -> str | None:
+    """Return the absolute URL of the page after ``page``, or None."""
+    if page.next_key is None:
+        return None
+    params = request.query_params.copy()
+    params['cursor'] = encode_cursor(page.next_key)
+    params['limit'] = params.get('limit') or str(len(page.items))
+    return request.build_absolute_uri(f"{request.path}?{params.urlencode()}")
+
+
+def paginate_queryset(queryset, ordering: tuple, params: PageParams) -> Page:
+    """
+    Return one page of ``queryset`` ordered by ``ordering``.
+
+    ``ordering`` is a tuple of field names ('-' prefix for descending) whose
+    last element must be unique, e.g. ('-created_at', '-id').
+    """
+    queryset = queryset.order_by(*ordering)
+    names = [field.lstrip('-') for field in ordering]
+    if params.cursor is not None:
+        if len(params.cursor) != len(ordering):
+            raise PaginationError('Invalid cursor')
+        model_fields = queryset.model._meta
+        try:
+            values = [
+                model_fields.get_field(name).to_python(value)
+                for name, value in zip(names, params.cursor)
+            ]
+        except Exception as exc:
+            raise PaginationError('Invalid cursor') from exc
+        # (a < x) OR (a = x AND b < y) OR ... for descending fields
+        after = Q()
+        for i, field in enumerate(ordering):
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition = Q(**{f'{names[i]}__{lookup}': values[i]})
+            for name, value in zip(names[:i], values[:i]):
+                condition &= Q(**{name: value})
+            after |= condition
+        queryset = queryset.filter(after)
+
+    rows = list(queryset[:params.limit + 1])
+    items = rows[:params.limit]
+    next_key = None
+    if len(rows) > params.limit:
+        last = items[-1]
+        next_key = [getattr(last, name) for name in names]
+    return Page(items, next_key)
+
+
+def paginate_sequence(items: list, sort_key, params: PageParams, parse_cursor=None) -> Page:
+    """
+    Return one page of an in-memory list already sorted descending by ``sort_key``.
+
+    ``sort_key(item)`` returns the tuple encoded in cursors; ``parse_cursor``
+    converts decoded cursor values back into a comparable tuple.
+    """
+    start = 0
+    if params.cursor is not None:
+        try:
+            after: Any = tuple(parse_cursor(params.cursor) if parse_cursor else params.cursor)
+            if items:
+                # The cursor must compare with the keys, element by element, without a TypeError
+                sample = sort_key(items[0])
+                if len(after) != len(sample):
+                    raise ValueError('cursor length does not match the sort key')
+                for value, key in zip(after, sample):
+                    _ = value < key
+        except Exception as exc:
+            raise PaginationError('Invalid cursor') from exc
+        start = len(items)
+        for index, item in enumerate(items):
+            if sort_key(item) < after:
+                start = index
+                break
+    page = list(items[start:start + params.limit])
+    next_key = None
+    if start + params.limit < len(items):
+        next_key = list(sort_key(page[-1]))
+    return Page(page, next_key)
+
+
+def paginated_response_data(request, page: Page, results: list) -> dict:
+    """Build the standard paged response body."""
+    return {
+        'results': results,
+        'next': next_link(request, page),
+    }
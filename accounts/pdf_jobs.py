@@ -0,0 +1,156 @@
+"""
+Database-backed queue for voucher PDF rendering.
+
+Redemption requests only enqueue a ``PdfJob`` inside their transaction; the
+``process_pdf_jobs`` worker renders the PDF afterwards, outside any request
+and outside the redemption's write transaction. Workers claim jobs with a
+conditional UPDATE so several can run side by side. A failed render is
+retried with exponential backoff up to ``max_attempts``; a job whose worker
+died mid-render is reclaimed once its lock goes stale.
+"""
+import traceback
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from accounts.models import PdfJob, Redemption
+
+RETRY_BASE_SECONDS = 30
+STALE_LOCK_SECONDS = 300
+
+# pdf_status values reported to clients
+READY = 'ready'
+PENDING = 'pending'
+FAILED = 'failed'
+
+
+def enqueue(redemptions) -> PdfJob:
+    """Queue one PDF covering ``redemptions`` (a combined PDF if more than one)."""
+    job = PdfJob.objects.create()
+    job.redemptions.add(*redemptions)
+    return job
+
+
+def _claimable(now):
+    stale = now - timedelta(seconds=STALE_LOCK_SECONDS)
+    return Q(status='pending', run_after__lte=now) | Q(status='running', locked_at__lt=stale)
+
+
+def claim_next() -> PdfJob | None:
+    """Lock and return the oldest runnable job, or None if the queue is idle."""
+    while True:
+        now = timezone.now()
+        candidate = (
+            PdfJob.objects.filter(_claimable(now))
+            .order_by('run_after', 'id')
+            .values('id', 'status', 'locked_at')
+            .first()
+        )
+        if candidate is None:
+            return None
+        claimed = (
+            PdfJob.objects
+            .filter(id=candidate['id'], status=candidate['status'], locked_at=candidate['locked_at'])
+            .update(status='running', locked_at=now, attempts=F('attempts') + 1)
+        )
+        if claimed:
+            return PdfJob.objects.get(id=candidate['id'])
+        # Another worker won the race; try the next job
+
+
+def _render(redemptions) -> str | None:
+    # Imported lazily: the renderers live in views, which imports this module
+    from accounts.views import generate_multi_voucher_pdf, generate_voucher_pdf
+    if len(redemptions) == 1:
+        return generate_voucher_pdf(redemptions[0])
+    return generate_multi_voucher_pdf(redemptions)
+
+
+def _redemptions(job: PdfJob) -> list:
+    return list(job.redemptions.select_related('voucher', 'voucher__category', 'user').order_by('created_at'))
+
+
+def run(job: PdfJob) -> bool:
+    """Render ``job``'s PDF and record the outcome; return True on success."""
+    redemptions = _redemptions(job)
+    try:
+        if not redemptions:
+            raise RuntimeError('Job has no redemptions')
+        pdf_url = _render(redemptions)
+        if not pdf_url:
+            raise RuntimeError('Renderer returned no PDF URL')
+    except Exception as e:
+        now = timezone.now()
+        error = f"{e}\n{traceback.format_exc(limit=5)}"
+        if job.attempts >= job.max_attempts:
+            PdfJob.objects.filter(id=job.id).update(status='failed', locked_at=None, last_error=error)
+        else:
+            backoff = timedelta(seconds=RETRY_BASE_SECONDS * 2 ** (job.attempts - 1))
+            PdfJob.objects.filter(id=job.id).update(
+                status='pending', locked_at=None, last_error=error, run_after=now + backoff
+            )
+        return False
+
+    with transaction.atomic():
+        Redemption.objects.filter(id__in=[r.id for r in redemptions]).update(pdf_url=pdf_url)
+        PdfJob.objects.filter(id=job.id).update(
+            status='done', locked_at=None, pdf_url=pdf_url, completed_at=timezone.now()
+        )
+    return True
+
+
+def rerender(job_id: int) -> str:
+    """
+    Render a finished job's PDF again, e.g. after a design change, and
+    point its redemptions at the new file; return its URL.
+
+    Used by the ``regenerate_voucher_pdfs`` command, in render pool workers.
+    """
+    job = PdfJob.objects.get(id=job_id)
+    redemptions = _redemptions(job)
+    if not redemptions:
+        raise RuntimeError('Job has no redemptions')
+    pdf_url = _render(redemptions)
+    if not pdf_url:
+        raise RuntimeError('Renderer returned no PDF URL')
+    with transaction.atomic():
+        Redemption.objects.filter(id__in=[r.id for r in redemptions]).update(pdf_url=pdf_url)
+        PdfJob.objects.filter(id=job.id).update(pdf_url=pdf_url)
+    return pdf_url
+
+
+def run_pending(limit: int | None = None) -> tuple:
+    """Process runnable jobs until the queue is idle; return (succeeded, failed)."""
+    succeeded = failed = 0
+    while limit is None or succeeded + failed < limit:
+        job = claim_next()
+        if job is None:
+            break
+        if run(job):
+            succeeded += 1
+        else:
+            failed += 1
+    return succeeded, failed
+
+
+def pdf_status(redemption) -> dict:
+    """
+    Describe the PDF state of ``redemption`` for API responses.
+
+    Read-only: redemptions from before the queue existed were given jobs
+    by migration 0016, so a redemption without a PDF or job is reported
+    as pending.
+    """
+    if redemption.pdf_url:
+        return {'pdf_status': READY, 'pdf_url': redemption.pdf_url}
+    job = redemption.pdf_jobs.order_by('-id').first()
+    if job is None:
+        return {'pdf_status': PENDING, 'pdf_url': None, 'attempts': 0}
+    if job.status == 'done' and job.pdf_url:
+        return {'pdf_status': READY, 'pdf_url': job.pdf_url}
+    if job.status == 'failed':
+        return {'pdf_status': FAILED, 'pdf_url': None, 'attempts': job.attempts,
+                'error': (job.last_error or '').splitlines()[0] if job.last_error else ''}
+    return {'pdf_status': PENDING, 'pdf_url': None, 'attempts': job.attempts}
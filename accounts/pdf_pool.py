@@ -0,0 +1,181 @@
+"""
+Process pool for CPU-bound voucher PDF rendering.
+
+reportlab layout and drawing are pure Python and hold the GIL, so threads
+cannot render two PDFs at once. ``submit`` and ``run`` send render calls
+to a per-process pool of ``PDF_RENDER_PROCESSES`` worker processes
+instead, and ``stitch`` joins PDF parts rendered that way into one
+document.
+
+* Workers are spawned rather than forked and run ``django.setup()`` first.
+  They share no database connections or locks with the parent and can
+  unpickle model instances. Workers never start pools of their own.
+* At most ``max_pending()`` calls are queued or running at once. A caller
+  waits up to ``SUBMIT_TIMEOUT`` seconds for a free slot and then gets
+  ``PoolBusy``, so a burst of large renders backs off (callers render
+  serially instead) rather than queueing without bound.
+* Each result must arrive within ``PDF_RENDER_TIMEOUT`` seconds of the
+  caller starting to wait for it. A running call cannot be cancelled, so on
+  a timeout the pool's workers are killed, ``RenderTimeout`` is raised and
+  the next call starts a fresh pool.
+
+With ``PDF_RENDER_PROCESSES`` at 0 or 1, calls run inline in the caller.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from io import BytesIO
+
+import django
+from django.conf import settings
+from pypdf import PdfWriter
+
+SUBMIT_TIMEOUT = 5
+# Pass as ``wait`` to wait for a free slot indefinitely
+FOREVER = object()
+DEFAULT_JOB_TIMEOUT = 60
+
+
+class PoolBusy(Exception):
+    """No render slot freed up in time."""
+
+
+class RenderTimeout(Exception):
+    """A render call did not finish in time."""
+
+
+# True inside pool workers
+_in_worker = False
+# Set by ``resize``; None means PDF_RENDER_PROCESSES
+_size = None
+
+_pool = None
+_slots = None
+_lock = threading.Lock()
+
+
+def processes() -> int:
+    if _in_worker:
+        return 0
+    if _size is not None:
+        return _size
+    return getattr(settings, 'PDF_RENDER_PROCESSES', min(4, os.cpu_count() or 1))
+
+
+def enabled() -> bool:
+    return processes() > 1
+
+
+def max_pending() -> int:
+    return 2 * processes()
+
+
+def job_timeout() -> float:
+    return getattr(settings, 'PDF_RENDER_TIMEOUT', DEFAULT_JOB_TIMEOUT)
+
+
+def _init_worker() -> None:
+    global _in_worker
+    _in_worker = True
+    django.setup()
+
+
+def _get_pool():
+    global _pool, _slots
+    with _lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=processes(),
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+            )
+            _slots = threading.BoundedSemaphore(max_pending())
+        return _pool, _slots
+
+
+def shutdown(kill: bool = False) -> None:
+    """Stop this process's pool; ``kill`` terminates workers mid-render."""
+    global _pool, _slots
+    with _lock:
+        pool, _pool, _slots = _pool, None, None
+    if pool is None:
+        return
+    if kill:
+        # The executor has no way to stop a running call, so stop its workers
+        for process in list((getattr(pool, '_processes', None) or {}).values()):
+            process.terminate()
+    pool.shutdown(wait=not kill, cancel_futures=True)
+
+
+def resize(count: int | None) -> None:
+    """Use ``count`` processes from now on (None: back to ``PDF_RENDER_PROCESSES``)."""
+    global _size
+    shutdown()
+    _size = count
+
+
+def submit(fn, *args, wait=None) -> Future:
+    """
+    Queue ``fn(*args)`` on the pool and return its future.
+
+    Waits up to ``wait`` seconds (None: ``SUBMIT_TIMEOUT``, ``FOREVER``:
+    indefinitely) for a free slot, then raises ``PoolBusy``. ``fn`` and
+    its arguments must be picklable.
+    """
+    if not enabled():
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+    if wait is None:
+        wait = SUBMIT_TIMEOUT
+    pool, slots = _get_pool()
+    # The slot is held until the render finishes and released by the future's
+    # done callback below, so it cannot be scoped to a ``with`` block here
+    if not slots.acquire(timeout=None if wait is FOREVER else wait):  # pylint: disable=consider-using-with
+        raise PoolBusy(f'{max_pending()} PDF renders already pending')
+    try:
+        future = pool.submit(fn, *args)
+    except BaseException:
+        slots.release()
+        raise
+    future.add_done_callback(lambda _future: slots.release())
+    return future
+
+
+def result(future: Future):
+    """Wait for a submitted call, killing the pool if it overruns ``job_timeout()``."""
+    try:
+        return future.result(timeout=job_timeout())
+    except FutureTimeout:
+        shutdown(kill=True)
+        raise RenderTimeout(f'PDF render did not finish within {job_timeout()}s') from None
+
+
+def run(fn, calls, wait=None) -> list:
+    """Run ``fn(*args)`` for each ``args`` in ``calls`` across the pool; return the results in order."""
+    futures = []
+    try:
+        for args in calls:
+            futures.append(submit(fn, *args, wait=wait))
+        return [result(future) for future in futures]
+    except BaseException:
+        for future in futures:
+            future.cancel()
+        raise
+
+
+def stitch(parts: list) -> bytes:
+    """Concatenate PDF documents, given as bytes, into one."""
+    if len(parts) == 1:
+        return parts[0]
+    writer = PdfWriter()
+    for part in parts:
+        writer.append(BytesIO(part))
+    buffer = BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
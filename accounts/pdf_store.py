@@ -0,0 +1,137 @@
+"""
+Content-addressed storage for generated voucher PDFs.
+
+Renderers used to write every PDF as ``MEDIA_ROOT/vouchers/<name>.pdf``
+in one flat directory, one file per redemption, rewritten on every retry
+and never removed. ``save`` now stores a PDF under its SHA-256 digest,
+sharded as ``<aa>/<bb>/<sha256>.pdf``, so no directory grows past a few
+hundred entries and byte-identical renders share one file. Renderers
+build their documents with reportlab's ``invariant`` flag, which leaves
+out the creation time and random document id, so re-rendering unchanged
+content produces identical bytes.
+
+Files go through Django's ``Storage`` API. ``VOUCHER_PDF_STORAGE`` names
+an alias in ``STORAGES`` (e.g. an S3-compatible backend); without it PDFs
+are kept under ``MEDIA_ROOT/vouchers`` by ``AtomicFileSystemStorage``,
+which writes to a temporary file and renames it into place so readers
+never see a partial PDF.
+
+``prune`` deletes stored PDFs that no redemption or job points at. The
+``migrate_voucher_pdfs`` command moves files from the old flat layout.
+"""
+import hashlib
+import os
+import re
+import tempfile
+from datetime import timedelta
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, storages
+from django.utils import timezone
+
+# Objects younger than this may belong to a render not yet recorded on its job
+PRUNE_MIN_AGE = timedelta(hours=1)
+
+_NAME = re.compile(r'(?:^|/)([0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.pdf)$')
+
+
+class AtomicFileSystemStorage(FileSystemStorage):
+    """File system storage that renames complete files into place, overwriting same-named ones."""
+
+    def get_available_name(self, name, max_length=None):
+        # Names are content digests: an existing file already has this content
+        return name
+
+    def _save(self, name, content):
+        full_path = self.path(name)
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in content.chunks():
+                    f.write(chunk)
+            if self.file_permissions_mode is not None:
+                os.chmod(tmp, self.file_permissions_mode)
+            os.replace(tmp, full_path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        return str(name).replace('\\', '/')
+
+
+def legacy_dir() -> str:
+    """The flat directory renderers wrote to before this module existed."""
+    return os.path.join(settings.MEDIA_ROOT, 'vouchers')
+
+
+def storage():
+    alias = getattr(settings, 'VOUCHER_PDF_STORAGE', None)
+    if alias:
+        return storages[alias]
+    return AtomicFileSystemStorage(location=legacy_dir(), base_url=f'{settings.MEDIA_URL}vouchers/')
+
+
+def name_for(content: bytes) -> str:
+    digest = hashlib.sha256(content).hexdigest()
+    return f'{digest[:2]}/{digest[2:4]}/{digest}.pdf'
+
+
+def name_for_url(url: str) -> str | None:
+    """The stored name a ``save`` URL refers to, or None for other URLs."""
+    match = _NAME.search(urlsplit(url or '').path)
+    return match.group(1) if match else None
+
+
+def save(content: bytes) -> str:
+    """Store a rendered PDF, unless identical bytes are already stored; return its URL."""
+    store = storage()
+    name = name_for(content)
+    if not store.exists(name):
+        name = store.save(name, ContentFile(content))
+    return store.url(name)
+
+
+def read(name: str) -> bytes | None:
+    """Return a stored PDF's bytes, or None if it is missing."""
+    store = storage()
+    if not store.exists(name):
+        return None
+    with store.open(name, 'rb') as f:
+        return f.read()
+
+
+def stored_names():
+    """Yield the name of every stored PDF."""
+    store = storage()
+    try:
+        shards = store.listdir('')[0]
+    except FileNotFoundError:
+        return
+    for first in shards:
+        for second in store.listdir(first)[0]:
+            for filename in store.listdir(f'{first}/{second}')[1]:
+                name = f'{first}/{second}/{filename}'
+                if _NAME.fullmatch(name):
+                    yield name
+
+
+def prune(referenced_urls) -> int:
+    """Delete stored PDFs older than ``PRUNE_MIN_AGE`` that no URL in ``referenced_urls`` names; return the count."""
+    store = storage()
+    keep = {name_for_url(url) for url in referenced_urls}
+    cutoff = timezone.now() - PRUNE_MIN_AGE
+    deleted = 0
+    for name in list(stored_names()):
+        if name in keep:
+            continue
+        try:
+            if store.get_modified_time(name) > cutoff:
+                continue
+        except NotImplementedError:
+            pass
+        store.delete(name)
+        deleted += 1
+    return deleted
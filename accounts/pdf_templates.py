@@ -0,0 +1,143 @@
+"""
+Two-layer rendering: a cached page layout plus per-render stamped fields.
+
+Most of a voucher PDF (image, title, description, terms, branding) is the
+same for every redemption of that voucher; only a handful of one-line
+fields (coupon code, quantity, points, dates) differ. ``record`` lays out
+a story once, with ``Slot`` placeholders standing in for those fields, and
+remembers where platypus placed every flowable on every page. ``stamp``
+then draws the already laid out flowables straight onto a new canvas and
+lays out only the slot paragraphs, skipping markup parsing, line breaking
+and pagination for everything else.
+
+Templates are cached per process by a caller-supplied key (see
+``accounts.premium_pdf``), least recently used first out once there are
+more than ``MAX_TEMPLATES``. A slot keeps the height it had when the
+template was recorded, so stamped text must fit it; if it does not,
+``stamp`` raises ``TemplateMismatch`` and the caller falls back to a full
+layout.
+"""
+import copy
+import threading
+from collections import OrderedDict
+from io import BytesIO
+from typing import Callable, NamedTuple
+
+from reportlab.pdfgen import canvas
+from reportlab.platypus import BaseDocTemplate, Frame, PageTemplate, Paragraph
+
+MAX_TEMPLATES = 256
+
+
+class TemplateMismatch(Exception):
+    """Stamped content does not fit the template it was stamped onto."""
+
+
+class Slot(Paragraph):
+    """A per-render paragraph: takes part in layout, but is drawn by ``stamp``."""
+
+    def __init__(self, key: str, text: str, style):
+        super().__init__(text, style)
+        self.key = key
+
+    def draw(self):
+        pass
+
+
+class Placement(NamedTuple):
+    """A flowable at the position platypus gave it."""
+    flowable: object
+    x: float
+    y: float
+    sW: float
+
+
+class Template(NamedTuple):
+    """Page size and laid out flowables of a recorded document."""
+    pagesize: tuple
+    pages: tuple
+
+
+class _RecordingFrame(Frame):
+    """A frame that records each flowable it draws, and where."""
+
+    def __init__(self, *args, placements: list, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.placements = placements
+
+    def add(self, flowable, canv, trySplit=0):
+        draw_on = flowable.drawOn
+
+        def record(canvas_, x, y, _sW=0):
+            self.placements.append((canvas_.getPageNumber(), Placement(flowable, x, y, _sW)))
+            draw_on(canvas_, x, y, _sW)
+
+        flowable.drawOn = record
+        try:
+            return super().add(flowable, canv, trySplit)
+        finally:
+            del flowable.drawOn
+
+
+def record(story: list, pagesize, **margins) -> Template:
+    """Lay out ``story`` once, as a ``SimpleDocTemplate`` with ``margins`` would, and return the result."""
+    doc = BaseDocTemplate(BytesIO(), pagesize=pagesize, **margins)
+    placements = []
+    frame = _RecordingFrame(
+        doc.leftMargin, doc.bottomMargin, doc.width, doc.height, id='normal', placements=placements,
+    )
+    doc.addPageTemplates([PageTemplate(id='First', frames=[frame], pagesize=pagesize)])
+    doc.build(story)
+    pages = {}
+    for page, placement in placements:
+        pages.setdefault(page, []).append(placement)
+    return Template(pagesize, tuple(tuple(pages[page]) for page in sorted(pages)))
+
+
+def stamp(template: Template, values: dict) -> bytes:
+    """Draw ``template`` with each ``Slot`` filled from ``values``; return the PDF bytes."""
+    buffer = BytesIO()
+    # invariant, like the premium layouts: identical stamps give identical bytes
+    canv = canvas.Canvas(buffer, pagesize=template.pagesize, invariant=1)
+    for page in template.pages:
+        for flowable, x, y, sW in page:
+            if isinstance(flowable, Slot):
+                paragraph = Paragraph(values[flowable.key], flowable.style)
+                _width, height = paragraph.wrap(flowable.width, flowable.height)
+                if height > flowable.height:
+                    raise TemplateMismatch(f'{flowable.key!r} does not fit its slot')
+                # Top-aligned, like the text the slot was laid out with
+                paragraph.drawOn(canv, x, y + flowable.height - height, sW)
+            else:
+                # Drawing stores the canvas on the flowable; keep shared templates untouched
+                copy.copy(flowable).drawOn(canv, x, y, sW)
+        canv.showPage()
+    canv.save()
+    return buffer.getvalue()
+
+
+_templates = OrderedDict()
+_lock = threading.Lock()
+
+
+def get(key, build: Callable[[], Template]) -> Template:
+    """Return the template cached under ``key``, calling ``build`` to record it on a miss."""
+    with _lock:
+        template = _templates.get(key)
+        if template is not None:
+            _templates.move_to_end(key)
+            return template
+    # Built outside the lock; a concurrent miss on the same key just builds it twice
+    template = build()
+    with _lock:
+        _templates[key] = template
+        _templates.move_to_end(key)
+        while len(_templates) > MAX_TEMPLATES:
+            _templates.popitem(last=False)
+    return template
+
+
+def reset() -> None:
+    """Drop every cached template."""
+    with _lock:
+        _templates.clear()
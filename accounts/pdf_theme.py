@@ -0,0 +1,347 @@
+"""
+Process-wide registry of reportlab themes for voucher PDFs.
+
+Every render used to call ``getSampleStyleSheet()`` and build a dozen
+``ParagraphStyle`` and ``HexColor`` objects before laying out a single
+line, and to re-parse the same fixed headings and footers. A ``Theme``
+holds all of that, built once per process on first use and shared by
+every render afterwards:
+
+* ``colors`` and ``styles`` are read-only once built, so renders in any
+  thread can share them.
+* ``flowables`` are prototypes of the fixed parts of a document (headers,
+  section headings, rules, footers). Their markup is parsed once;
+  ``Theme.static`` hands out shallow copies, because reportlab stores
+  layout results on a flowable while wrapping it.
+
+``premium`` and ``premium_collection`` back ``accounts.premium_pdf``;
+``classic`` and ``classic_collection`` back the platypus fallbacks in
+``accounts.views``. ``build`` makes a fresh, uncached theme, which the
+``benchmark_pdf_theme`` command uses as the per-render baseline.
+"""
+import copy
+import threading
+from typing import Callable, NamedTuple
+
+from reportlab.lib.colors import HexColor
+from reportlab.lib.enums import TA_CENTER
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.platypus import HRFlowable, Paragraph, Spacer
+
+PREMIUM_PALETTE = {
+    'primary_gold': '#D4AF37',
+    'secondary_blue': '#1E3A8A',
+    'accent_black': '#1F2937',
+    'light_gold': '#FEF3C7',
+    'text_dark': '#374151',
+    'success_green': '#059669',
+    'white': '#FFFFFF',
+    'success_background': '#ECFDF5',
+}
+
+CLASSIC_PALETTE = {
+    'brand_blue': '#2E86AB',
+    'brand_magenta': '#A23B72',
+    'brand_orange': '#F18F01',
+    'coupon_background': '#FFF8E1',
+    'collection_coupon_background': '#FFF8E7',
+    'text': '#333333',
+    'muted': '#666666',
+    'separator': '#E0E0E0',
+    'rule': '#CCCCCC',
+}
+
+CLASSIC_FOOTER = """
+        <para align="center" fontSize="8" textColor="#999999">
+        This voucher is valid until redeemed. Please present this voucher at the time of purchase.<br/>
+        For customer support, contact us at support@optima.com or call 1-800-OPTIMA-1
+        </para>
+        """
+
+
+class Theme(NamedTuple):
+    """Colours, paragraph styles and fixed flowables for one kind of voucher PDF."""
+    name: str
+    colors: dict
+    styles: dict
+    flowables: dict
+
+    def static(self, key: str) -> list:
+        """Fresh copies of the fixed flowables stored under ``key``."""
+        return [copy.copy(flowable) for flowable in self.flowables[key]]
+
+
+def _palette(hex_codes: dict) -> dict:
+    return {name: HexColor(code) for name, code in hex_codes.items()}
+
+
+def _build_premium() -> Theme:
+    base = getSampleStyleSheet()
+    c = _palette(PREMIUM_PALETTE)
+    styles = {
+        'title': ParagraphStyle(
+            'MainTitle', parent=base['Heading1'], fontSize=36, spaceAfter=50, alignment=TA_CENTER,
+            textColor=c['primary_gold'], fontName='Helvetica-Bold', leading=42,
+        ),
+        'subtitle': ParagraphStyle(
+            'Subtitle', parent=base['Heading2'], fontSize=16, spaceAfter=40, alignment=TA_CENTER,
+            textColor=c['secondary_blue'], fontName='Helvetica', leading=20,
+        ),
+        'voucher_title': ParagraphStyle(
+            'VoucherTitle', parent=base['Heading2'], fontSize=28, spaceAfter=30, alignment=TA_CENTER,
+            textColor=c['accent_black'], fontName='Helvetica-Bold', leading=32, backColor=c['light_gold'],
+            borderWidth=4, borderColor=c['primary_gold'], borderPadding=20, borderRadius=12,
+        ),
+        'coupon': ParagraphStyle(
+            'CouponCode', parent=base['Normal'], fontSize=24, spaceAfter=25, alignment=TA_CENTER,
+            textColor=c['accent_black'], fontName='Helvetica-Bold', backColor=c['white'], borderWidth=4,
+            borderColor=c['primary_gold'], borderPadding=25, borderRadius=15, leading=28,
+        ),
+        'section': ParagraphStyle(
+            'Section', parent=base['Heading3'], fontSize=18, spaceAfter=15, spaceBefore=25,
+            textColor=c['secondary_blue'], fontName='Helvetica-Bold', leading=22,
+        ),
+        'detail': ParagraphStyle(
+            'Detail', parent=base['Normal'], fontSize=13, spaceAfter=10, textColor=c['text_dark'],
+            fontName='Helvetica', leading=18,
+        ),
+        'terms': ParagraphStyle(
+            'Terms', parent=base['Normal'], fontSize=11, spaceAfter=8, textColor=c['text_dark'],
+            fontName='Helvetica', leftIndent=25, leading=15,
+        ),
+        'status': ParagraphStyle(
+            'Status', parent=base['Normal'], fontSize=14, spaceAfter=15, textColor=c['success_green'],
+            fontName='Helvetica-Bold', alignment=TA_CENTER, backColor=c['success_background'], borderWidth=2,
+            borderColor=c['success_green'], borderPadding=12, borderRadius=8,
+        ),
+        'footer': ParagraphStyle(
+            'Footer', parent=base['Normal'], fontSize=12, alignment=TA_CENTER, textColor=c['secondary_blue'],
+            fontName='Helvetica', leading=16,
+        ),
+    }
+    s = styles
+    flowables = {
+        'header': (
+            Paragraph("✨ OPTIMA REWARDS ✨", s['title']),
+            Paragraph("Premium Voucher Certificate", s['subtitle']),
+            HRFlowable(width="100%", thickness=3, color=c['primary_gold']),
+            Spacer(1, 30),
+        ),
+        'image_placeholder': (Paragraph("🎁 Premium Voucher", s['voucher_title']),),
+        'code_heading': (Paragraph("REDEMPTION CODE", s['section']),),
+        'redeemed': (Paragraph("✅ REDEEMED SUCCESSFULLY", s['status']),),
+        'details_heading': (Paragraph("VOUCHER DETAILS", s['section']),),
+        'description_heading': (Paragraph("DESCRIPTION", s['section']),),
+        'terms_heading': (Paragraph("TERMS & CONDITIONS", s['section']),),
+        'footer': (
+            Spacer(1, 40),
+            HRFlowable(width="100%", thickness=2, color=c['primary_gold']),
+            Spacer(1, 20),
+            Paragraph("Thank you for choosing Optima Rewards", s['footer']),
+            Paragraph("Premium Banking • Premium Rewards • Premium Experience", s['footer']),
+            Spacer(1, 10),
+        ),
+    }
+    return Theme('premium', c, styles, flowables)
+
+
+def _build_premium_collection() -> Theme:
+    base = getSampleStyleSheet()
+    c = _palette(PREMIUM_PALETTE)
+    styles = {
+        'title': ParagraphStyle(
+            'MainTitle', parent=base['Heading1'], fontSize=36, spaceAfter=40, alignment=TA_CENTER,
+            textColor=c['primary_gold'], fontName='Helvetica-Bold', leading=42,
+        ),
+        'collection': ParagraphStyle(
+            'Collection', parent=base['Heading2'], fontSize=20, spaceAfter=30, alignment=TA_CENTER,
+            textColor=c['secondary_blue'], fontName='Helvetica-Bold', leading=24,
+        ),
+        'voucher_title': ParagraphStyle(
+            'VoucherTitle', parent=base['Heading3'], fontSize=18, spaceAfter=15, alignment=TA_CENTER,
+            textColor=c['accent_black'], fontName='Helvetica-Bold', leading=22, backColor=c['light_gold'],
+            borderWidth=2, borderColor=c['primary_gold'], borderPadding=12, borderRadius=8,
+        ),
+        'coupon': ParagraphStyle(
+            'CouponCode', parent=base['Normal'], fontSize=16, spaceAfter=15, alignment=TA_CENTER,
+            textColor=c['accent_black'], fontName='Helvetica-Bold', backColor=c['white'], borderWidth=2,
+            borderColor=c['primary_gold'], borderPadding=12, borderRadius=8, leading=20,
+        ),
+        'section': ParagraphStyle(
+            'Section', parent=base['Heading4'], fontSize=14, spaceAfter=10, spaceBefore=15,
+            textColor=c['secondary_blue'], fontName='Helvetica-Bold', leading=18,
+        ),
+        'detail': ParagraphStyle(
+            'Detail', parent=base['Normal'], fontSize=11, spaceAfter=6, textColor=c['text_dark'],
+            fontName='Helvetica', leading=15,
+        ),
+        'terms': ParagraphStyle(
+            'Terms', parent=base['Normal'], fontSize=9, spaceAfter=8, textColor=c['text_dark'],
+            fontName='Helvetica', leftIndent=15, leading=12,
+        ),
+        'status': ParagraphStyle(
+            'Status', parent=base['Normal'], fontSize=12, spaceAfter=12, textColor=c['success_green'],
+            fontName='Helvetica-Bold', alignment=TA_CENTER, backColor=c['success_background'], borderWidth=2,
+            borderColor=c['success_green'], borderPadding=8, borderRadius=6,
+        ),
+        'summary': ParagraphStyle(
+            'Summary', parent=base['Normal'], fontSize=14, alignment=TA_CENTER, textColor=c['secondary_blue'],
+            fontName='Helvetica-Bold', leading=18,
+        ),
+        'footer': ParagraphStyle(
+            'Footer', parent=base['Normal'], fontSize=11, alignment=TA_CENTER, textColor=c['secondary_blue'],
+            fontName='Helvetica', leading=14,
+        ),
+    }
+    s = styles
+    flowables = {
+        'header': (
+            Paragraph("✨ OPTIMA REWARDS ✨", s['title']),
+            Paragraph("Premium Voucher Collection", s['collection']),
+        ),
+        'header_rule': (
+            HRFlowable(width="100%", thickness=3, color=c['primary_gold']),
+            Spacer(1, 25),
+            Paragraph("✅ COLLECTION REDEEMED SUCCESSFULLY", s['status']),
+            Spacer(1, 20),
+        ),
+        'separator': (
+            Spacer(1, 15),
+            HRFlowable(width="80%", thickness=1, color=c['primary_gold'], hAlign='CENTER'),
+            Spacer(1, 15),
+        ),
+        'description_heading': (Paragraph("Description:", s['section']),),
+        'terms_heading': (Paragraph("Terms:", s['section']),),
+        'footer_rule': (
+            Spacer(1, 30),
+            HRFlowable(width="100%", thickness=2, color=c['primary_gold']),
+            Spacer(1, 20),
+        ),
+        'footer': (
+            Paragraph("Thank you for choosing Optima Rewards", s['footer']),
+            Paragraph("Premium Banking • Premium Rewards • Premium Experience", s['footer']),
+            Spacer(1, 10),
+        ),
+    }
+    return Theme('premium_collection', c, styles, flowables)
+
+
+def _build_classic() -> Theme:
+    base = getSampleStyleSheet()
+    c = _palette(CLASSIC_PALETTE)
+    styles = {
+        'normal': base['Normal'],
+        'title': ParagraphStyle(
+            'CustomTitle', parent=base['Heading1'], fontSize=28, spaceAfter=30, alignment=TA_CENTER,
+            textColor=c['brand_blue'], fontName='Helvetica-Bold',
+        ),
+        'voucher_title': ParagraphStyle(
+            'VoucherTitle', parent=base['Heading2'], fontSize=20, spaceAfter=20, alignment=TA_CENTER,
+            textColor=c['brand_magenta'], fontName='Helvetica-Bold',
+        ),
+        'coupon': ParagraphStyle(
+            'CouponCode', parent=base['Normal'], fontSize=16, spaceAfter=15, alignment=TA_CENTER,
+            textColor=c['brand_orange'], fontName='Helvetica-Bold', backColor=c['coupon_background'],
+            borderWidth=2, borderColor=c['brand_orange'], borderPadding=10,
+        ),
+        'section': ParagraphStyle(
+            'Section', parent=base['Heading3'], fontSize=14, spaceAfter=10, spaceBefore=15,
+            textColor=c['brand_blue'], fontName='Helvetica-Bold',
+        ),
+        'detail': ParagraphStyle(
+            'Detail', parent=base['Normal'], fontSize=11, spaceAfter=5, textColor=c['text'],
+            fontName='Helvetica',
+        ),
+        'terms': ParagraphStyle(
+            'Terms', parent=base['Normal'], fontSize=9, spaceAfter=5, textColor=c['muted'],
+            fontName='Helvetica', leftIndent=20,
+        ),
+    }
+    s = styles
+    flowables = {
+        'header': (Paragraph("OPTIMA REWARDS", s['title']), Spacer(1, 20)),
+        'details_heading': (Paragraph("REDEMPTION DETAILS", s['section']),),
+        'description_heading': (Paragraph("DESCRIPTION", s['section']),),
+        'terms_heading': (Paragraph("TERMS AND CONDITIONS", s['section']),),
+        'footer': (Paragraph(CLASSIC_FOOTER, s['normal']),),
+    }
+    return Theme('classic', c, styles, flowables)
+
+
+def _build_classic_collection() -> Theme:
+    base = getSampleStyleSheet()
+    c = _palette(CLASSIC_PALETTE)
+    styles = {
+        'normal': base['Normal'],
+        'heading2': base['Heading2'],
+        'heading3': base['Heading3'],
+        'heading4': base['Heading4'],
+        'title': ParagraphStyle(
+            'MultiTitle', parent=base['Heading1'], fontSize=28, spaceAfter=30, alignment=TA_CENTER,
+            textColor=c['brand_blue'], fontName='Helvetica-Bold',
+        ),
+        'voucher_title': ParagraphStyle(
+            'VoucherTitle', parent=base['Heading2'], fontSize=18, spaceAfter=15, alignment=TA_CENTER,
+            textColor=c['brand_magenta'], fontName='Helvetica-Bold',
+        ),
+        'coupon': ParagraphStyle(
+            'CouponCode', parent=base['Normal'], fontSize=14, spaceAfter=10, alignment=TA_CENTER,
+            textColor=c['brand_orange'], fontName='Helvetica-Bold', borderWidth=2,
+            borderColor=c['brand_orange'], borderPadding=8, backColor=c['collection_coupon_background'],
+        ),
+        'footer': ParagraphStyle('Footer', parent=base['Normal'], alignment=TA_CENTER, fontSize=10),
+    }
+    s = styles
+    flowables = {
+        'header': (
+            Paragraph("OPTIMA REWARDS", s['title']),
+            Paragraph("Your Voucher Collection", s['heading2']),
+            Spacer(1, 20),
+        ),
+        'separator': (
+            Spacer(1, 20),
+            HRFlowable(width="100%", thickness=2, color=c['separator']),
+            Spacer(1, 20),
+        ),
+        'description_heading': (Paragraph("Description:", s['heading3']),),
+        'terms_heading': (Paragraph("Terms:", s['heading4']),),
+        'footer': (
+            Spacer(1, 30),
+            HRFlowable(width="100%", thickness=1, color=c['rule']),
+            Paragraph("Thank you for choosing Optima Rewards!", s['footer']),
+        ),
+    }
+    return Theme('classic_collection', c, styles, flowables)
+
+
+_BUILDERS: dict[str, Callable[[], Theme]] = {
+    'premium': _build_premium,
+    'premium_collection': _build_premium_collection,
+    'classic': _build_classic,
+    'classic_collection': _build_classic_collection,
+}
+
+_themes = {}
+_lock = threading.Lock()
+
+
+def build(name: str) -> Theme:
+    """Build theme ``name`` from scratch, bypassing the registry."""
+    return _BUILDERS[name]()
+
+
+def get(name: str) -> Theme:
+    """Return the process's shared instance of theme ``name``, building it on first use."""
+    theme = _themes.get(name)
+    if theme is None:
+        with _lock:
+            theme = _themes.get(name)
+            if theme is None:
+                theme = _themes[name] = build(name)
+    return theme
+
+
+def reset() -> None:
+    """Drop every built theme (tests, or after changing a palette)."""
+    with _lock:
+        _themes.clear()
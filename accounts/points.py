@@ -0,0 +1,122 @@
+"""
+Append-only points ledger with a cached balance.
+
+Every change to a user's points is a signed ``PointsLedger`` row with a
+reason code. ``UserProfile.points`` caches the running balance so reads
+stay a single-row lookup. Each write updates it with an atomic increment
+(``SET points = points + n``) in the same transaction as the ledger row,
+so concurrent writers cannot lose each other's updates.
+
+The profile row is updated before the ledger row is inserted. Its row
+lock is therefore held while a user's entry gets its id, so a user's
+entries commit in id order. That lets ``PointsSnapshot`` record a balance
+as of an entry id: ``replay`` rebuilds a balance from the latest snapshot
+plus the entries after it, and ``verify`` compares that with the cache.
+``take_snapshot`` is run periodically (see the ``snapshot_points``
+command) to keep replays short.
+
+A new profile's starting points are recorded as an ``opening_balance``
+entry by a signal (see ``accounts.signals``). Any other write to
+``UserProfile.points`` bypasses the ledger.
+"""
+from django.db import transaction
+from django.db.models import F, Sum
+
+from accounts.models import PointsLedger, PointsSnapshot, UserProfile
+
+OPENING_BALANCE = 'opening_balance'
+TIER_ACTIVITY = 'tier_activity'
+GAME = 'game'
+REDEMPTION = 'redemption'
+CHECKOUT = 'checkout'
+ADJUSTMENT = 'adjustment'
+
+
+def balance(user) -> int:
+    """Return the user's cached balance (0 if they have no profile yet)."""
+    return UserProfile.objects.filter(user=user).values_list('points', flat=True).first() or 0
+
+
+def credit(user, amount: int, reason: str, reference: str = '') -> None:
+    """Add ``amount`` (which may be negative) to the user's balance unconditionally."""
+    if not amount:
+        return
+    with transaction.atomic():
+        updated = UserProfile.objects.filter(user=user).update(points=F('points') + amount)
+        if not updated:
+            UserProfile.objects.get_or_create(user=user)
+            UserProfile.objects.filter(user=user).update(points=F('points') + amount)
+        PointsLedger.objects.create(user=user, amount=amount, reason=reason, reference=str(reference))
+
+
+def debit(user, amount: int, reason: str, reference: str = '') -> bool:
+    """
+    Subtract ``amount`` points if the balance covers it.
+
+    Returns False, writing nothing, if it does not.
+    """
+    if amount <= 0:
+        return True
+    with transaction.atomic():
+        updated = (
+            UserProfile.objects
+            .filter(user=user, points__gte=amount)
+            .update(points=F('points') - amount)
+        )
+        if not updated:
+            return False
+        PointsLedger.objects.create(user=user, amount=-amount, reason=reason, reference=str(reference))
+    return True
+
+
+def set_balance(user, target: int, reason: str = ADJUSTMENT, reference: str = '') -> int:
+    """Move the balance to ``target`` with one adjusting entry; return the change applied."""
+    with transaction.atomic():
+        profile, _ = UserProfile.objects.get_or_create(user=user)
+        current = UserProfile.objects.select_for_update().filter(id=profile.id).values_list('points', flat=True).get()
+        delta = target - current
+        if delta:
+            UserProfile.objects.filter(id=profile.id).update(points=target)
+            PointsLedger.objects.create(user=user, amount=delta, reason=reason, reference=str(reference))
+    return delta
+
+
+def replay(user) -> int:
+    """Rebuild the balance from the latest snapshot and the entries after it."""
+    snapshot = PointsSnapshot.objects.filter(user=user).order_by('-last_entry_id').first()
+    entries = PointsLedger.objects.filter(user=user)
+    start = 0
+    if snapshot is not None:
+        entries = entries.filter(id__gt=snapshot.last_entry_id)
+        start = snapshot.balance
+    return start + (entries.aggregate(total=Sum('amount'))['total'] or 0)
+
+
+def verify(user) -> tuple[int, int]:
+    """Return ``(cached, replayed)`` balances, read under the profile's row lock."""
+    with transaction.atomic():
+        cached = (
+            UserProfile.objects.select_for_update()
+            .filter(user=user).values_list('points', flat=True).first()
+        ) or 0
+        return cached, replay(user)
+
+
+def take_snapshot(user) -> PointsSnapshot | None:
+    """Record the user's balance as of their newest entry, if it moved since the last snapshot."""
+    with transaction.atomic():
+        # Holding the profile lock means no entry for this user is in flight
+        list(UserProfile.objects.select_for_update().filter(user=user).values_list('id'))
+        last = PointsSnapshot.objects.filter(user=user).order_by('-last_entry_id').first()
+        newer = PointsLedger.objects.filter(user=user)
+        if last is not None:
+            newer = newer.filter(id__gt=last.last_entry_id)
+        newest_id = newer.order_by('-id').values_list('id', flat=True).first()
+        if newest_id is None:
+            return None
+        total = newer.filter(id__lte=newest_id).aggregate(total=Sum('amount'))['total'] or 0
+        return PointsSnapshot.objects.create(
+            user=user,
+            balance=(last.balance if last else 0) + total,
+            last_entry_id=newest_id,
+        )
@@ -0,0 +1,219 @@
+"""
+Compiled promotion schedule.
+
+All enabled promotions are compiled once per worker into a per-weekday table
+of time windows, each carrying the set of category ids it discounts.
+Overnight windows (start later than end) are split across midnight into the
+following weekday. Resolving the active promotion for a (timezone, instant)
+pair is then a scan of a handful of in-memory windows, and checking whether
+a voucher's category is discounted is a set lookup -- no queries per voucher.
+The table is rebuilt only after the promotions version stamp changes.
+"""
+import functools
+import os
+import threading
+from datetime import datetime, time, timedelta
+from typing import NamedTuple
+from zoneinfo import ZoneInfo
+
+from django.utils import timezone
+
+from accounts import versioning
+from accounts.models import Promotion, VoucherCategory
+
+# Built-in Happy Hour used when no DB promotion is running:
+# weekdays 17:00-19:00, 30% off Dining/Restaurant categories.
+FALLBACK_NAME = "Happy Hour"
+FALLBACK_DESCRIPTION = "Limited-time evening deal"
+FALLBACK_DISCOUNT = 30
+FALLBACK_DAYS = (0, 1, 2, 3, 4)
+FALLBACK_START = time(17, 0)
+FALLBACK_END = time(19, 0)
+FALLBACK_CATEGORY_NAMES = ("dining", "restaurant", "restaurants")
+
+
+def discounted_points(points: int, discount_percentage: int) -> int:
+    """
+    Points after a percentage discount, rounded half up in integer arithmetic.
+
+    Exact halves round up (2.5 -> 3), where ``round()`` rounded them to the
+    even neighbour. ``accounts.facets`` computes the same expression in SQL,
+    so facet buckets agree with the prices the API shows.
+    """
+    discount = max(0, min(100, discount_percentage))
+    return max(0, (points * (100 - discount) + 50) // 100)
+
+
+class PromotionWindow(NamedTuple):
+    """One promotion's slot on a single weekday, matched inclusively."""
+    promotion_id: int | None
+    name: str
+    description: str
+    discount_percentage: int
+    start_time: time
+    end_time: time
+    window_start: time
+    window_end: time
+    category_ids: frozenset
+
+    def covers(self, category_id) -> bool:
+        """Return True if vouchers in ``category_id`` get this window's discount."""
+        return category_id in self.category_ids
+
+    @property
+    def identity(self) -> tuple:
+        """Fields shared by every slice of the same promotion (ignores midnight splits)."""
+        return (self.promotion_id, self.name, self.discount_percentage, self.start_time, self.end_time)
+
+
+class PromotionSchedule(NamedTuple):
+    """Compiled weekday tables for DB promotions and the built-in fallback."""
+    stamp: str
+    days: tuple
+    fallback_days: tuple
+
+    def active_window(self, weekday: int, now_t: time) -> PromotionWindow | None:
+        """Return the first window covering ``now_t`` on ``weekday``, if any."""
+        for table in (self.days, self.fallback_days):
+            for window in table[weekday]:
+                if window.window_start <= now_t <= window.window_end:
+                    return window
+        return None
+
+
+_schedule = None
+_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=64)
+def get_zone(tz_name: str | None = None) -> ZoneInfo:
+    """Return the ZoneInfo for ``tz_name`` (or PROMO_TIMEZONE), falling back to UTC."""
+    try:
+        return ZoneInfo(tz_name or os.getenv("PROMO_TIMEZONE", "Asia/Singapore"))
+    except Exception:
+        return ZoneInfo("UTC")
+
+
+def _day_indices(active_days: str) -> list:
+    try:
+        return sorted({int(x) % 7 for x in active_days.split(',') if x.strip() != ''})
+    except Exception:
+        return []
+
+
+def _add_window(days, weekday, **fields):
+    """Append a window to ``days``, splitting it at midnight if it wraps."""
+    start, end = fields['start_time'], fields['end_time']
+    if start <= end:
+        days[weekday].append(PromotionWindow(window_start=start, window_end=end, **fields))
+        return
+    days[weekday].append(PromotionWindow(window_start=start, window_end=time.max, **fields))
+    days[(weekday + 1) % 7].append(PromotionWindow(window_start=time.min, window_end=end, **fields))
+
+
+def _compile(stamp: str) -> PromotionSchedule:
+    """Compile enabled promotions into per-weekday window tables (two queries)."""
+    days = [[] for _ in range(7)]
+    promos = Promotion.objects.filter(is_enabled=True).order_by('id').prefetch_related('applicable_categories')
+    for promo in promos:
+        category_ids = frozenset(cat.id for cat in promo.applicable_categories.all())
+        for weekday in _day_indices(promo.active_days):
+            _add_window(
+                days, weekday,
+                promotion_id=promo.id,
+                name=promo.name,
+                description=promo.description,
+                discount_percentage=int(promo.discount_percentage or 0),
+                start_time=promo.start_time,
+                end_time=promo.end_time,
+                category_ids=category_ids,
+            )
+
+    fallback_days = [[] for _ in range(7)]
+    fallback_ids = frozenset(
+        cat_id for cat_id, name in VoucherCategory.objects.values_list('id', 'name')
+        if (name or '').lower() in FALLBACK_CATEGORY_NAMES
+    )
+    for weekday in FALLBACK_DAYS:
+        _add_window(
+            fallback_days, weekday,
+            promotion_id=None,
+            name=FALLBACK_NAME,
+            description=FALLBACK_DESCRIPTION,
+            discount_percentage=FALLBACK_DISCOUNT,
+            start_time=FALLBACK_START,
+            end_time=FALLBACK_END,
+            category_ids=fallback_ids,
+        )
+
+    return PromotionSchedule(
+        stamp=stamp,
+        days=tuple(tuple(day) for day in days),
+        fallback_days=tuple(tuple(day) for day in fallback_days),
+    )
+
+
+def get_schedule(stamp: str | None = None) -> PromotionSchedule:
+    """
+    Return the compiled schedule, recompiling it if promotions changed.
+    Pass a ``stamp`` already read by the caller to skip the stamp query.
+    """
+    global _schedule
+    if stamp is None:
+        stamp = versioning.get_stamp(versioning.PROMOTIONS)
+    schedule = _schedule
+    if schedule is not None and schedule.stamp == stamp:
+        return schedule
+    with _lock:
+        if _schedule is None or _schedule.stamp != stamp:
+            _schedule = _compile(stamp)
+        return _schedule
+
+
+def invalidate() -> None:
+    """Drop this process's schedule and bump the shared stamp for all workers."""
+    global _schedule
+    versioning.bump(versioning.PROMOTIONS)
+    _schedule = None
+
+
+def resolve(tz_name: str | None = None, now: datetime | None = None,
+            stamp: str | None = None) -> PromotionWindow | None:
+    """Return the promotion window active at ``now`` in ``tz_name``, if any."""
+    local = (now or timezone.now()).astimezone(get_zone(tz_name))
+    return get_schedule(stamp).active_window(local.weekday(), local.time())
+
+
+def _identity(window: PromotionWindow | None):
+    return window.identity if window is not None else None
+
+
+def next_transition(tz_name: str | None = None, now: datetime | None = None,
+                    stamp: str | None = None) -> datetime | None:
+    """
+    Return the next instant after ``now`` at which the active promotion changes.
+
+    Candidates are every window start and the instant after every window end
+    (windows are inclusive) over the coming week, in ``tz_name``'s local
+    time; the first one whose active window differs from the current one
+    wins. Returns None if nothing changes within a week.
+    """
+    zone = get_zone(tz_name)
+    local = (now or timezone.now()).astimezone(zone)
+    schedule = get_schedule(stamp)
+    current = _identity(schedule.active_window(local.weekday(), local.time()))
+
+    candidates = set()
+    for offset in range(8):
+        day = local.date() + timedelta(days=offset)
+        for table in (schedule.days, schedule.fallback_days):
+            for window in table[day.weekday()]:
+                candidates.add(datetime.combine(day, window.window_start, tzinfo=zone))
+                candidates.add(datetime.combine(day, window.window_end, tzinfo=zone) + timedelta(microseconds=1))
+
+    for instant in sorted(candidates):
+        if instant <= local:
+            continue
+        if _identity(schedule.active_window(instant.weekday(), instant.time())) != current:
+            return instant
+    return None
@@ -0,0 +1,210 @@
+"""
+Redemption primitives built on conditional atomic updates.
+
+Points and stock are never read into Python, checked, and written back.
+Each debit is a single ``UPDATE ... SET col = col - n WHERE col >= n`` and
+the affected row count says whether it succeeded, so concurrent
+redemptions cannot double-spend points or oversell stock, and the write
+lock is held only for the duration of those statements. Callers wrap a
+whole redemption in ``transaction.atomic()`` so a later failure (e.g. one
+sold-out cart item) rolls back the earlier debits.
+
+``checkout`` applies the same guards to a whole cart with a fixed number
+of statements regardless of its size: one points debit, one batched stock
+decrement (a CASE over the cart's vouchers), one coupon code range
+reservation, and one ``bulk_create`` for the redemptions.
+
+Points debits go through the ledger in ``accounts.points``.
+Vouchers in sharded inventory mode (see ``accounts.inventory``) take their
+stock from a shard row instead of ``quantity_available``.
+"""
+from collections import defaultdict
+from typing import NamedTuple
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from django.utils import timezone
+
+from accounts import catalog, coupons, inventory, points
+from accounts.models import Redemption, UserProfile, Voucher
+
+
+class RedemptionError(Exception):
+    """Base class for redemption failures that map to a 400 response."""
+
+    def __init__(self, message: str):
+        super().__init__(message)
+        self.message = message
+
+
+class InsufficientPointsError(RedemptionError):
+    """The user's balance is lower than the amount being spent."""
+
+
+class InsufficientStockError(RedemptionError):
+    """The voucher is inactive or has fewer units left than requested."""
+
+
+class _Resharded(Exception):
+    """Vouchers taken as unsharded turned out to be sharded."""
+
+    def __init__(self, shard_counts: dict):
+        super().__init__(shard_counts)
+        self.shard_counts = shard_counts
+
+
+class CheckoutLine(NamedTuple):
+    """One cart line priced for checkout."""
+    voucher: Voucher
+    quantity: int
+    unit_points: int
+
+
+def debit_points(user, amount: int, reason: str = points.REDEMPTION) -> None:
+    """Subtract ``amount`` points from ``user`` if the balance covers it, recording it in the ledger."""
+    if not points.debit(user, amount, reason):
+        balance = points.balance(user)
+        raise InsufficientPointsError(
+            f'Insufficient points. You need {amount} points but have {balance}'
+        )
+
+
+def _shard_count(voucher_id: int) -> int:
+    return Voucher.objects.filter(id=voucher_id).values_list('stock_shard_count', flat=True).first() or 0
+
+
+def reserve_stock(voucher, quantity: int) -> None:
+    """Take ``quantity`` units of ``voucher`` if that many are still available."""
+    if not inventory.is_sharded(voucher):
+        # Matches only while the voucher is unsharded, in case ``voucher`` predates set_stock
+        updated = (
+            Voucher.objects
+            .filter(id=voucher.id, is_active=True, stock_shard_count=0, quantity_available__gte=quantity)
+            .update(quantity_available=F('quantity_available') - quantity)
+        )
+        if updated:
+            # Listings cache stock levels; refresh them when a voucher sells out
+            # rather than on every redemption
+            if Voucher.objects.filter(id=voucher.id, quantity_available=0).exists():
+                transaction.on_commit(catalog.invalidate)
+            return
+        voucher.stock_shard_count = _shard_count(voucher.id)
+        if not inventory.is_sharded(voucher):
+            raise InsufficientStockError(f'Insufficient quantity available for {voucher.title}')
+    if not (voucher.is_active and inventory.take(voucher, quantity)):
+        raise InsufficientStockError(f'Insufficient quantity available for {voucher.title}')
+
+
+def current_points(user) -> int:
+    """Return the user's balance as stored (after any debits in this transaction)."""
+    return UserProfile.objects.filter(user=user).values_list('points', flat=True).get()
+
+
+def redeem(user, voucher, quantity: int, unit_points: int) -> Redemption:
+    """
+    Redeem ``quantity`` units of ``voucher`` at ``unit_points`` each.
+
+    Raises a RedemptionError subclass, leaving no changes behind, if the
+    user cannot afford it or stock has run out.
+    """
+    with transaction.atomic():
+        reserve_stock(voucher, quantity)
+        debit_points(user, unit_points * quantity)
+        return Redemption.objects.create(
+            user=user,
+            voucher=voucher,
+            quantity=quantity,
+            points_used=unit_points * quantity,
+            status='completed',
+            completed_at=timezone.now(),
+        )
+
+
+def reserve_stock_bulk(quantities: dict, vouchers: dict) -> None:
+    """
+    Take ``quantities[voucher_id]`` units of every voucher in one UPDATE.
+
+    Each row only matches if it is active and has enough stock, so the
+    update succeeds for the whole cart or the row count comes up short.
+    Sharded vouchers are taken from their shards one by one first.
+    """
+    sharded = [voucher_id for voucher_id in quantities if inventory.is_sharded(vouchers[voucher_id])]
+    for voucher_id in sharded:
+        reserve_stock(vouchers[voucher_id], quantities[voucher_id])
+    quantities = {voucher_id: quantity for voucher_id, quantity in quantities.items() if voucher_id not in sharded}
+    if not quantities:
+        return
+    enough = Q()
+    for voucher_id, quantity in quantities.items():
+        enough |= Q(id=voucher_id, quantity_available__gte=quantity)
+    decrement = Case(
+        *[When(id=voucher_id, then=Value(quantity)) for voucher_id, quantity in quantities.items()],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+    try:
+        # A savepoint, so the decrement can be undone if a voucher was sharded meanwhile
+        with transaction.atomic():
+            updated = (
+                Voucher.objects
+                .filter(enough, is_active=True, stock_shard_count=0)
+                .update(quantity_available=F('quantity_available') - decrement)
+            )
+            if updated != len(quantities):
+                # Failure path only: name the first voucher that fell short
+                short = (
+                    Voucher.objects.filter(id__in=list(quantities))
+                    .values_list('id', 'quantity_available', 'is_active', 'stock_shard_count')
+                )
+                resharded = {}
+                for voucher_id, available, active, shard_count in short:
+                    if shard_count:
+                        resharded[voucher_id] = shard_count
+                    elif not active or available < quantities[voucher_id]:
+                        raise InsufficientStockError(
+                            f'Insufficient quantity available for {vouchers[voucher_id].title}'
+                        )
+                if resharded:
+                    raise _Resharded(resharded)
+                raise InsufficientStockError('Insufficient quantity available')
+    except _Resharded as e:
+        for voucher_id, shard_count in e.shard_counts.items():
+            vouchers[voucher_id].stock_shard_count = shard_count
+        reserve_stock_bulk(quantities, vouchers)
+        return
+    # Listings cache stock levels; refresh them when anything sells out
+    if Voucher.objects.filter(id__in=list(quantities), quantity_available=0).exists():
+        transaction.on_commit(catalog.invalidate)
+
+
+def checkout(user, lines: list) -> list:
+    """
+    Redeem every ``CheckoutLine`` atomically and return the new redemptions.
+
+    Raises a RedemptionError subclass, leaving no changes behind, if the
+    user cannot afford the cart or any voucher lacks stock.
+    """
+    quantities = defaultdict(int)
+    vouchers = {}
+    for line in lines:
+        quantities[line.voucher.id] += line.quantity
+        vouchers[line.voucher.id] = line.voucher
+    total = sum(line.unit_points * line.quantity for line in lines)
+    now = timezone.now()
+
+    with transaction.atomic():
+        debit_points(user, total, points.CHECKOUT)
+        reserve_stock_bulk(dict(quantities), vouchers)
+        codes = coupons.allocate(len(lines))
+        return Redemption.objects.bulk_create([
+            Redemption(
+                user=user,
+                voucher=line.voucher,
+                quantity=line.quantity,
+                points_used=line.unit_points * line.quantity,
+                coupon_code=code,
+                status='completed',
+                completed_at=now,
+            )
+            for line, code in zip(lines, codes)
+        ])
@@ -0,0 +1,294 @@
+"""
+Full-text search over the voucher catalog.
+
+On SQLite the index is an FTS5 virtual table (created by migration
+0008_voucher_search_index) holding each active voucher's title,
+description, terms and category name. Queries are ranked with BM25 and
+every query token is matched as a prefix. On other database backends, or
+if FTS5 is unavailable, a pure-Python inverted index with equivalent BM25 ranking
+is built lazily from the database and kept per search version stamp.
+
+Both indexes are updated incrementally when a Voucher or VoucherCategory is
+saved or deleted (see accounts.signals). ``rebuild_search_index`` repopulates
+the index from scratch after bulk writes that bypass signals.
+"""
+import bisect
+import math
+import re
+import threading
+import unicodedata
+from collections import defaultdict
+
+from django.db import connection
+
+from accounts import versioning
+from accounts.models import Voucher
+
+FTS_TABLE = 'accounts_voucher_search'
+
+# Column weights, shared by both backends so rankings agree
+FIELD_WEIGHTS = {
+    'title': 10.0,
+    'category': 4.0,
+    'description': 2.0,
+    'terms': 1.0,
+}
+FIELDS = tuple(FIELD_WEIGHTS)
+
+# BM25 tuning constants (the FTS5 defaults)
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(text: str) -> list:
+    """Split text into lowercase word tokens with diacritics removed (like FTS5's unicode61)."""
+    decomposed = unicodedata.normalize('NFKD', (text or '').lower())
+    stripped = ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return _TOKEN_RE.findall(stripped)
+
+
+def _document(voucher) -> dict:
+    """Return the indexed fields of a voucher."""
+    return {
+        'title': voucher.title or '',
+        'category': voucher.category.name if voucher.category_id else '',
+        'description': voucher.description or '',
+        'terms': voucher.terms or '',
+    }
+
+
+# -------------------------
+# SQLite FTS5 backend
+# -------------------------
+
+_fts_available = None
+
+
+def fts_available() -> bool:
+    """Return True if the FTS5 table exists on the default database."""
+    global _fts_available
+    if _fts_available is None:
+        if connection.vendor != 'sqlite':
+            _fts_available = False
+        else:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE]
+                )
+                _fts_available = cursor.fetchone() is not None
+    return _fts_available
+
+
+def _fts_query(tokens: list) -> str:
+    """Build an FTS5 MATCH expression requiring every token as a prefix."""
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def _fts_search(tokens: list, limit: int | None) -> list:
+    weights = ', '.join(str(FIELD_WEIGHTS[field]) for field in FIELDS)
+    sql = (
+        f"SELECT voucher_id FROM {FTS_TABLE} "
+        f"WHERE {FTS_TABLE} MATCH %s "
+        f"ORDER BY bm25({FTS_TABLE}, 0, {weights}), voucher_id DESC"
+    )
+    params = [_fts_query(tokens)]
+    if limit:
+        sql += " LIMIT %s"
+        params.append(limit)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _fts_delete(cursor, voucher_ids):
+    # Rows are keyed by rowid = voucher id; voucher_id is UNINDEXED and would mean a full scan
+    for voucher_id in voucher_ids:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [voucher_id])
+
+
+def _fts_insert(cursor, voucher_id, document):
+    columns = ', '.join(FIELDS)
+    placeholders = ', '.join(['%s'] * len(FIELDS))
+    cursor.execute(
+        f"INSERT INTO {FTS_TABLE} (rowid, voucher_id, {columns}) VALUES (%s, %s, {placeholders})",
+        [voucher_id, voucher_id] + [document[field] for field in FIELDS],
+    )
+
+
+# -------------------------
+# Pure-Python backend
+# -------------------------
+
+class InvertedIndex:
+    """In-memory BM25 inverted index with prefix expansion."""
+
+    def __init__(self, stamp: str = ''):
+        self.stamp = stamp
+        self.postings = defaultdict(dict)   # term -> {voucher_id: weighted term frequency}
+        self.doc_terms = {}                 # voucher_id -> terms, for removal
+        self.doc_lengths = {}               # voucher_id -> weighted length
+        self.total_length = 0.0
+        self._vocabulary = None
+
+    def add(self, voucher_id: int, document: dict) -> None:
+        """Index (or re-index) one voucher."""
+        self.remove(voucher_id)
+        frequencies = defaultdict(float)
+        for field, weight in FIELD_WEIGHTS.items():
+            for token in tokenize(document.get(field, '')):
+                frequencies[token] += weight
+        for term, frequency in frequencies.items():
+            self.postings[term][voucher_id] = frequency
+        length = sum(frequencies.values())
+        self.doc_terms[voucher_id] = tuple(frequencies)
+        self.doc_lengths[voucher_id] = length
+        self.total_length += length
+        self._vocabulary = None
+
+    def remove(self, voucher_id: int) -> None:
+        """Drop a voucher from the index if present."""
+        terms = self.doc_terms.pop(voucher_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            docs = self.postings.get(term)
+            if docs is not None:
+                docs.pop(voucher_id, None)
+                if not docs:
+                    del self.postings[term]
+        self.total_length -= self.doc_lengths.pop(voucher_id, 0.0)
+        self._vocabulary = None
+
+    def _expand(self, prefix: str) -> list:
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self.postings)
+        vocabulary = self._vocabulary
+        start = bisect.bisect_left(vocabulary, prefix)
+        end = bisect.bisect_left(vocabulary, prefix + '\U0010ffff')
+        return vocabulary[start:end]
+
+    def search(self, tokens: list, limit: int | None = None) -> list:
+        """Return voucher ids matching every token as a prefix, best first."""
+        doc_count = len(self.doc_lengths)
+        if not doc_count or not tokens:
+            return []
+        avg_length = self.total_length / doc_count or 1.0
+        scores = None
+        for token in tokens:
+            token_scores = defaultdict(float)
+            for term in self._expand(token):
+                docs = self.postings[term]
+                idf = math.log(1 + (doc_count - len(docs) + 0.5) / (len(docs) + 0.5))
+                for voucher_id, frequency in docs.items():
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths[voucher_id] / avg_length)
+                    score = idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+                    # A prefix may expand to several terms; count the best one
+                    token_scores[voucher_id] = max(token_scores[voucher_id], score)
+            if scores is None:
+                scores = token_scores
+            else:
+                scores = {
+                    voucher_id: score + token_scores[voucher_id]
+                    for voucher_id, score in scores.items() if voucher_id in token_scores
+                }
+            if not scores:
+                return []
+        ranked = sorted(scores, key=lambda voucher_id: (-scores[voucher_id], -voucher_id))
+        return ranked[:limit] if limit else ranked
+
+
+_python_index = None
+_lock = threading.Lock()
+
+
+def _build_python_index(stamp: str) -> InvertedIndex:
+    index = InvertedIndex(stamp)
+    for voucher in Voucher.objects.filter(is_active=True).select_related('category'):
+        index.add(voucher.id, _document(voucher))
+    return index
+
+
+def _get_python_index() -> InvertedIndex:
+    global _python_index
+    stamp = versioning.get_stamp(versioning.SEARCH)
+    index = _python_index
+    if index is not None and index.stamp == stamp:
+        return index
+    with _lock:
+        if _python_index is None or _python_index.stamp != stamp:
+            _python_index = _build_python_index(stamp)
+        return _python_index
+
+
+# -------------------------
+# Public API
+# -------------------------
+
+def search_voucher_ids(query: str, limit: int | None = None) -> list:
+    """Return ids of active vouchers matching ``query``, ranked best first."""
+    tokens = tokenize(query)
+    if not tokens:
+        return []
+    if fts_available():
+        return _fts_search(tokens, limit)
+    return _get_python_index().search(tokens, limit)
+
+
+def _apply_to_python_index(change) -> None:
+    """Apply ``change(index)`` in place if this worker's index is current, then bump the stamp."""
+    global _python_index
+    with _lock:
+        index = _python_index
+        if index is not None and index.stamp == versioning.get_stamp(versioning.SEARCH):
+            change(index)
+            index.stamp = versioning.bump(versioning.SEARCH)
+        else:
+            # Stale or never built: other workers (and this one) rebuild lazily
+            versioning.bump(versioning.SEARCH)
+            _python_index = None
+
+
+def index_vouchers(vouchers) -> None:
+    """Add, refresh or drop the given vouchers in the search index."""
+    vouchers = list(vouchers)
+    if fts_available():
+        with connection.cursor() as cursor:
+            _fts_delete(cursor, [voucher.id for voucher in vouchers])
+            for voucher in vouchers:
+                if voucher.is_active:
+                    _fts_insert(cursor, voucher.id, _document(voucher))
+        return
+
+    def change(index):
+        for voucher in vouchers:
+            if voucher.is_active:
+                index.add(voucher.id, _document(voucher))
+            else:
+                index.remove(voucher.id)
+    _apply_to_python_index(change)
+
+
+def unindex_voucher(voucher_id: int) -> None:
+    """Remove a deleted voucher from the search index."""
+    if fts_available():
+        with connection.cursor() as cursor:
+            _fts_delete(cursor, [voucher_id])
+        return
+    _apply_to_python_index(lambda index: index.remove(voucher_id))
+
+
+def rebuild_index() -> int:
+    """Repopulate the search index from the database; return the number indexed."""
+    global _python_index
+    vouchers = list(Voucher.objects.filter(is_active=True).select_related('category'))
+    if fts_available():
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+            for voucher in vouchers:
+                _fts_insert(cursor, voucher.id, _document(voucher))
+    else:
+        with _lock:
+            _python_index = _build_python_index(versioning.bump(versioning.SEARCH))
+    return len(vouchers)
@@ -0,0 +1,85 @@
+"""
+Signal handlers that keep process-local caches and derived records in step
+with the database.
+"""
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from accounts import catalog, points, promotions, search, versioning
+from accounts.models import PointsLedger, Promotion, RewardTier, TierBenefit, UserProfile, Voucher, VoucherCategory
+
+
+@receiver(post_save, sender=Voucher)
+@receiver(post_delete, sender=Voucher)
+@receiver(post_save, sender=VoucherCategory)
+@receiver(post_delete, sender=VoucherCategory)
+@receiver(post_save, sender=Promotion)
+@receiver(post_delete, sender=Promotion)
+def invalidate_catalog(sender, **kwargs):
+    """Bump the catalog stamp whenever a catalog row is written or removed."""
+    if kwargs.get('raw'):
+        return
+    catalog.invalidate()
+
+
+@receiver(m2m_changed, sender=Promotion.applicable_categories.through)
+def invalidate_catalog_on_promotion_categories(sender, action, **kwargs):
+    """Promotion category membership is part of the catalog too."""
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        catalog.invalidate()
+
+
+@receiver(post_save, sender=VoucherCategory)
+@receiver(post_delete, sender=VoucherCategory)
+@receiver(post_save, sender=Promotion)
+@receiver(post_delete, sender=Promotion)
+def invalidate_promotions(sender, **kwargs):
+    """Recompile the promotion schedule when promotions or category names change."""
+    if kwargs.get('raw'):
+        return
+    promotions.invalidate()
+
+
+@receiver(m2m_changed, sender=Promotion.applicable_categories.through)
+def invalidate_promotions_on_categories(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        promotions.invalidate()
+
+
+@receiver(post_save, sender=Voucher)
+def index_voucher(sender, instance, **kwargs):
+    """Refresh the voucher's row in the search index."""
+    if kwargs.get('raw'):
+        return
+    search.index_vouchers([instance])
+
+
+@receiver(post_delete, sender=Voucher)
+def unindex_voucher(sender, instance, **kwargs):
+    search.unindex_voucher(instance.id)
+
+
+@receiver(post_save, sender=VoucherCategory)
+def reindex_category_vouchers(sender, instance, created, **kwargs):
+    """Category names are indexed, so re-index the category's vouchers on rename."""
+    if kwargs.get('raw') or created:
+        return
+    search.index_vouchers(instance.voucher_set.select_related('category'))
+
+
+@receiver(post_save, sender=RewardTier)
+@receiver(post_delete, sender=RewardTier)
+@receiver(post_save, sender=TierBenefit)
+@receiver(post_delete, sender=TierBenefit)
+def invalidate_tiers(sender, **kwargs):
+    if kwargs.get('raw'):
+        return
+    versioning.bump(versioning.TIERS)
+
+
+@receiver(post_save, sender=UserProfile)
+def record_opening_balance(sender, instance, created, **kwargs):
+    """A new profile's starting points are its first ledger entry."""
+    if kwargs.get('raw') or not created or not instance.points:
+        return
+    PointsLedger.objects.create(user_id=instance.user_id, amount=instance.points, reason=points.OPENING_BALANCE)
@@ -1,3 +1,1484 @@
-from django.test import TestCase
+"""
+Tests for the accounts app.
+"""
+import importlib
+import os
+import re
+import shutil
+import tempfile
+from datetime import datetime, time, timedelta
+from io import BytesIO, StringIO
+from time import sleep
+from unittest import mock
+from zoneinfo import ZoneInfo
 
-# Create your tests here.
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image as PILImage
+from pypdf import PdfReader, PdfWriter
+from reportlab import rl_config
+from rest_framework.test import APITestCase
+
+from . import (
+    admission, carts, catalog, coupons, facets, idempotency, image_cache, inventory, pdf_jobs, pdf_pool, pdf_store,
+    pdf_templates, pdf_theme, points, premium_pdf, promotions, redemption, search, versioning,
+)
+from .models import (
+    Cart, CartItem, IdempotencyRecord, Notification, PdfJob, PointsLedger, PointsSnapshot, Promotion, Redemption,
+    RewardTier, TierActivity, UserProfile, Voucher, VoucherCategory, VoucherStockShard,
+)
+from .pagination import encode_cursor
+from .views import generate_multi_voucher_pdf_platypus, generate_voucher_pdf_platypus
+
+User = get_user_model()
+
+
+def make_voucher(category, **overrides):
+    """Create an active voucher with sensible defaults."""
+    fields = {
+        'title': 'Coffee Voucher',
+        'category': category,
+        'points': 1000,
+        'original_points': 1200,
+        'discount_percentage': 15,
+        'image_url': 'https://example.com/coffee.jpg',
+        'description': 'A free coffee at any outlet',
+        'terms': 'One per customer',
+        'quantity_available': 10,
+    }
+    fields.update(overrides)
+    return Voucher.objects.create(**fields)
+
+
+class CatalogSnapshotTests(TestCase):
+    """Test the process-local catalog snapshot."""
+
+    def setUp(self):
+        self.category = VoucherCategory.objects.create(name='Dining', icon='🍽️')
+        self.voucher = make_voucher(self.category)
+
+    def test_snapshot_reused_until_stamp_changes(self):
+        """A second read only checks the version stamp."""
+        first = catalog.get_catalog()
+        with self.assertNumQueries(1):
+            second = catalog.get_catalog()
+        self.assertIs(first, second)
+
+    def test_voucher_save_rebuilds_snapshot(self):
+        """Saving a voucher bumps the stamp and the next read sees the change."""
+        before = catalog.get_catalog()
+        self.voucher.title = 'Tea Voucher'
+        self.voucher.save()
+        after = catalog.get_catalog()
+        self.assertNotEqual(before.stamp, after.stamp)
+        self.assertEqual(after.by_id[self.voucher.id].card['title'], 'Tea Voucher')
+
+    def test_inactive_vouchers_excluded(self):
+        """Deactivated vouchers drop out of the snapshot."""
+        Voucher.objects.filter(id=self.voucher.id).update(is_active=False)
+        versioning.bump(versioning.CATALOG)
+        self.assertNotIn(self.voucher.id, catalog.get_catalog().by_id)
+
+
+class CatalogAPITests(APITestCase):
+    """Test catalog endpoints served from the snapshot."""
+
+    def setUp(self):
+        self.dining = VoucherCategory.objects.create(name='Dining')
+        self.travel = VoucherCategory.objects.create(name='Travel')
+        make_voucher(self.dining, title='Sushi Dinner')
+        make_voucher(self.travel, title='Airport Lounge', featured=True)
+
+    def test_voucher_list_filters_and_orders(self):
+        """Featured vouchers come first and category/search filters apply."""
+        response = self.client.get(reverse('voucher_list'))
+        self.assertEqual([v['title'] for v in response.data], ['Airport Lounge', 'Sushi Dinner'])
+
+        response = self.client.get(reverse('voucher_list'), {'category': 'Dining'})
+        self.assertEqual([v['title'] for v in response.data], ['Sushi Dinner'])
+
+        response = self.client.get(reverse('voucher_list'), {'search': 'lounge'})
+        self.assertEqual([v['title'] for v in response.data], ['Airport Lounge'])
+
+    def test_card_view_omits_long_text(self):
+        """view=card drops description and terms but keeps pricing fields."""
+        response = self.client.get(reverse('voucher_list'), {'view': 'card'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(tuple(response.data[0]), catalog.PROJECTIONS['card'])
+        self.assertNotIn('description', response.data[0])
+
+    def test_sparse_fieldset(self):
+        """fields= returns only the requested keys plus id; unknown keys are rejected."""
+        response = self.client.get(reverse('voucher_list'), {'fields': 'title,points'})
+        self.assertEqual(set(response.data[0]), {'id', 'title', 'points'})
+        response = self.client.get(reverse('voucher_list'), {'fields': 'title,password'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_category_list(self):
+        """Categories are served from the snapshot."""
+        response = self.client.get(reverse('category_list'))
+        self.assertEqual({c['name'] for c in response.data}, {'Dining', 'Travel'})
+
+
+class PromotionScheduleTests(TestCase):
+    """Test the compiled promotion schedule."""
+
+    def setUp(self):
+        self.tz = ZoneInfo('UTC')
+        self.dining = VoucherCategory.objects.create(name='Dining')
+        self.travel = VoucherCategory.objects.create(name='Travel')
+        self.promo = Promotion.objects.create(
+            name='Late Night', discount_percentage=25,
+            start_time=time(22, 0), end_time=time(2, 0), active_days='4',  # Friday
+        )
+        self.promo.applicable_categories.add(self.travel)
+
+    def at(self, *args):
+        return datetime(*args, tzinfo=self.tz)
+
+    def test_overnight_window_spans_midnight(self):
+        """A Friday 22:00-02:00 promotion is still active early Saturday."""
+        friday_late = promotions.resolve('UTC', self.at(2025, 1, 3, 23, 30))
+        saturday_early = promotions.resolve('UTC', self.at(2025, 1, 4, 1, 59))
+        saturday_late = promotions.resolve('UTC', self.at(2025, 1, 4, 2, 1))
+        self.assertEqual(friday_late.name, 'Late Night')
+        self.assertEqual(saturday_early.name, 'Late Night')
+        self.assertIsNone(saturday_late)
+        self.assertTrue(friday_late.covers(self.travel.id))
+        self.assertFalse(friday_late.covers(self.dining.id))
+
+    def test_fallback_happy_hour_matches_dining_by_name(self):
+        """Without a running DB promotion the built-in Happy Hour applies to Dining."""
+        window = promotions.resolve('UTC', self.at(2025, 1, 6, 18, 0))  # Monday
+        self.assertEqual(window.name, promotions.FALLBACK_NAME)
+        self.assertTrue(window.covers(self.dining.id))
+        self.assertFalse(window.covers(self.travel.id))
+
+    def test_promotion_edit_recompiles(self):
+        """Disabling a promotion takes effect on the next lookup."""
+        self.promo.is_enabled = False
+        self.promo.save()
+        self.assertIsNone(promotions.resolve('UTC', self.at(2025, 1, 3, 23, 30)))
+
+    def test_next_transition(self):
+        """The next change is the next window start or the instant after its end."""
+        friday_evening = self.at(2025, 1, 3, 20, 0)
+        self.assertEqual(promotions.next_transition('UTC', friday_evening), self.at(2025, 1, 3, 22, 0))
+        saturday_early = self.at(2025, 1, 4, 1, 0)
+        self.assertEqual(
+            promotions.next_transition('UTC', saturday_early),
+            self.at(2025, 1, 4, 2, 0, 0, 1),
+        )
+        # Monday happy hour from a Saturday afternoon
+        self.assertEqual(promotions.next_transition('UTC', self.at(2025, 1, 4, 12, 0)), self.at(2025, 1, 6, 17, 0))
+
+    def test_active_endpoint_caches_until_next_change(self):
+        """max-age never runs past the next transition."""
+        response = self.client.get(reverse('active_promotion'), {'tz': 'UTC'})
+        self.assertIn('next_change_at', response.data)
+        next_change = datetime.fromisoformat(response.data['next_change_at'])
+        max_age = int(response['Cache-Control'].split('max-age=')[1].split(',')[0])
+        self.assertLessEqual(max_age, (next_change - timezone.now()).total_seconds() + 1)
+
+    def test_resolve_is_query_free_once_compiled(self):
+        """After compilation only the version stamp is read."""
+        promotions.resolve('UTC')
+        with self.assertNumQueries(1):
+            promotions.resolve('UTC')
+
+
+class VoucherSearchTests(TestCase):
+    """Test full-text voucher search on both index backends."""
+
+    def setUp(self):
+        self.dining = VoucherCategory.objects.create(name='Dining')
+        self.travel = VoucherCategory.objects.create(name='Travel')
+        self.sushi = make_voucher(self.dining, title='Sushi Dinner', description='Omakase for two')
+        self.lounge = make_voucher(self.travel, title='Airport Lounge', description='Relax before dinner')
+        self.spa = make_voucher(self.travel, title='Spa Day', description='Massage', terms='Weekdays only')
+
+    def test_fts_ranks_title_matches_first(self):
+        """A title match outranks a description match."""
+        self.assertTrue(search.fts_available())
+        self.assertEqual(search.search_voucher_ids('dinner'), [self.sushi.id, self.lounge.id])
+
+    def test_prefix_and_multi_field_matching(self):
+        """Tokens match as prefixes across title, terms and category."""
+        self.assertEqual(search.search_voucher_ids('lou'), [self.lounge.id])
+        self.assertEqual(search.search_voucher_ids('weekday'), [self.spa.id])
+        self.assertEqual(set(search.search_voucher_ids('travel')), {self.lounge.id, self.spa.id})
+        self.assertEqual(search.search_voucher_ids('travel spa'), [self.spa.id])
+
+    def test_index_follows_saves_and_deletes(self):
+        """Saving and deleting vouchers update the index incrementally."""
+        self.spa.title = 'Hot Stone Massage'
+        self.spa.save()
+        self.assertEqual(search.search_voucher_ids('stone'), [self.spa.id])
+        self.lounge.delete()
+        self.assertEqual(search.search_voucher_ids('dinner'), [self.sushi.id])
+
+    def test_fts_rows_keyed_by_voucher_id(self):
+        """Index rows use the voucher id as rowid, so updates delete by the indexed key."""
+        self.spa.save()
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT rowid, voucher_id FROM {search.FTS_TABLE} ORDER BY rowid")
+            rows = cursor.fetchall()
+        self.assertEqual(rows, [(v.id, v.id) for v in (self.sushi, self.lounge, self.spa)])
+
+    def test_python_index_matches_fts(self):
+        """The pure-Python fallback returns the same ranking."""
+        index = search.InvertedIndex()
+        for voucher in (self.sushi, self.lounge, self.spa):
+            index.add(voucher.id, search._document(voucher))
+        for query in ('dinner', 'lou', 'travel spa', 'weekday'):
+            self.assertEqual(index.search(search.tokenize(query)), search.search_voucher_ids(query))
+        index.remove(self.sushi.id)
+        self.assertEqual(index.search(['dinner']), [self.lounge.id])
+
+
+class CursorPaginationTests(APITestCase):
+    """Test keyset pagination on the list endpoints."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='pager@example.com', password='testpass123',
+            first_name='Page', last_name='R', phone_number='+1234567890',
+        )
+        self.client.force_authenticate(self.user)
+        category = VoucherCategory.objects.create(name='Dining')
+        for i in range(5):
+            make_voucher(category, title=f'Voucher {i}', featured=(i == 0))
+
+    def collect(self, url, params):
+        """Follow ``next`` links and return every page's results."""
+        pages = []
+        response = self.client.get(url, params)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            pages.append(response.data['results'])
+            if not response.data['next']:
+                return pages
+            response = self.client.get(response.data['next'])
+
+    def test_voucher_pages_cover_catalog_in_order(self):
+        """Paging through vouchers yields the unpaged ordering exactly once."""
+        full = [v['id'] for v in self.client.get(reverse('voucher_list')).data]
+        pages = self.collect(reverse('voucher_list'), {'limit': 2})
+        self.assertEqual([len(p) for p in pages], [2, 2, 1])
+        self.assertEqual([v['id'] for page in pages for v in page], full)
+
+    def test_voucher_pages_stable_under_inserts(self):
+        """A voucher created mid-scroll does not shift later pages."""
+        first = self.client.get(reverse('voucher_list'), {'limit': 2}).data
+        make_voucher(VoucherCategory.objects.get(), title='Newest')
+        second = self.client.get(first['next']).data
+        seen = [v['title'] for v in first['results'] + second['results']]
+        self.assertNotIn('Newest', seen)
+        self.assertEqual(len(set(seen)), 4)
+
+    def test_notification_pages(self):
+        """Notifications page newest first with a constant page size."""
+        for i in range(5):
+            Notification.objects.create(user=self.user, message=f'Message {i}')
+        pages = self.collect(reverse('notification_list'), {'limit': 3})
+        messages = [n['message'] for page in pages for n in page]
+        self.assertEqual(messages, [f'Message {i}' for i in reversed(range(5))])
+
+    def test_invalid_cursor_rejected(self):
+        """A tampered cursor is a client error."""
+        response = self.client.get(reverse('notification_list'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_mistyped_search_cursor_rejected(self):
+        """A well-formed cursor holding the wrong types is a client error on in-memory pages too."""
+        for values in (['first'], [None], [1, 2]):
+            response = self.client.get(reverse('voucher_list'),
+                                       {'search': 'Voucher', 'cursor': encode_cursor(values)})
+            self.assertEqual(response.status_code, 400, values)
+
+
+class ConditionalGetTests(APITestCase):
+    """Test ETag revalidation on catalog endpoints."""
+
+    def setUp(self):
+        cache.clear()
+        self.category = VoucherCategory.objects.create(name='Dining')
+        self.voucher = make_voucher(self.category)
+
+    def test_matching_etag_returns_304_without_queries(self):
+        """A revalidation with the current ETag skips the view and the ORM."""
+        first = self.client.get(reverse('category_list'))
+        self.assertEqual(first.status_code, 200)
+        self.assertIn('ETag', first)
+        self.assertIn('Last-Modified', first)
+        self.assertIn('must-revalidate', first['Cache-Control'])
+        with self.assertNumQueries(0):
+            second = self.client.get(reverse('category_list'), HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_etag_changes_with_catalog_and_query(self):
+        """Catalog writes and different filters produce different ETags."""
+        first = self.client.get(reverse('voucher_list'))
+        filtered = self.client.get(reverse('voucher_list'), {'category': 'Dining'})
+        self.assertNotEqual(first['ETag'], filtered['ETag'])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.voucher.title = 'Renamed'
+            self.voucher.save()
+        response = self.client.get(reverse('voucher_list'), HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[0]['title'], 'Renamed')
+
+    def test_listing_shows_live_stock(self):
+        """Stock sold since the snapshot was built shows up, and retires the old ETag."""
+        first = self.client.get(reverse('voucher_list'))
+        self.assertEqual(first.data[0]['quantity_available'], 10)
+        # A redemption that does not sell out leaves the catalog stamp alone
+        Voucher.objects.filter(id=self.voucher.id).update(quantity_available=7)
+        response = self.client.get(reverse('voucher_list'), HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[0]['quantity_available'], 7)
+
+    def test_tiers_require_authentication_before_304(self):
+        """Permission checks run before the ETag short-circuit."""
+        response = self.client.get(reverse('get_all_tiers'), HTTP_IF_NONE_MATCH='*')
+        self.assertEqual(response.status_code, 401)
+
+
+class VoucherBatchTests(APITestCase):
+    """Test the batch voucher lookup endpoint."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            email='batch@example.com', password='testpass123',
+            first_name='Bat', last_name='Ch', phone_number='+1234567890',
+        )
+        self.client.force_authenticate(self.user)
+        category = VoucherCategory.objects.create(name='Travel')
+        self.first = make_voucher(category, title='Lounge')
+        self.second = make_voucher(category, title='Hotel')
+        self.inactive = make_voucher(category, title='Retired', is_active=False)
+
+    def test_results_in_request_order_with_missing_items(self):
+        """Found vouchers and missing ids are reported per item, in order."""
+        ids = f'{self.second.id},999,{self.first.id},{self.inactive.id},{self.second.id}'
+        self.client.get(reverse('voucher_batch'), {'ids': self.first.id})  # warm the snapshot
+        with self.assertNumQueries(4):  # catalog and promotion stamps, stock key and live stock
+            response = self.client.get(reverse('voucher_batch'), {'ids': ids})
+        self.assertEqual(response.status_code, 200)
+        results = response.data['results']
+        self.assertEqual([r['id'] for r in results], [self.second.id, 999, self.first.id, self.inactive.id])
+        self.assertEqual([r['found'] for r in results], [True, False, True, False])
+        self.assertEqual(results[0]['voucher']['title'], 'Hotel')
+        self.assertEqual(results[1]['error'], 'Voucher not found')
+
+    def test_rejects_malformed_and_oversized_requests(self):
+        """Non-integer ids and batches over the limit are client errors."""
+        self.assertEqual(self.client.get(reverse('voucher_batch'), {'ids': '1,x'}).status_code, 400)
+        too_many = ','.join(str(i) for i in range(1, 200))
+        self.assertEqual(self.client.get(reverse('voucher_batch'), {'ids': too_many}).status_code, 400)
+
+
+class VoucherDisplayCacheTests(TestCase):
+    """Test page and fragment caching of the voucher display page."""
+
+    def setUp(self):
+        cache.clear()
+        self.category = VoucherCategory.objects.create(name='Dining')
+        self.voucher = make_voucher(self.category, title='Sushi Dinner')
+
+    def test_anonymous_hits_served_from_cache(self):
+        """A repeat anonymous visit is answered from the page cache without queries."""
+        first = self.client.get(reverse('voucher_display'))
+        self.assertEqual(first['X-Page-Cache'], 'miss')
+        self.assertContains(first, 'Sushi Dinner')
+        with self.assertNumQueries(0):
+            second = self.client.get(reverse('voucher_display'))
+        self.assertEqual(second['X-Page-Cache'], 'hit')
+        self.assertEqual(second.content, first.content)
+
+    def test_catalog_change_invalidates_page(self):
+        """Editing a voucher retires the cached page and fragment."""
+        self.client.get(reverse('voucher_display'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.voucher.title = 'Ramen Lunch'
+            self.voucher.save()
+        response = self.client.get(reverse('voucher_display'))
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+        self.assertContains(response, 'Ramen Lunch')
+        self.assertNotContains(response, 'Sushi Dinner')
+
+
+class VoucherFacetTests(APITestCase):
+    """Test the catalog facet counts endpoint."""
+
+    def setUp(self):
+        cache.clear()
+        self.dining = VoucherCategory.objects.create(name='Dining')
+        self.travel = VoucherCategory.objects.create(name='Travel')
+        make_voucher(self.dining, title='Sushi Dinner', points=1200, featured=True)
+        make_voucher(self.dining, title='Coffee', points=400)
+        make_voucher(self.travel, title='Airport Lounge', points=6000)
+
+    def test_counts_from_one_query_then_cache(self):
+        """All facets come from a single aggregate and repeat calls hit the cache."""
+        with self.assertNumQueries(1):
+            data = facets.compute_facets()
+        self.assertEqual(data['total'], 3)
+        self.assertEqual({c['name']: c['count'] for c in data['categories']}, {'Dining': 2, 'Travel': 1})
+        self.assertEqual([b['count'] for b in data['points']], [1, 1, 0, 1])
+        self.assertEqual(data['featured'], {'featured': 1, 'standard': 2})
+        facets.get_facets()
+        with self.assertNumQueries(0):
+            facets.get_facets()
+
+    def test_filters_and_promotion_buckets(self):
+        """Filters apply and discounted vouchers move to their effective bucket."""
+        response = self.client.get(reverse('voucher_facets'), {'search': 'lounge'})
+        self.assertEqual(response.data['total'], 1)
+        promo = promotions.resolve('UTC', datetime(2025, 1, 6, 18, 0, tzinfo=ZoneInfo('UTC')))
+        data = facets.compute_facets(category_name='Dining', promo=promo)
+        # 1200 at 30% off is 840 points
+        self.assertEqual([b['count'] for b in data['points']], [2, 0, 0, 0])
+        self.assertEqual(data['promotion'], promotions.FALLBACK_NAME)
+
+    def test_buckets_agree_with_listed_prices_at_edges(self):
+        """SQL and the API round discounts the same way, so a price on a bucket edge lands in its bucket."""
+        promo = promotions.resolve('UTC', datetime(2025, 1, 6, 18, 0, tzinfo=ZoneInfo('UTC')))
+        # 1415 at 30% off is 990.5: SQL rounds half up to 991, where round() gave 990
+        edge = make_voucher(self.dining, title='Edge', points=1415)
+        self.assertEqual(promotions.discounted_points(1415, 30), 991)
+        annotated = (Voucher.objects.filter(id=edge.id)
+                     .annotate(p=facets._effective_points_expression(promo)).values_list('p', flat=True).get())
+        self.assertEqual(annotated, promotions.discounted_points(edge.points, 30))
+
+    def test_discounts_round_half_up(self):
+        """Exact halves round up, unlike round()'s round-half-even, which listed prices used before."""
+        self.assertEqual(promotions.discounted_points(250, 10), 225)
+        self.assertEqual(promotions.discounted_points(5, 50), 3)  # round(2.5) gave 2
+        self.assertEqual(promotions.discounted_points(7, 50), 4)  # round(3.5) gave 4 too
+        self.assertEqual(promotions.discounted_points(1000, 0), 1000)
+        self.assertEqual(promotions.discounted_points(1000, 100), 0)
+
+    def test_large_search_results_are_batched(self):
+        """Search ids go to the database in bounded batches and the counts add up."""
+        ids = list(Voucher.objects.values_list('id', flat=True))
+        with mock.patch.object(facets, 'ID_BATCH_SIZE', 2), \
+                mock.patch.object(facets, 'search_voucher_ids', return_value=ids + [10 ** 9]):
+            with self.assertNumQueries(2):
+                data = facets.compute_facets(search='anything')
+        self.assertEqual(data['total'], 3)
+        self.assertEqual({c['name']: c['count'] for c in data['categories']}, {'Dining': 2, 'Travel': 1})
+
+
+class ConditionalRedemptionTests(APITestCase):
+    """Test redemptions guarded by conditional UPDATEs."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='redeem@example.com', password='testpass123',
+            first_name='Red', last_name='Eem', phone_number='+1234567890',
+        )
+        UserProfile.objects.create(user=self.user, points=2500)
+        self.client.force_authenticate(self.user)
+        self.category = VoucherCategory.objects.create(name='Travel')
+        self.voucher = make_voucher(self.category, points=1000, quantity_available=1)
+
+    def test_last_unit_cannot_be_oversold(self):
+        """A stale in-memory stock count does not let a second redemption through."""
+        stale = Voucher.objects.get(id=self.voucher.id)
+        redemption.redeem(self.user, self.voucher, 1, 1000)
+        with self.assertRaises(redemption.InsufficientStockError):
+            redemption.redeem(self.user, stale, 1, 1000)
+        self.assertEqual(Voucher.objects.get(id=self.voucher.id).quantity_available, 0)
+        self.assertEqual(redemption.current_points(self.user), 1500)
+
+    def test_failed_debit_leaves_stock_untouched(self):
+        """Insufficient points roll back the stock reservation."""
+        with self.assertRaises(redemption.InsufficientPointsError):
+            redemption.redeem(self.user, self.voucher, 1, 5000)
+        self.assertEqual(Voucher.objects.get(id=self.voucher.id).quantity_available, 1)
+        self.assertFalse(Redemption.objects.exists())
+
+    def test_checkout_rolls_back_when_an_item_is_sold_out(self):
+        """A sold-out cart item undoes the points debit and earlier items."""
+        plenty = make_voucher(self.category, title='Plenty', points=500, quantity_available=10)
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, voucher=plenty, quantity=1)
+        CartItem.objects.create(cart=cart, voucher=self.voucher, quantity=2)
+        response = self.client.post(reverse('checkout_cart'))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(redemption.current_points(self.user), 2500)
+        self.assertEqual(Voucher.objects.get(id=plenty.id).quantity_available, 10)
+        self.assertFalse(Redemption.objects.exists())
+
+    def test_bulk_checkout_query_count_is_constant(self):
+        """Checkout cost does not grow with the number of cart lines."""
+        vouchers = [make_voucher(self.category, title=f'Bulk {i}', points=10, quantity_available=5)
+                    for i in range(6)]
+
+        def count_queries(size):
+            lines = [redemption.CheckoutLine(v, 1, v.points) for v in vouchers[:size]]
+            with CaptureQueriesContext(connection) as queries:
+                redemption.checkout(self.user, lines)
+            return len(queries)
+
+        coupons.allocate(1)  # create the coupon sequence row
+        self.assertEqual(count_queries(2), count_queries(4))
+        self.assertEqual(redemption.current_points(self.user), 2500 - 60)
+        self.assertEqual(Voucher.objects.get(id=vouchers[0].id).quantity_available, 3)
+        self.assertEqual(Redemption.objects.values('coupon_code').distinct().count(), 6)
+
+
+class CouponAllocatorTests(TestCase):
+    """Test sequence-encoded coupon codes."""
+
+    def test_codes_unique_and_checksummed(self):
+        """Allocated codes are distinct, fixed-length and pass validation."""
+        codes = coupons.allocate(500) + coupons.allocate(3)
+        self.assertEqual(len(set(codes)), 503)
+        self.assertTrue(all(len(code) == coupons.CODE_LENGTH for code in codes))
+        self.assertTrue(all(coupons.is_valid(code) for code in codes))
+
+    def test_typos_detected_and_lookalikes_accepted(self):
+        """A mistyped symbol fails the check; O/I/L and dashes are normalised."""
+        code = coupons.encode(12345)
+        wrong = ('1' if code[3] != '1' else '2')
+        self.assertFalse(coupons.is_valid(code[:3] + wrong + code[4:]))
+        self.assertTrue(coupons.is_valid(f'{code[:5]}-{code[5:]}'.lower().replace('0', 'o')))
+
+    def test_redemption_save_uses_allocator_without_probing(self):
+        """Saving a redemption allocates a code without an existence query."""
+        user = User.objects.create_user(
+            email='coupon@example.com', password='testpass123',
+            first_name='Cou', last_name='Pon', phone_number='+1234567890',
+        )
+        voucher = make_voucher(VoucherCategory.objects.create(name='Dining'))
+        with CaptureQueriesContext(connection) as queries:
+            created = Redemption.objects.create(user=user, voucher=voucher, points_used=100)
+        self.assertTrue(coupons.is_valid(created.coupon_code))
+        self.assertFalse(any('coupon_code' in q['sql'] and 'SELECT' in q['sql'] for q in queries))
+
+
+class PdfJobQueueTests(APITestCase):
+    """Test asynchronous voucher PDF rendering."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='pdf@example.com', password='testpass123',
+            first_name='P', last_name='Df', phone_number='+1234567890',
+        )
+        UserProfile.objects.create(user=self.user, points=5000)
+        self.client.force_authenticate(self.user)
+        self.voucher = make_voucher(VoucherCategory.objects.create(name='Travel'), points=1000)
+
+    def redeem(self):
+        response = self.client.post(reverse('redeem_voucher'), {'voucher_id': self.voucher.id}, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.data['redemption_id']
+
+    def test_redeem_returns_before_rendering(self):
+        """Redemption enqueues a job and reports the PDF as pending until the worker runs."""
+        with mock.patch.object(pdf_jobs, '_render') as render:
+            redemption_id = self.redeem()
+            render.assert_not_called()
+        response = self.client.get(reverse('download_voucher_pdf', args=[redemption_id]))
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['pdf_status'], 'pending')
+
+        with mock.patch.object(pdf_jobs, '_render', return_value='/media/vouchers/v.pdf'):
+            self.assertEqual(pdf_jobs.run_pending(), (1, 0))
+        response = self.client.get(reverse('download_voucher_pdf', args=[redemption_id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'pdf_status': 'ready', 'pdf_url': '/media/vouchers/v.pdf'})
+
+    def test_failures_retry_with_backoff_then_fail(self):
+        """Each failure is recorded; the job backs off and gives up after max_attempts."""
+        redemption_id = self.redeem()
+        job = PdfJob.objects.get()
+        with mock.patch.object(pdf_jobs, '_render', side_effect=RuntimeError('image fetch timed out')):
+            for attempt in range(1, job.max_attempts + 1):
+                self.assertEqual(pdf_jobs.run_pending(), (0, 1))
+                job.refresh_from_db()
+                self.assertEqual(job.attempts, attempt)
+                self.assertIn('image fetch timed out', job.last_error)
+                # Backed-off jobs are not claimable until run_after passes
+                self.assertIsNone(pdf_jobs.claim_next())
+                PdfJob.objects.filter(id=job.id).update(run_after=timezone.now())
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        response = self.client.get(reverse('download_voucher_pdf', args=[redemption_id]))
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(response.data['pdf_status'], 'failed')
+
+    def test_polling_never_creates_jobs(self):
+        """Redemptions from before the queue get their jobs from the backfill migration, not from GETs."""
+        legacy = Redemption.objects.create(user=self.user, voucher=self.voucher, points_used=1000, status='completed')
+        for _ in range(2):
+            response = self.client.get(reverse('download_voucher_pdf', args=[legacy.id]))
+            self.assertEqual(response.data['pdf_status'], 'pending')
+        self.assertFalse(PdfJob.objects.exists())
+
+        backfill = importlib.import_module('accounts.migrations.0016_backfill_pdf_jobs').backfill_pdf_jobs
+        backfill(django_apps, None)
+        backfill(django_apps, None)
+        self.assertEqual(list(PdfJob.objects.values_list('redemptions', flat=True)), [legacy.id])
+
+
+class IdempotencyKeyTests(APITestCase):
+    """Test Idempotency-Key replay on redemption."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='retry@example.com', password='testpass123',
+            first_name='Re', last_name='Try', phone_number='+1234567890',
+        )
+        UserProfile.objects.create(user=self.user, points=5000)
+        self.client.force_authenticate(self.user)
+        self.voucher = make_voucher(VoucherCategory.objects.create(name='Travel'), points=1000)
+
+    def redeem(self, key, **data):
+        body = {'voucher_id': self.voucher.id, **data}
+        return self.client.post(reverse('redeem_voucher'), body, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_replays_without_running_again(self):
+        """A repeated key returns the stored response and spends points once."""
+        first = self.redeem('key-1')
+        second = self.redeem('key-1')
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(second.data['redemption_id'], first.data['redemption_id'])
+        self.assertEqual(Redemption.objects.count(), 1)
+        self.assertEqual(redemption.current_points(self.user), 4000)
+
+    def test_key_reused_for_different_request_rejected(self):
+        """The same key with a different body is a client error."""
+        self.redeem('key-2')
+        self.assertEqual(self.redeem('key-2', quantity=2).status_code, 422)
+
+    def test_in_flight_duplicate_gets_conflict_after_waiting(self):
+        """A duplicate of a request that never finishes times out with 409."""
+        IdempotencyRecord.objects.create(
+            user=self.user, key='key-3', endpoint='redeem_voucher',
+            fingerprint='x' * 64, expires_at=timezone.now() + idempotency.TTL,
+        )
+        with mock.patch.object(idempotency, '_fingerprint', return_value='x' * 64), \
+                mock.patch.object(idempotency, 'WAIT_SECONDS', 0):
+            self.assertEqual(self.redeem('key-3').status_code, 409)
+        self.assertFalse(Redemption.objects.exists())
+
+    def test_abandoned_claim_is_taken_over(self):
+        """An in-progress record past its lease no longer blocks retries."""
+        record = IdempotencyRecord.objects.create(
+            user=self.user, key='key-4', endpoint='redeem_voucher',
+            fingerprint='x' * 64, expires_at=timezone.now() + idempotency.TTL,
+        )
+        IdempotencyRecord.objects.filter(id=record.id).update(
+            created_at=timezone.now() - idempotency.LEASE - timedelta(seconds=1),
+        )
+        with mock.patch.object(idempotency, '_fingerprint', return_value='x' * 64), \
+                mock.patch.object(idempotency, 'WAIT_SECONDS', 0):
+            self.assertEqual(self.redeem('key-4').status_code, 201)
+            replay = self.redeem('key-4')
+        self.assertEqual(replay['Idempotent-Replayed'], 'true')
+        self.assertEqual(Redemption.objects.count(), 1)
+
+
+class CartReadModelTests(APITestCase):
+    """Test denormalized cart totals and the single-query cart read."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='cart@example.com', password='testpass123',
+            first_name='Ca', last_name='Rt', phone_number='+1234567890',
+        )
+        self.client.force_authenticate(self.user)
+        self.category = VoucherCategory.objects.create(name='Travel')
+        self.lounge = make_voucher(self.category, title='Lounge', points=1000)
+        self.hotel = make_voucher(self.category, title='Hotel', points=300)
+
+    def totals(self):
+        return Cart.objects.values_list('total_points', 'item_count').get(user=self.user)
+
+    def test_mutations_keep_running_totals(self):
+        """Add, update and remove adjust the stored totals in step."""
+        self.client.post(reverse('add_to_cart'), {'voucher_id': self.lounge.id, 'quantity': 2}, format='json')
+        self.client.post(reverse('add_to_cart'), {'voucher_id': self.hotel.id}, format='json')
+        self.client.post(reverse('add_to_cart'), {'voucher_id': self.hotel.id}, format='json')
+        self.assertEqual(self.totals(), (2600, 4))
+        item = CartItem.objects.get(voucher=self.hotel)
+        self.client.put(reverse('update_cart_item', args=[item.id]), {'quantity': 5}, format='json')
+        self.assertEqual(self.totals(), (3500, 7))
+        self.client.delete(reverse('remove_from_cart', args=[item.id]))
+        self.assertEqual(self.totals(), (2000, 2))
+
+    def test_read_is_one_query_and_repairs_drift(self):
+        """The cart, items and vouchers load in one query; stale totals are repaired."""
+        cart = carts.get_cart(self.user)
+        carts.add_item(cart, self.lounge, 1)
+        carts.add_item(cart, self.hotel, 2)
+        with self.assertNumQueries(1):
+            data = carts.read_cart(self.user)
+        self.assertEqual((data['total_points'], data['item_count']), (1600, 3))
+        self.assertEqual([item['voucher']['title'] for item in data['items']], ['Lounge', 'Hotel'])
+
+        Voucher.objects.filter(id=self.hotel.id).update(points=500)
+        data = carts.read_cart(self.user, price=lambda points, category_id: points // 2)
+        self.assertEqual((data['total_points'], data['effective_total_points']), (2000, 1000))
+        self.assertEqual(self.totals(), (2000, 3))
+
+    def test_empty_cart(self):
+        """A user without a cart gets an empty one."""
+        response = self.client.get(reverse('cart_detail'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['items'], response.data['total_points']), ([], 0))
+
+
+class CartBatchTests(APITestCase):
+    """Test the atomic cart batch endpoint."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='batch@example.com', password='testpass123',
+            first_name='Ba', last_name='Tch', phone_number='+1234567890',
+        )
+        self.client.force_authenticate(self.user)
+        self.category = VoucherCategory.objects.create(name='Travel')
+        self.lounge = make_voucher(self.category, title='Lounge', points=1000, quantity_available=3)
+        self.hotel = make_voucher(self.category, title='Hotel', points=300)
+
+    def batch(self, operations):
+        return self.client.post(reverse('cart_batch'), {'operations': operations}, format='json')
+
+    def test_operations_apply_in_order(self):
+        """Later operations see earlier ones and the resulting cart is returned."""
+        item = carts.add_item(carts.get_cart(self.user), self.hotel, 1)
+        response = self.batch([
+            {'op': 'add', 'voucher_id': self.lounge.id, 'quantity': 2},
+            {'op': 'add', 'voucher_id': self.lounge.id},
+            {'op': 'set', 'item_id': item.id, 'quantity': 4},
+            {'op': 'add', 'voucher_id': self.hotel.id},
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['total_points'], response.data['item_count']), (4500, 8))
+        self.assertEqual(
+            [(line['voucher']['title'], line['quantity']) for line in response.data['items']],
+            [('Hotel', 5), ('Lounge', 3)],
+        )
+        self.assertEqual(Cart.objects.values_list('total_points', 'item_count').get(user=self.user), (4500, 8))
+        self.assertEqual(Notification.objects.filter(user=self.user).count(), 1)
+
+        response = self.batch([{'op': 'remove', 'voucher_id': self.hotel.id}])
+        self.assertEqual(response.data['item_count'], 3)
+        self.assertFalse(CartItem.objects.filter(voucher=self.hotel).exists())
+
+    def test_failure_rolls_back_whole_batch(self):
+        """A stock shortfall in a later operation leaves the cart untouched."""
+        response = self.batch([
+            {'op': 'add', 'voucher_id': self.hotel.id},
+            {'op': 'add', 'voucher_id': self.lounge.id, 'quantity': 2},
+            {'op': 'add', 'voucher_id': self.lounge.id, 'quantity': 2},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['index'], 2)
+        self.assertFalse(CartItem.objects.exists())
+        self.assertFalse(Notification.objects.exists())
+
+    def test_invalid_operations(self):
+        """Malformed bodies and unknown targets are rejected."""
+        self.assertEqual(self.batch([]).status_code, 400)
+        self.assertEqual(self.batch([{'op': 'merge', 'voucher_id': self.hotel.id}]).data['index'], 0)
+        self.assertEqual(self.batch([{'op': 'add', 'voucher_id': self.hotel.id, 'quantity': 0}]).status_code, 400)
+        self.assertEqual(self.batch([{'op': 'remove', 'item_id': 999}]).data['error'], 'Cart item not found')
+        Voucher.objects.filter(id=self.hotel.id).update(is_active=False)
+        self.assertEqual(self.batch([{'op': 'add', 'voucher_id': self.hotel.id}]).data['error'], 'Voucher not found')
+
+
+class ShardedStockTests(TestCase):
+    """Test sharded stock counters for flash-sale vouchers."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='shard@example.com', password='testpass123',
+            first_name='Sh', last_name='Ard', phone_number='+1234567890',
+        )
+        UserProfile.objects.create(user=self.user, points=100000)
+        self.category = VoucherCategory.objects.create(name='Travel')
+        self.voucher = make_voucher(self.category, points=100, quantity_available=10)
+
+    def shard_quantities(self):
+        return list(VoucherStockShard.objects.filter(voucher=self.voucher).order_by('shard').values_list('quantity', flat=True))
+
+    def test_stock_split_and_folded_back(self):
+        """Enabling sharding splits stock evenly; turning it off restores the column."""
+        inventory.set_stock(self.voucher, 4)
+        self.assertEqual(self.shard_quantities(), [3, 3, 2, 2])
+        self.assertEqual(inventory.available(self.voucher), 10)
+        redemption.redeem(self.user, self.voucher, 1, 100)
+        self.assertEqual(inventory.available(self.voucher), 9)
+        inventory.set_stock(self.voucher, 0)
+        self.assertFalse(VoucherStockShard.objects.exists())
+        self.assertEqual(Voucher.objects.get(id=self.voucher.id).quantity_available, 9)
+
+    def test_listing_sums_the_shards(self):
+        """Listings report a sharded voucher's shard total, not its lagging snapshot column."""
+        inventory.set_stock(self.voucher, 4)
+        redemption.redeem(self.user, self.voucher, 1, 100)
+        self.assertEqual(Voucher.objects.get(id=self.voucher.id).quantity_available, 10)
+        self.assertEqual(self.client.get(reverse('voucher_list')).data[0]['quantity_available'], 9)
+
+    def test_redemptions_spread_across_shards_and_never_oversell(self):
+        """Takes span shards when needed and fail once the total is exhausted."""
+        inventory.set_stock(self.voucher, 3)
+        redemption.redeem(self.user, self.voucher, 3, 100)
+        redemption.redeem(self.user, self.voucher, 3, 100)
+        redemption.redeem(self.user, self.voucher, 3, 100)
+        with self.assertRaises(redemption.InsufficientStockError):
+            redemption.redeem(self.user, self.voucher, 2, 100)
+        redemption.redeem(self.user, self.voucher, 1, 100)
+        with self.assertRaises(redemption.InsufficientStockError):
+            redemption.redeem(self.user, self.voucher, 1, 100)
+        self.assertEqual(self.shard_quantities(), [0, 0, 0])
+        self.assertEqual(Voucher.objects.get(id=self.voucher.id).quantity_available, 0)
+
+    def test_checkout_takes_from_shards(self):
+        """Cart checkout mixes sharded and plain vouchers."""
+        plain = make_voucher(self.category, title='Plain', points=100, quantity_available=5)
+        inventory.set_stock(self.voucher, 2)
+        redemption.checkout(self.user, [
+            redemption.CheckoutLine(self.voucher, 7, 100),
+            redemption.CheckoutLine(plain, 2, 100),
+        ])
+        self.assertEqual(inventory.available(self.voucher), 3)
+        self.assertEqual(Voucher.objects.get(id=plain.id).quantity_available, 3)
+
+    def test_stale_instance_takes_from_shards(self):
+        """A voucher loaded before it was sharded still sells from the shards, not the snapshot."""
+        stale = Voucher.objects.get(id=self.voucher.id)
+        plain = make_voucher(self.category, title='Plain', points=100, quantity_available=5)
+        inventory.set_stock(self.voucher, 2)
+        redemption.redeem(self.user, Voucher.objects.get(id=self.voucher.id), 6, 100)
+        redemption.checkout(self.user, [
+            redemption.CheckoutLine(stale, 3, 100),
+            redemption.CheckoutLine(plain, 1, 100),
+        ])
+        self.assertEqual(inventory.available(self.voucher), 1)
+        self.assertEqual(Voucher.objects.get(id=plain.id).quantity_available, 4)
+        # The snapshot column still reads 4 here; only one unit is left in the shards
+        stale = Voucher.objects.get(id=self.voucher.id)
+        stale.stock_shard_count = 0
+        with self.assertRaises(redemption.InsufficientStockError):
+            redemption.redeem(self.user, stale, 2, 100)
+        redemption.redeem(self.user, stale, 1, 100)
+        self.assertEqual(inventory.available(self.voucher), 0)
+
+    def test_admin_locks_stock_of_sharded_vouchers(self):
+        model_admin = admin.site._registry[Voucher]
+        self.assertNotIn('quantity_available', model_admin.get_readonly_fields(None, self.voucher))
+        inventory.set_stock(self.voucher, 2)
+        self.assertIn('quantity_available', model_admin.get_readonly_fields(None, self.voucher))
+
+    def test_rebalance_command(self):
+        """The command evens out shards and can restock."""
+        inventory.set_stock(self.voucher, 2)
+        VoucherStockShard.objects.filter(voucher=self.voucher, shard=0).update(quantity=0)
+        call_command('rebalance_stock', stdout=StringIO())
+        self.assertEqual(self.shard_quantities(), [3, 2])
+        call_command('rebalance_stock', str(self.voucher.id), '--shards', '4', '--stock', '20', stdout=StringIO())
+        self.assertEqual(self.shard_quantities(), [5, 5, 5, 5])
+        with self.assertRaises(CommandError):
+            call_command('rebalance_stock', '--shards', '4', stdout=StringIO())
+
+
+class AdmissionControlTests(APITestCase):
+    """Test per-voucher admission control and the redemption waiting room."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='queue@example.com', password='testpass123',
+            first_name='Qu', last_name='Eue', phone_number='+1234567890',
+        )
+        UserProfile.objects.create(user=self.user, points=10000)
+        self.client.force_authenticate(self.user)
+        self.category = VoucherCategory.objects.create(name='Travel')
+        self.voucher = make_voucher(self.category, points=100, quantity_available=5)
+        self.now = 1000.0
+        admission.reset()
+        for patcher in (
+            mock.patch.object(admission.time, 'monotonic', lambda: self.now),
+            mock.patch.object(admission, 'RATE', 1.0),
+            mock.patch.object(admission, 'BURST', 1),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(admission.reset)
+
+    def redeem(self, ticket=None, quantity=1):
+        headers = {'HTTP_ADMISSION_TICKET': ticket} if ticket else {}
+        return self.client.post(reverse('redeem_voucher'), {'voucher_id': self.voucher.id, 'quantity': quantity},
+                                format='json', **headers)
+
+    def test_sold_out_rejected_before_redeeming(self):
+        """Requests for more than the catalog lists never reach the redemption."""
+        with mock.patch.object(redemption, 'redeem') as redeem:
+            response = self.redeem(quantity=6)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['admission'], admission.SOLD_OUT)
+        redeem.assert_not_called()
+
+    def test_concurrency_cap(self):
+        """Only MAX_CONCURRENT redemptions of a voucher run at once."""
+        with mock.patch.object(admission, 'MAX_CONCURRENT', 1), mock.patch.object(admission, 'BURST', 5):
+            admission.reset()
+            self.assertTrue(admission.enter(self.voucher.id).admitted)
+            self.assertEqual(admission.enter(self.voucher.id).status, admission.BUSY)
+            admission.leave(self.voucher.id)
+            self.assertTrue(admission.enter(self.voucher.id).admitted)
+
+    def test_waiting_room_admits_tickets_in_order(self):
+        """Turned-away clients queue, watch their position, and redeem once admitted."""
+        self.assertEqual(self.redeem().status_code, 201)
+        response = self.redeem()
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+
+        first = self.client.post(reverse('redemption_queue', args=[self.voucher.id])).data
+        self.client.force_authenticate(self.other_user())
+        second = self.client.post(reverse('redemption_queue', args=[self.voucher.id])).data
+        self.client.force_authenticate(self.user)
+        self.assertEqual((first['status'], first['position']), (admission.WAITING, 1))
+        self.assertEqual(second['position'], 2)
+        self.assertEqual(self.redeem(first['ticket']).status_code, 429)
+
+        self.now += 1
+        url = reverse('redemption_queue', args=[self.voucher.id])
+        self.assertEqual(self.client.get(url, {'ticket': first['ticket']}).data['status'], admission.ADMITTED)
+        self.assertEqual(self.client.get(url, {'ticket': first['ticket']}).data['position'], 0)
+        # Ticket-less requests wait behind the queue
+        self.assertEqual(self.redeem().status_code, 429)
+        self.assertEqual(self.redeem(first['ticket']).status_code, 201)
+        self.assertEqual(self.redeem(first['ticket']).data['admission'], admission.EXPIRED)
+        self.assertEqual(self.client.get(url, {'ticket': 'forged'}).status_code, 409)
+
+    def test_unknown_vouchers_get_no_gate(self):
+        """Ids outside the catalog are answered with 404 and never create a gate or a ticket."""
+        missing = self.voucher.id + 1000
+        response = self.client.post(reverse('redemption_queue', args=[missing]))
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn('ticket', response.data)
+        response = self.client.post(reverse('redeem_voucher'), {'voucher_id': missing}, format='json')
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn(missing, admission._gates)
+
+    def other_user(self):
+        return User.objects.create_user(
+            email='other@example.com', password='testpass123',
+            first_name='Ot', last_name='Her', phone_number='+1234567891',
+        )
+
+    def test_one_live_ticket_per_user(self):
+        """Joining again returns the same ticket, and tickets only work for their holder."""
+        url = reverse('redemption_queue', args=[self.voucher.id])
+        self.assertEqual(self.redeem().status_code, 201)
+        first = self.client.post(url).data
+        again = self.client.post(url).data
+        self.assertEqual((again['ticket'], again['position']), (first['ticket'], 1))
+
+        self.client.force_authenticate(self.other_user())
+        self.now += 1
+        self.assertEqual(self.client.get(url, {'ticket': first['ticket']}).status_code, 409)
+        self.assertEqual(self.redeem(first['ticket']).data['admission'], admission.EXPIRED)
+
+    def test_unspent_admitted_ticket_lapses(self):
+        """An admitted ticket nobody redeems expires and no longer holds up the queue."""
+        url = reverse('redemption_queue', args=[self.voucher.id])
+        self.assertEqual(self.redeem().status_code, 201)
+        ticket = self.client.post(url).data['ticket']
+        self.now += 1
+        self.assertEqual(self.client.get(url, {'ticket': ticket}).data['status'], admission.ADMITTED)
+        self.now += admission.ADMITTED_TICKET_TTL
+        self.assertEqual(self.client.get(url, {'ticket': ticket}).data['admission'], admission.EXPIRED)
+        self.assertEqual(self.redeem().status_code, 201)
+        gate = admission._gate(self.voucher.id)
+        self.assertEqual((gate.admitted_at, gate.holders, gate.owners), ({}, {}, {}))
+        # A lapsed ticket's holder can join again
+        self.assertNotEqual(self.client.post(url).data['ticket'], ticket)
+
+    def test_refusals_are_not_replayed_for_an_idempotency_key(self):
+        """A retry with the same key after joining the queue is decided again, not answered from storage."""
+        self.assertEqual(self.redeem().status_code, 201)
+        key = {'HTTP_IDEMPOTENCY_KEY': 'flash-sale-1'}
+        response = self.client.post(reverse('redeem_voucher'), {'voucher_id': self.voucher.id}, format='json',
+                                    HTTP_ADMISSION_TICKET='forged', **key)
+        self.assertEqual(response.data['admission'], admission.EXPIRED)
+        ticket = self.client.post(reverse('redemption_queue', args=[self.voucher.id])).data['ticket']
+        self.now += 1
+        response = self.client.post(reverse('redeem_voucher'), {'voucher_id': self.voucher.id}, format='json',
+                                    HTTP_ADMISSION_TICKET=ticket, **key)
+        self.assertEqual(response.status_code, 201)
+
+
+class PointsLedgerTests(TestCase):
+    """Test the append-only points ledger and its cached balance."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='ledger@example.com', password='testpass123',
+            first_name='Led', last_name='Ger', phone_number='+1234567890',
+        )
+        UserProfile.objects.create(user=self.user, points=5000)
+        RewardTier.objects.create(tier_name='bronze', tier_level=1, min_points=0)
+        self.category = VoucherCategory.objects.create(name='Travel')
+        self.voucher = make_voucher(self.category, points=1000)
+
+    def entries(self):
+        return list(PointsLedger.objects.filter(user=self.user).order_by('id').values_list('amount', 'reason'))
+
+    def test_every_change_is_recorded(self):
+        """Opening balance, redemptions, activities and adjustments each append one entry."""
+        redemption.redeem(self.user, self.voucher, 2, 1000)
+        activity = TierActivity.objects.create(user=self.user, activity_type='login', points_earned=100)
+        activity.description = 'edited'
+        activity.save()
+        points.set_balance(self.user, 10000)
+        self.assertEqual(self.entries(), [
+            (5000, points.OPENING_BALANCE),
+            (-2000, points.REDEMPTION),
+            (100, points.TIER_ACTIVITY),
+            (6900, points.ADJUSTMENT),
+        ])
+        self.assertEqual(points.balance(self.user), 10000)
+        self.assertEqual(points.verify(self.user), (10000, 10000))
+
+    def test_admin_cannot_bypass_the_ledger(self):
+        profile = UserProfile.objects.get(user=self.user)
+        self.assertIn('points', admin.site._registry[UserProfile].get_readonly_fields(None, profile))
+
+    def test_failed_debit_writes_nothing(self):
+        """An unaffordable debit leaves no entry behind."""
+        with self.assertRaises(redemption.InsufficientPointsError):
+            redemption.redeem(self.user, self.voucher, 6, 1000)
+        self.assertEqual(self.entries(), [(5000, points.OPENING_BALANCE)])
+
+    def test_replay_starts_from_latest_snapshot(self):
+        """Snapshots bound the replay, and skip users whose ledger has not moved."""
+        points.credit(self.user, 250, points.GAME)
+        snapshot = points.take_snapshot(self.user)
+        self.assertEqual(snapshot.balance, 5250)
+        self.assertIsNone(points.take_snapshot(self.user))
+        points.credit(self.user, -50, points.ADJUSTMENT)
+        PointsLedger.objects.filter(id__lte=snapshot.last_entry_id).delete()
+        self.assertEqual(points.replay(self.user), 5200)
+
+    def test_backfill_and_snapshot_commands(self):
+        """Profiles from before the ledger are opened once; snapshot_points reports drift."""
+        PointsLedger.objects.all().delete()
+        UserProfile.objects.filter(user=self.user).update(points=7000)
+        call_command('backfill_points_ledger', stdout=StringIO())
+        call_command('backfill_points_ledger', stdout=StringIO())
+        self.assertEqual(self.entries(), [(7000, points.OPENING_BALANCE)])
+        self.assertEqual(PointsSnapshot.objects.get(user=self.user).balance, 7000)
+
+        UserProfile.objects.filter(user=self.user).update(points=7100)
+        out = StringIO()
+        call_command('snapshot_points', '--verify', stdout=out)
+        self.assertIn('cached 7100, ledger 7000', out.getvalue())
+
+    def test_backfill_counts_entries_written_since_migrating(self):
+        """A profile that earned or spent points before the backfill still ends up balanced."""
+        PointsLedger.objects.all().delete()
+        UserProfile.objects.filter(user=self.user).update(points=7000)
+        points.credit(self.user, 250, points.GAME)
+        redemption.redeem(self.user, self.voucher, 1, 1000)
+        call_command('backfill_points_ledger', stdout=StringIO())
+        self.assertEqual(self.entries(), [(250, points.GAME), (-1000, points.REDEMPTION),
+                                          (7000, points.OPENING_BALANCE)])
+        self.assertEqual(points.verify(self.user), (6250, 6250))
+
+    def test_migration_opens_the_ledger(self):
+        """Creating the ledger records each profile's points as its opening balance."""
+        PointsLedger.objects.all().delete()
+        open_ledger = importlib.import_module('accounts.migrations.0014_points_ledger').open_ledger
+        open_ledger(django_apps, None)
+        self.assertEqual(self.entries(), [(5000, points.OPENING_BALANCE)])
+        self.assertEqual(points.verify(self.user), (5000, 5000))
+
+
+def make_png(size, color='red'):
+    """Encode a solid-colour PNG of ``size`` pixels."""
+    out = BytesIO()
+    PILImage.new('RGB', size, color).save(out, format='PNG')
+    return out.getvalue()
+
+
+class VoucherImageCacheTests(TestCase):
+    """Test the on-disk cache of prepared voucher images."""
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir, ignore_errors=True)
+        settings_override = override_settings(VOUCHER_IMAGE_CACHE_DIR=self.cache_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        image_cache._failures.clear()
+
+    def respond(self, content):
+        return mock.Mock(content=content, raise_for_status=mock.Mock())
+
+    def test_image_is_fetched_once_and_prepared(self):
+        """A miss downloads and shrinks the image; later renders read it from disk."""
+        url = 'https://example.com/big.png'
+        with mock.patch.object(image_cache.requests, 'get', return_value=self.respond(make_png((1600, 800)))) as get:
+            path = image_cache.get(url)
+            self.assertEqual(image_cache.get(url), path)
+        self.assertEqual(get.call_count, 1)
+        with PILImage.open(path) as img:
+            self.assertEqual((img.format, img.size), ('JPEG', (600, 300)))
+
+    def test_identical_images_share_one_object(self):
+        """Two URLs serving the same picture are stored once."""
+        with mock.patch.object(image_cache.requests, 'get', return_value=self.respond(make_png((50, 50)))):
+            first = image_cache.get('https://example.com/a.png')
+            second = image_cache.get('https://example.com/b.png')
+        self.assertEqual(first, second)
+
+    def test_failed_download_is_not_retried_at_once(self):
+        """A failing URL is remembered so the fallback renderers skip it."""
+        url = 'https://example.com/missing.png'
+        with mock.patch.object(image_cache.requests, 'get', side_effect=ConnectionError('down')) as get:
+            self.assertIsNone(image_cache.get(url))
+            self.assertIsNone(image_cache.get(url))
+        self.assertEqual(get.call_count, 1)
+
+    def test_eviction_drops_least_recently_used(self):
+        """Over budget, the images read least recently are removed first."""
+        with mock.patch.object(image_cache.requests, 'get', side_effect=[
+            self.respond(make_png((300, 300), 'red')), self.respond(make_png((300, 300), 'blue')),
+        ]):
+            old = image_cache.get('https://example.com/old.png')
+            recent = image_cache.get('https://example.com/recent.png')
+        os.utime(old, (1, 1))
+        os.utime(recent, (2, 2))
+        image_cache.lookup('https://example.com/old.png')
+        recent_size = os.path.getsize(recent)
+        with override_settings(VOUCHER_IMAGE_CACHE_MAX_BYTES=os.path.getsize(old)):
+            self.assertEqual(image_cache.evict(), recent_size)
+        self.assertTrue(os.path.exists(old))
+        self.assertIsNone(image_cache.lookup('https://example.com/recent.png'))
+
+    def test_misses_walk_the_cache_only_when_over_budget(self):
+        """Stores are counted in memory; the directory is only walked once the total passes the budget."""
+        images = iter([make_png((300, 300), color) for color in ('red', 'blue', 'green')])
+        with mock.patch.object(image_cache.requests, 'get', side_effect=lambda *a, **kw: self.respond(next(images))), \
+                mock.patch.object(image_cache.os, 'walk', wraps=os.walk) as walk:
+            first = image_cache.get('https://example.com/1.png')
+            self.assertEqual(walk.call_count, 1)  # the first store measures the cache
+            second = image_cache.get('https://example.com/2.png')
+            self.assertEqual(walk.call_count, 1)
+            with override_settings(VOUCHER_IMAGE_CACHE_MAX_BYTES=os.path.getsize(first) + os.path.getsize(second)):
+                image_cache.get('https://example.com/3.png')
+            self.assertEqual(walk.call_count, 2)
+
+    def test_prewarm_command(self):
+        """prewarm_voucher_images fetches each distinct active image once."""
+        category = VoucherCategory.objects.create(name='Dining')
+        make_voucher(category)
+        make_voucher(category, title='Second Coffee')
+        make_voucher(category, title='Retired', image_url='https://example.com/old.jpg', is_active=False)
+        out = StringIO()
+        with mock.patch.object(image_cache.requests, 'get', return_value=self.respond(make_png((80, 80)))) as get:
+            call_command('prewarm_voucher_images', stdout=out)
+            call_command('prewarm_voucher_images', stdout=out)
+        self.assertEqual(get.call_count, 1)
+        self.assertIn('1 image(s): 0 already cached, 1 fetched, 0 failed', out.getvalue())
+        self.assertIn('1 image(s): 1 already cached, 0 fetched, 0 failed', out.getvalue())
+
+
+class PdfThemeTests(TestCase):
+    """Test the process-wide registry of PDF styles and fixed flowables."""
+
+    def setUp(self):
+        pdf_theme.reset()
+        self.addCleanup(pdf_theme.reset)
+        category = VoucherCategory.objects.create(name='Dining')
+        voucher = make_voucher(category, image_url='')
+        self.redemptions = [
+            Redemption(voucher=voucher, coupon_code=f'THEME{index}', points_used=1000, quantity=1)
+            for index in range(3)
+        ]
+
+    def test_themes_are_built_once(self):
+        """get shares one instance per theme; build always makes a new one."""
+        theme = pdf_theme.get('premium')
+        self.assertIs(pdf_theme.get('premium'), theme)
+        self.assertIsNot(pdf_theme.build('premium'), theme)
+        self.assertIsNot(pdf_theme.get('classic'), theme)
+
+    def test_renders_leave_prototypes_untouched(self):
+        """Layout happens on copies, so repeated renders share clean prototypes."""
+        theme = pdf_theme.get('premium')
+        header = theme.flowables['header'][0]
+        self.assertIsNot(theme.static('header')[0], header)
+        for _ in range(2):
+            self.assertTrue(premium_pdf.render_premium_voucher(self.redemptions[0]).startswith(b'%PDF'))
+        self.assertFalse(hasattr(header, 'blPara'))
+
+    def test_every_renderer_uses_the_registry(self):
+        """Premium and fallback renderers produce PDFs without building their own styles."""
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        with override_settings(MEDIA_ROOT=media_root), \
+                mock.patch.object(pdf_theme, 'getSampleStyleSheet', wraps=pdf_theme.getSampleStyleSheet) as sheet:
+            self.assertTrue(premium_pdf.render_premium_multi_voucher(self.redemptions).startswith(b'%PDF'))
+            self.assertTrue(generate_voucher_pdf_platypus(self.redemptions[0]))
+            self.assertTrue(generate_multi_voucher_pdf_platypus(self.redemptions))
+            calls = sheet.call_count
+            premium_pdf.render_premium_multi_voucher(self.redemptions)
+            generate_voucher_pdf_platypus(self.redemptions[0])
+        self.assertEqual(calls, 3)
+        self.assertEqual(sheet.call_count, 3)
+
+
+class PremiumTemplateTests(TestCase):
+    """Test stamping redemptions onto cached per-voucher page layouts."""
+
+    def setUp(self):
+        pdf_templates.reset()
+        self.addCleanup(pdf_templates.reset)
+        category = VoucherCategory.objects.create(name='Dining')
+        self.voucher = make_voucher(category, image_url='', terms='\n'.join(['Valid in store only.'] * 60))
+        # Uncompressed page streams, so stamped text can be found in the output
+        patcher = mock.patch.object(rl_config, 'pageCompression', 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def redeem(self, coupon_code, quantity=1):
+        return Redemption(voucher=self.voucher, coupon_code=coupon_code, points_used=1000 * quantity,
+                          quantity=quantity, completed_at=timezone.now())
+
+    def test_layout_is_recorded_once_per_voucher_version(self):
+        """Redemptions share the voucher's layout until the voucher is saved again."""
+        with mock.patch.object(pdf_templates, 'record', wraps=pdf_templates.record) as record:
+            first = premium_pdf.stamp_premium_voucher(self.redeem('STAMPONE'))
+            second = premium_pdf.stamp_premium_voucher(self.redeem('STAMPTWO', quantity=3))
+            self.assertEqual(record.call_count, 1)
+            self.voucher.title = 'Renamed Coffee Voucher'
+            self.voucher.save()
+            premium_pdf.stamp_premium_voucher(self.redeem('STAMPTHREE'))
+            self.assertEqual(record.call_count, 2)
+        self.assertIn(b'(STAMPONE)', first)
+        self.assertIn(b'(STAMPTWO)', second)
+        self.assertNotIn(b'(STAMPONE)', second)
+        self.assertIn(b'3,000', second)
+
+    def test_stamped_pages_match_a_full_layout(self):
+        """A stamped PDF draws the same pages as laying the document out in full."""
+        redemption = self.redeem('SAMEPAGES')
+        stamped = premium_pdf.stamp_premium_voucher(redemption)
+        full = premium_pdf.render_premium_voucher(redemption)
+        pages = re.compile(rb'stream\r?\n(.*?)endstream', re.S)
+        self.assertGreater(len(pages.findall(full)), 1)
+        self.assertEqual(pages.findall(stamped), pages.findall(full))
+
+    def test_rerenders_are_byte_identical(self):
+        """Nothing in a voucher PDF depends on when it was rendered, so pdf_store can dedupe it."""
+        redemption = self.redeem('REPEAT')
+        first = premium_pdf.render_premium_voucher(redemption)
+        collection = premium_pdf.render_premium_multi_voucher([redemption])
+        later = timezone.now() + timedelta(days=2)
+        with mock.patch.object(premium_pdf.timezone, 'now', return_value=later):
+            self.assertEqual(premium_pdf.render_premium_voucher(redemption), first)
+            self.assertEqual(premium_pdf.render_premium_multi_voucher([redemption]), collection)
+
+    def test_text_that_outgrows_its_slot_is_laid_out_in_full(self):
+        """A field too long for the recorded layout falls back to a full render."""
+        premium_pdf.stamp_premium_voucher(self.redeem('SHORT'))
+        with mock.patch.object(premium_pdf, 'render_premium_voucher', wraps=premium_pdf.render_premium_voucher) as full:
+            pdf = premium_pdf.stamp_premium_voucher(self.redeem(' '.join(['WIDE'] * 20)))
+        self.assertEqual(full.call_count, 1)
+        self.assertTrue(pdf.startswith(b'%PDF'))
+
+
+def blank_pdf(pages):
+    writer = PdfWriter()
+    for _ in range(pages):
+        writer.add_blank_page(width=612, height=792)
+    buffer = BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+class PdfPoolTests(TestCase):
+    """Test the process pool that renders voucher PDFs in parallel."""
+
+    def setUp(self):
+        self.addCleanup(pdf_pool.resize, None)
+        self.addCleanup(pdf_pool.shutdown, kill=True)
+        self.voucher = make_voucher(VoucherCategory.objects.create(name='Retail'), image_url='')
+
+    def redeem(self, index):
+        return Redemption(voucher=self.voucher, coupon_code=f'POOL{index:04d}', points_used=1000, quantity=1,
+                          completed_at=timezone.now())
+
+    @override_settings(PDF_RENDER_PROCESSES=0)
+    def test_disabled_pool_runs_inline(self):
+        """Without worker processes calls run in the caller, errors included."""
+        self.assertFalse(pdf_pool.enabled())
+        self.assertEqual(pdf_pool.run(sum, [([1, 2],), ([3],)]), [3, 3])
+        with self.assertRaises(ZeroDivisionError):
+            pdf_pool.result(pdf_pool.submit(divmod, 1, 0))
+        self.assertIsNone(pdf_pool._pool)
+
+    def test_stitch_keeps_parts_in_order(self):
+        self.assertEqual(len(PdfReader(BytesIO(pdf_pool.stitch([blank_pdf(2), blank_pdf(3)]))).pages), 5)
+
+    @override_settings(PDF_RENDER_PROCESSES=2)
+    def test_large_collection_is_rendered_in_parts(self):
+        """A large collection is split across workers and stitched back in order."""
+        redemptions = [self.redeem(index) for index in range(premium_pdf.PARALLEL_MIN_VOUCHERS)]
+        with mock.patch.object(premium_pdf, 'render_premium_multi_voucher') as serial:
+            pdf = premium_pdf.render_premium_collection(redemptions)
+        serial.assert_not_called()
+        text = ''.join(page.extract_text() for page in PdfReader(BytesIO(pdf)).pages)
+        positions = [text.index(redemption.coupon_code) for redemption in redemptions]
+        self.assertEqual(positions, sorted(positions))
+        self.assertEqual(text.count('Collection Summary'), 1)
+
+    @override_settings(PDF_RENDER_PROCESSES=2)
+    def test_busy_pool_pushes_back(self):
+        """Once max_pending() calls are in flight, submission gives up and collections render serially."""
+        for _ in range(pdf_pool.max_pending()):
+            pdf_pool.submit(sleep, 2)
+        with self.assertRaises(pdf_pool.PoolBusy):
+            pdf_pool.submit(sleep, 0, wait=0.1)
+
+        redemptions = [self.redeem(index) for index in range(premium_pdf.PARALLEL_MIN_VOUCHERS)]
+        with mock.patch.object(pdf_pool, 'SUBMIT_TIMEOUT', 0.1), \
+                mock.patch.object(premium_pdf, 'render_premium_multi_voucher', return_value=b'%PDF serial') as serial:
+            self.assertEqual(premium_pdf.render_premium_collection(redemptions), b'%PDF serial')
+        serial.assert_called_once_with(redemptions)
+
+    @override_settings(PDF_RENDER_PROCESSES=2, PDF_RENDER_TIMEOUT=0.5)
+    def test_overrunning_render_kills_the_pool(self):
+        """A render past the timeout raises RenderTimeout and the next call gets fresh workers."""
+        with self.assertRaises(pdf_pool.RenderTimeout):
+            pdf_pool.result(pdf_pool.submit(sleep, 30))
+        self.assertIsNone(pdf_pool._pool)
+        with override_settings(PDF_RENDER_TIMEOUT=30):
+            self.assertEqual(pdf_pool.run(divmod, [(7, 2)]), [(3, 1)])
+
+    def test_regenerate_command_rerenders_finished_jobs(self):
+        """Finished jobs are re-rendered and their redemptions point at the new file."""
+        user = User.objects.create_user(
+            email='regen@example.com', password='testpass123',
+            first_name='Re', last_name='Gen', phone_number='+1234567890',
+        )
+        job = PdfJob.objects.create(status='done', pdf_url='/media/vouchers/old.pdf')
+        redemption = Redemption.objects.create(
+            user=user, voucher=self.voucher, coupon_code='REGEN0001', points_used=1000, quantity=1,
+            status='completed', pdf_url='/media/vouchers/old.pdf',
+        )
+        job.redemptions.add(redemption)
+        out = StringIO()
+        with mock.patch.object(pdf_jobs, '_render', return_value='/media/vouchers/new.pdf') as render:
+            call_command('regenerate_voucher_pdfs', job.id, '--processes', '0', stdout=out)
+        self.assertEqual([r.id for r in render.call_args.args[0]], [redemption.id])
+        redemption.refresh_from_db()
+        job.refresh_from_db()
+        self.assertEqual((redemption.pdf_url, job.pdf_url), ('/media/vouchers/new.pdf', '/media/vouchers/new.pdf'))
+        self.assertIn('Re-rendered 1 PDF(s), 0 failed', out.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('regenerate_voucher_pdfs')
+
+
+class VoucherPdfStoreTests(APITestCase):
+    """Test content-addressed storage of generated voucher PDFs."""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        patcher = override_settings(MEDIA_ROOT=self.media_root, MEDIA_URL='/media/')
+        patcher.enable()
+        self.addCleanup(patcher.disable)
+        self.user = User.objects.create_user(
+            email='store@example.com', password='testpass123',
+            first_name='St', last_name='Ore', phone_number='+1234567890',
+        )
+        self.voucher = make_voucher(VoucherCategory.objects.create(name='Books'), image_url='')
+
+    def stored_files(self):
+        return sorted(
+            os.path.relpath(os.path.join(root, name), self.media_root)
+            for root, _dirs, files in os.walk(self.media_root) for name in files
+        )
+
+    def test_identical_renders_share_one_sharded_file(self):
+        """Renders are stored under their digest; rendering the same PDF again writes nothing new."""
+        redemption = Redemption(voucher=self.voucher, coupon_code='SAMEBYTES', points_used=1000, quantity=1,
+                                completed_at=timezone.now())
+        with mock.patch.object(premium_pdf.timezone, 'now', return_value=redemption.completed_at):
+            first = premium_pdf.generate_premium_voucher_pdf(redemption)
+            second = premium_pdf.generate_premium_voucher_pdf(redemption)
+        self.assertEqual(first, second)
+        self.assertRegex(first, r'^/media/vouchers/([0-9a-f]{2})/([0-9a-f]{2})/\1\2[0-9a-f]{60}\.pdf$')
+        self.assertEqual(self.stored_files(), [os.path.join('vouchers', pdf_store.name_for_url(first))])
+
+    def test_storage_backend_is_configurable(self):
+        """VOUCHER_PDF_STORAGE sends PDFs to another STORAGES backend."""
+        storages_setting = {
+            **settings.STORAGES,
+            'voucher_pdfs': {
+                'BACKEND': 'django.core.files.storage.InMemoryStorage',
+                'OPTIONS': {'base_url': 'https://pdfs.example.com/'},
+            },
+        }
+        with self.settings(STORAGES=storages_setting, VOUCHER_PDF_STORAGE='voucher_pdfs'):
+            url = pdf_store.save(b'%PDF-1.4 stored elsewhere')
+            self.assertTrue(url.startswith('https://pdfs.example.com/'))
+            self.assertEqual(pdf_store.read(pdf_store.name_for_url(url)), b'%PDF-1.4 stored elsewhere')
+            self.assertEqual(list(pdf_store.stored_names()), [pdf_store.name_for_url(url)])
+        self.assertEqual(self.stored_files(), [])
+
+    def test_serve_reads_stored_pdf(self):
+        redemption = Redemption.objects.create(
+            user=self.user, voucher=self.voucher, points_used=1000, quantity=1, status='completed',
+            pdf_url=pdf_store.save(b'%PDF-1.4 served'),
+        )
+        self.client.force_authenticate(self.user)
+        response = self.client.get(reverse('serve_voucher_pdf', args=[redemption.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b'%PDF-1.4 served')
+        self.assertIn(f'voucher_{redemption.id}.pdf', response['Content-Disposition'])
+
+    def test_migrate_command_moves_flat_files_and_prunes(self):
+        """Old files move into the store, their redemptions follow, and orphans are pruned."""
+        os.makedirs(os.path.join(self.media_root, 'vouchers'))
+        with open(os.path.join(self.media_root, 'vouchers', 'voucher_old.pdf'), 'wb') as f:
+            f.write(b'%PDF-1.4 legacy')
+        redemption = Redemption.objects.create(
+            user=self.user, voucher=self.voucher, points_used=1000, quantity=1, status='completed',
+            pdf_url='/media/vouchers/voucher_old.pdf',
+        )
+        orphan = pdf_store.name_for_url(pdf_store.save(b'%PDF-1.4 orphan'))
+        stale = (timezone.now() - 2 * pdf_store.PRUNE_MIN_AGE).timestamp()
+        os.utime(os.path.join(self.media_root, 'vouchers', orphan), (stale, stale))
+
+        out = StringIO()
+        call_command('migrate_voucher_pdfs', '--prune', stdout=out)
+        redemption.refresh_from_db()
+        self.assertEqual(pdf_store.read(pdf_store.name_for_url(redemption.pdf_url)), b'%PDF-1.4 legacy')
+        self.assertEqual(self.stored_files(), [os.path.join('vouchers', pdf_store.name_for_url(redemption.pdf_url))])
+        self.assertIn('Moved 1 PDF(s), 1 redemption(s) repointed', out.getvalue())
+        self.assertIn('Pruned 1 unreferenced PDF(s)', out.getvalue())
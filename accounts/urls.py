@@ -10,6 +10,8 @@ urlpatterns = [
     
     # Voucher endpoints
     path("vouchers/", views.voucher_list, name="voucher_list"),
+    path("vouchers/batch/", views.voucher_batch, name="voucher_batch"),
+    path("vouchers/facets/", views.voucher_facets, name="voucher_facets"),
     path("vouchers/<int:voucher_id>/", views.voucher_detail, name="voucher_detail"),
     path("categories/", views.category_list, name="category_list"),
     path("promotions/active/", views.active_promotion, name="active_promotion"),
@@ -20,11 +22,13 @@ urlpatterns = [
     # Cart endpoints
     path("cart/", views.cart_detail, name="cart_detail"),
     path("cart/add/", views.add_to_cart, name="add_to_cart"),
+    path("cart/batch/", views.cart_batch, name="cart_batch"),
     path("cart/items/<int:item_id>/", views.update_cart_item, name="update_cart_item"),
     path("cart/items/<int:item_id>/remove/", views.remove_from_cart, name="remove_from_cart"),
     
     # Redemption endpoints
     path("redeem/", views.redeem_voucher, name="redeem_voucher"),
+    path("vouchers/<int:voucher_id>/queue/", views.redemption_queue, name="redemption_queue"),
     path("checkout/", views.checkout_cart, name="checkout_cart"),
     path("redemptions/<str:redemption_id>/pdf/", views.download_voucher_pdf, name="download_voucher_pdf"),
     path("redemptions/<str:redemption_id>/serve/", views.serve_voucher_pdf, name="serve_voucher_pdf"),
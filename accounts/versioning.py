@@ -0,0 +1,72 @@
+"""
+Data version stamps used to invalidate process-local caches.
+
+Each cached dataset has a named stamp row in the database. Writers bump the
+stamp whenever the underlying rows change; readers compare the stamp they
+built their cache from against the current one and rebuild lazily when it
+differs. Stamps are random tokens rather than counters so that a rolled-back
+bump can never be confused with a later, different one.
+
+``get_version`` additionally memoises stamps in the Django cache for
+``DATA_VERSION_CACHE_SECONDS`` (default 2) so HTTP validators (ETags) can
+be checked without a query. ``bump`` drops the memo only from the cache it
+can reach: with the default per-process LocMemCache, other workers keep
+serving their memoised stamp, and so stale ETags and cached pages, for up
+to that many seconds after a change. Configure a shared cache (e.g. Redis
+or Memcached) in ``CACHES`` for changes to show everywhere at once.
+"""
+import uuid
+from datetime import datetime
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from accounts.models import DataVersion
+
+# Voucher, VoucherCategory and Promotion rows
+CATALOG = 'catalog'
+# Promotion rows, their categories, and category names (for the fallback)
+PROMOTIONS = 'promotions'
+# In-process search index (only used when FTS5 is unavailable)
+SEARCH = 'search'
+# RewardTier and TierBenefit rows
+TIERS = 'tiers'
+
+
+class VersionInfo(NamedTuple):
+    """A stamp and the time it was last bumped (None if never)."""
+    stamp: str
+    updated_at: datetime | None
+
+
+def _cache_key(name: str) -> str:
+    return f'dataversion:{name}'
+
+
+def get_stamp(name: str) -> str:
+    """Return the current stamp for ``name`` ('' if it has never been bumped)."""
+    stamp = DataVersion.objects.filter(name=name).values_list('stamp', flat=True).first()
+    return stamp or ''
+
+
+def get_version(name: str) -> VersionInfo:
+    """Return the stamp and bump time for ``name``, memoised in the cache."""
+    key = _cache_key(name)
+    cached = cache.get(key)
+    if cached is not None:
+        return VersionInfo(*cached)
+    row = DataVersion.objects.filter(name=name).values_list('stamp', 'updated_at').first()
+    info = VersionInfo(*row) if row else VersionInfo('', None)
+    cache.set(key, tuple(info), getattr(settings, 'DATA_VERSION_CACHE_SECONDS', 2))
+    return info
+
+
+def bump(name: str) -> str:
+    """Assign a fresh stamp to ``name`` and return it."""
+    stamp = uuid.uuid4().hex
+    DataVersion.objects.update_or_create(name=name, defaults={'stamp': stamp})
+    # Drop the memoised stamp only once the new one is visible to other workers
+    transaction.on_commit(lambda: cache.delete(_cache_key(name)))
+    return stamp
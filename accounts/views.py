@@ -1,93 +1,51 @@
 # Voucher Views
 ###########################
-from datetime import time  # ensure available for helpers below
-from zoneinfo import ZoneInfo
 import os
 
+from accounts import promotions as promotion_engine
+
 # --- Promotion helpers ---
 def _get_active_promotion(tz_name: str | None = None):
     """
-    Return the currently active Promotion instance if any, else None.
-    Fallback: weekday Happy Hour 17:00-19:00 with 30% for Dining/Restaurant if no Promotion objects exist.
+    Return the currently active promotion window if any, else None.
+    Fallback: weekday Happy Hour 17:00-19:00 with 30% for Dining/Restaurant if no Promotion is running.
+    Served from the compiled schedule in accounts.promotions, so no per-call queries.
     """
-    promo_tz_name = tz_name or os.getenv("PROMO_TIMEZONE", "Asia/Singapore")
-    try:
-        tz = ZoneInfo(promo_tz_name)
-    except Exception:
-        tz = ZoneInfo("UTC")
-
-    # Evaluate current time in the configured promotion timezone
-    now = timezone.now().astimezone(tz)
-    weekday = now.weekday()  # Monday=0
-    now_t = now.time()
-
-    # Try DB-configured promotions
     try:
-        promos = Promotion.objects.filter(is_enabled=True)
-        for promo in promos:
-            if weekday not in promo.active_day_indices():
-                continue
-            # Handle simple window (no overnight wrap)
-            if promo.start_time <= now_t <= promo.end_time:
-                return promo
+        return promotion_engine.resolve(tz_name)
     except Exception:
-        pass
-
-    # Fallback built-in Happy Hour if no DB promo
-    # Weekdays 17:00-19:00, 30% off Dining/Restaurant
-    if weekday in [0, 1, 2, 3, 4] and time(17, 0) <= now_t <= time(19, 0):
-        class _FallbackPromo:
-            name = "Happy Hour"
-            description = "Limited-time evening deal"
-            discount_percentage = 30
-            start_time = time(17, 0)
-            end_time = time(19, 0)
-            def active_day_indices(self):
-                return [0,1,2,3,4]
-            def applicable_categories(self):
-                return []
-        return _FallbackPromo()
-    return None
-
-
-def _category_in_promo(voucher, promo) -> bool:
-    """Check if voucher.category is included in promo categories. For fallback, use name match."""
-    try:
-        # Real Promotion with M2M categories
-        if isinstance(promo, Promotion):
-            return promo.applicable_categories.filter(id=voucher.category_id).exists()
-    except Exception:
-        pass
-    # Fallback promo: match by common dining names
-    cat_name = (voucher.category.name or "").lower()
-    return cat_name in ("dining", "restaurant", "restaurants")
+        return None
 
 
-def _effective_points(voucher, tz_name: str | None = None) -> tuple[int, dict]:
-    """Return (points_to_use, meta) with discount applied if promotion active for category."""
-    promo = _get_active_promotion(tz_name)
+def _apply_promotion(points, category_id, promo) -> tuple[int, dict]:
+    """Return (points_to_use, meta) for a voucher priced under an already-resolved promo."""
     if not promo:
-        return voucher.points, {"promotion_active": False}
-    if not _category_in_promo(voucher, promo):
-        return voucher.points, {"promotion_active": False}
+        return points, {"promotion_active": False}
+    if not promo.covers(category_id):
+        return points, {"promotion_active": False}
     try:
         discount_pct = int(getattr(promo, "discount_percentage", 0))
     except Exception:
         discount_pct = 0
     if discount_pct <= 0:
-        return voucher.points, {"promotion_active": False}
-    discounted = max(0, round(voucher.points * (100 - discount_pct) / 100))
-    return int(discounted), {
+        return points, {"promotion_active": False}
+    return promotion_engine.discounted_points(points, discount_pct), {
         "promotion_active": True,
         "promotion_name": getattr(promo, "name", "Promotion"),
         "discount_percentage": discount_pct,
-        "original_points": voucher.points,
+        "original_points": points,
     }
+
+
+def _effective_points(voucher, tz_name: str | None = None) -> tuple[int, dict]:
+    """Return (points_to_use, meta) with discount applied if promotion active for category."""
+    promo = _get_active_promotion(tz_name)
+    return _apply_promotion(voucher.points, voucher.category_id, promo)
 """
 Accounts views for voucher management, cart operations, and redemptions.
 """
 import os
-import requests
+from datetime import datetime, timedelta
 from io import BytesIO
 
 from django.conf import settings
@@ -101,13 +59,27 @@ from google.oauth2 import id_token
 from reportlab.lib.pagesizes import letter
 from reportlab.pdfgen import canvas
 from reportlab.lib.utils import ImageReader
-from reportlab.lib.colors import HexColor, black, white
+from reportlab.lib.colors import black, white
 from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image, HRFlowable
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image
+from reportlab.lib.enums import TA_LEFT, TA_RIGHT
 from reportlab.graphics.shapes import Drawing
 from reportlab.graphics import renderPDF
+from . import versioning
+from . import admission, image_cache, inventory, pdf_theme
+from .catalog import CARD_FIELDS, FieldSelectionError, get_catalog, parse_fields
+from .conditional import conditional_etag, versioned_page_cache
+from .facets import get_facets
+from .idempotency import idempotent, not_stored
+from . import carts as cart_store
+from . import pdf_jobs, pdf_store
+from . import points as points_ledger
+from . import redemption as redemption_service
+from .pagination import (
+    PaginationError, get_page_params, is_paginated, next_link, paginate_queryset,
+    paginate_sequence, paginated_response_data,
+)
+from .search import search_voucher_ids
 from .premium_pdf import generate_premium_voucher_pdf, generate_premium_multi_voucher_pdf
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes, authentication_classes
@@ -138,14 +110,19 @@ def index(request):
     _ = request.method
     return HttpResponse("Hello from Accounts app!")
 
+VOUCHER_DISPLAY_CACHE_SECONDS = 300
+
+
+@versioned_page_cache(versioning.CATALOG, timeout=VOUCHER_DISPLAY_CACHE_SECONDS)
 def voucher_display(request):
     """Simple HTML view to display vouchers"""
-    vouchers = Voucher.objects.filter(is_active=True)
-    categories = VoucherCategory.objects.all()
-
+    # Rendered from the catalog snapshot; the voucher grid is fragment-cached per catalog version
+    snapshot = get_catalog()
     context = {
-        'vouchers': vouchers,
-        'categories': categories,
+        'vouchers': [entry.card for entry in snapshot.entries],
+        'categories': snapshot.categories,
+        'catalog_version': snapshot.stamp,
+        'fragment_timeout': VOUCHER_DISPLAY_CACHE_SECONDS,
     }
     return render(request, 'accounts/voucher_display.html', context)
 
@@ -375,61 +352,108 @@ def get_user_profile(user):
 
 def get_user_cart(user):
     """Get or create cart for the given user."""
-    cart, _ = Cart.objects.get_or_create(user=user)
-    return cart
+    return cart_store.get_cart(user)
 
 def create_notification(user, message):
     """Create a notification for the given user."""
     Notification.objects.create(user=user, message=message)
 
 # Voucher Views
+VOUCHER_PAGE_SIZE = 24
+VOUCHER_BATCH_LIMIT = 50
+CART_BATCH_LIMIT = 100
+
+
+def _catalog_sort_key(entry):
+    return entry.sort_key
+
+
+def _parse_catalog_cursor(values):
+    """Turn a decoded [featured, created_at, id] cursor back into a sort key."""
+    featured, created_at, voucher_id = values
+    return (bool(featured), datetime.fromisoformat(created_at), int(voucher_id))
+
+
+def _stock_key(request):
+    """ETag component for payloads carrying live stock, which the catalog stamp does not track."""
+    _ = request.method
+    return inventory.stock_version()
+
+
+def _overlay_stock(cards, fields) -> None:
+    """Replace the snapshot's stock in ``cards`` with live stock, if the projection includes it."""
+    if 'quantity_available' not in (fields or CARD_FIELDS):
+        return
+    stock = inventory.live_stock(card['id'] for card in cards)
+    for card in cards:
+        card['quantity_available'] = stock.get(card['id'], 0)
+
+
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@conditional_etag(versioning.CATALOG, promotion_aware=True, live_key=_stock_key)
 def voucher_list(request):
-    """Get list of vouchers with optional filtering"""
-    queryset = Voucher.objects.filter(is_active=True)
+    """Get list of vouchers with optional filtering and field selection (?view=card or ?fields=)"""
+    snapshot = get_catalog()
+    entries = snapshot.entries
     category = request.query_params.get('category')
     search = request.query_params.get('search')
+    try:
+        fields = parse_fields(request.query_params.get('view'), request.query_params.get('fields'))
+    except FieldSelectionError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
     if category and category != 'All Vouchers':
-        queryset = queryset.filter(category__name=category)
+        entries = [entry for entry in entries if entry.category_name == category]
 
+    sort_key, parse_cursor = _catalog_sort_key, _parse_catalog_cursor
     if search:
-        queryset = queryset.filter(
-            title__icontains=search
-        ) | queryset.filter(
-            description__icontains=search
-        )
+        # Ranked full-text matches replace the default featured/newest ordering
+        ranked_ids = search_voucher_ids(search)
+        allowed = {entry.id for entry in entries}
+        entries = [snapshot.by_id[voucher_id] for voucher_id in ranked_ids
+                   if voucher_id in allowed]
+        # Ranked results page by rank position
+        rank = {entry.id: position for position, entry in enumerate(entries)}
+
+        def rank_key(entry):
+            return (-rank[entry.id],)
+
+        # Rank keys are plain integers, so cursors need no parsing back
+        sort_key, parse_cursor = rank_key, None
+
+    page = None
+    if is_paginated(request):
+        try:
+            params = get_page_params(request, default_limit=VOUCHER_PAGE_SIZE)
+            page = paginate_sequence(entries, sort_key, params, parse_cursor=parse_cursor)
+        except PaginationError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        entries = page.items
 
-    vouchers = queryset.order_by('-featured', '-created_at')
-    tz_param = request.GET.get('tz')
+    # Only price the vouchers if the projection includes points
+    promo = _get_active_promotion(request.GET.get('tz')) if 'points' in (fields or CARD_FIELDS) else None
 
-    data = []
-    for voucher in vouchers:
-        eff_points, meta = _effective_points(voucher, tz_param)
-        item = {
-            'id': voucher.id,
-            'title': voucher.title,
-            'category': voucher.category.name,
-            'points': eff_points,
-            'original_points': voucher.original_points,
-            'discount': voucher.discount,
-            'rating': voucher.rating,
-            'image_url': voucher.image_url,
-            'description': voucher.description,
-            'terms': voucher.terms,
-            'quantity_available': voucher.quantity_available,
-            'featured': voucher.featured,
-            'created_at': voucher.created_at.isoformat()
-        }
-        if meta.get("promotion_active"):
-            item["promotion_active"] = True
-            item["promotion_name"] = meta.get("promotion_name")
-            item["promotion_discount_percentage"] = meta.get("discount_percentage")
-        data.append(item)
+    data = [_priced_card(entry, fields, promo) for entry in entries]
+    _overlay_stock(data, fields)
 
+    if page is not None:
+        return Response(paginated_response_data(request, page, data))
     return Response(data)
 
+def _priced_card(entry, fields, promo) -> dict:
+    """Project a catalog entry and apply the already-resolved promotion to it."""
+    item = entry.project(fields)
+    if promo is None:
+        return item
+    eff_points, meta = _apply_promotion(entry.points, entry.category_id, promo)
+    item['points'] = eff_points
+    if meta.get("promotion_active"):
+        item["promotion_active"] = True
+        item["promotion_name"] = meta.get("promotion_name")
+        item["promotion_discount_percentage"] = meta.get("discount_percentage")
+    return item
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def voucher_detail(request, voucher_id):
@@ -449,7 +473,9 @@ def voucher_detail(request, voucher_id):
             'image_url': voucher.image_url,
             'description': voucher.description,
             'terms': voucher.terms,
-            'quantity_available': voucher.quantity_available,
+            'quantity_available': (
+                inventory.available(voucher) if inventory.is_sharded(voucher) else voucher.quantity_available
+            ),
             'featured': voucher.featured,
             'created_at': voucher.created_at.isoformat()
         }
@@ -461,12 +487,61 @@ def voucher_detail(request, voucher_id):
     except Voucher.DoesNotExist:
         return Response({'error': 'Voucher not found'}, status=status.HTTP_404_NOT_FOUND)
 
+@api_view(['GET'])
+@permission_classes([AllowAny])
+@conditional_etag(versioning.CATALOG, promotion_aware=True)
+def voucher_facets(request):
+    """Get voucher counts per category, points bucket and featured flag"""
+    category = request.query_params.get('category')
+    if category == 'All Vouchers':
+        category = None
+    promo = _get_active_promotion(request.GET.get('tz'))
+    return Response(get_facets(category, request.query_params.get('search'), promo))
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@conditional_etag(versioning.CATALOG, promotion_aware=True, private=True, live_key=_stock_key)
+def voucher_batch(request):
+    """
+    Get several vouchers by id (?ids=1,2,3) in one request.
+
+    Results follow the order of ``ids``; ids that are unknown or inactive are
+    reported per item instead of failing the whole request.
+    """
+    raw_ids = [part.strip() for part in request.query_params.get('ids', '').split(',') if part.strip()]
+    if not raw_ids:
+        return Response({'error': 'ids is required'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        voucher_ids = list(dict.fromkeys(int(part) for part in raw_ids))
+    except ValueError:
+        return Response({'error': 'ids must be a comma-separated list of integers'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    if len(voucher_ids) > VOUCHER_BATCH_LIMIT:
+        return Response({'error': f'At most {VOUCHER_BATCH_LIMIT} ids per request'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    try:
+        fields = parse_fields(request.query_params.get('view'), request.query_params.get('fields'))
+    except FieldSelectionError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    by_id = get_catalog().by_id
+    promo = _get_active_promotion(request.GET.get('tz')) if 'points' in (fields or CARD_FIELDS) else None
+    results = []
+    for voucher_id in voucher_ids:
+        entry = by_id.get(voucher_id)
+        if entry is None:
+            results.append({'id': voucher_id, 'found': False, 'error': 'Voucher not found'})
+        else:
+            results.append({'id': voucher_id, 'found': True, 'voucher': _priced_card(entry, fields, promo)})
+    _overlay_stock([result['voucher'] for result in results if result['found']], fields)
+    return Response({'results': results})
+
 @api_view(['GET'])
 @permission_classes([AllowAny])  # Allow unauthenticated access for demo
+@conditional_etag(versioning.CATALOG)
 def category_list(request):
     """Get list of voucher categories"""
-    categories = VoucherCategory.objects.all()
-    data = [{'id': cat.id, 'name': cat.name, 'icon': cat.icon} for cat in categories]
+    data = [dict(cat) for cat in get_catalog().categories]
     return Response(data)
 
 
@@ -638,28 +713,11 @@ def user_profile(request):
 def cart_detail(request):
     """Get user's cart"""
     try:
-        cart = get_user_cart(request.user)
-        items = []
-        for item in cart.items.all():
-            items.append({
-                'id': item.id,
-                'voucher': {
-                    'id': item.voucher.id,
-                    'title': item.voucher.title,
-                    'points': item.voucher.points,
-                    'image_url': item.voucher.image_url
-                },
-                'quantity': item.quantity,
-                'added_at': item.added_at.isoformat()
-            })
-
-        return Response({
-            'id': cart.id,
-            'items': items,
-            'total_points': cart.total_points,
-            'created_at': cart.created_at.isoformat(),
-            'updated_at': cart.updated_at.isoformat()
-        })
+        promo = _get_active_promotion(request.GET.get('tz'))
+        return Response(cart_store.read_cart(
+            request.user,
+            price=lambda points, category_id: _apply_promotion(points, category_id, promo)[0],
+        ))
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
@@ -683,15 +741,7 @@ def add_to_cart(request):
             )
 
         cart = get_user_cart(request.user)
-        cart_item, created = CartItem.objects.get_or_create(
-            cart=cart,
-            voucher=voucher,
-            defaults={'quantity': quantity}
-        )
-
-        if not created:
-            cart_item.quantity += quantity
-            cart_item.save()
+        cart_store.add_item(cart, voucher, quantity)
 
         create_notification(request.user, f"Added {voucher.title} to cart")
 
@@ -715,8 +765,7 @@ def update_cart_item(request, item_id):
         return Response({'error': 'Valid quantity is required'}, status=status.HTTP_400_BAD_REQUEST)
 
     try:
-        cart = get_user_cart(request.user)
-        cart_item = CartItem.objects.get(id=item_id, cart=cart)
+        cart_item = CartItem.objects.select_related('voucher').get(id=item_id, cart__user=request.user)
 
         if cart_item.voucher.quantity_available < quantity:
             return Response(
@@ -724,8 +773,7 @@ def update_cart_item(request, item_id):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        cart_item.quantity = quantity
-        cart_item.save()
+        cart_store.set_quantity(cart_item, quantity)
 
         return Response({'message': 'Cart item updated successfully'})
     except CartItem.DoesNotExist:
@@ -739,9 +787,8 @@ def update_cart_item(request, item_id):
 def remove_from_cart(request, item_id):
     """Remove item from cart"""
     try:
-        cart = get_user_cart(request.user)
-        cart_item = CartItem.objects.get(id=item_id, cart=cart)
-        cart_item.delete()
+        cart_item = CartItem.objects.select_related('voucher').get(id=item_id, cart__user=request.user)
+        cart_store.remove_item(cart_item)
         return Response({'message': 'Item removed from cart'})
     except CartItem.DoesNotExist:
         return Response(
@@ -749,179 +796,200 @@ def remove_from_cart(request, item_id):
             status=status.HTTP_404_NOT_FOUND
         )
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@idempotent
+def cart_batch(request):
+    """
+    Apply several cart operations in one atomic request.
+
+    Body: ``{"operations": [{"op": "add" | "set" | "remove", ...}]}``.
+    Returns the resulting cart; if any operation fails nothing is applied
+    and the error names its index.
+    """
+    operations = request.data.get('operations')
+    if isinstance(operations, list) and len(operations) > CART_BATCH_LIMIT:
+        return Response({'error': f'At most {CART_BATCH_LIMIT} operations per request'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    try:
+        added = cart_store.apply_batch(request.user, operations)
+    except cart_store.CartBatchError as e:
+        return Response({'error': e.message, 'index': e.index}, status=status.HTTP_400_BAD_REQUEST)
+
+    if added:
+        create_notification(request.user, f"Added {added} item{'s' if added != 1 else ''} to cart")
+    promo = _get_active_promotion(request.GET.get('tz'))
+    return Response(cart_store.read_cart(
+        request.user,
+        price=lambda points, category_id: _apply_promotion(points, category_id, promo)[0],
+    ))
+
 # Redemption Views
+ADMISSION_TICKET_HEADER = 'Admission-Ticket'
+
+
+@api_view(['GET', 'POST'])
+@permission_classes([IsAuthenticated])
+def redemption_queue(request, voucher_id):
+    """
+    Waiting room for a voucher's redemptions.
+
+    POST takes a place in the queue and returns a ticket; GET with
+    ``?ticket=`` reports its position. Once ``status`` is ``admitted`` the
+    client redeems with the ticket in the ``Admission-Ticket`` header.
+    """
+    if request.method == 'POST':
+        ticket, decision = admission.join(voucher_id, str(request.user.pk))
+    else:
+        ticket = request.query_params.get('ticket', '')
+        if not ticket:
+            return Response({'error': 'ticket is required'}, status=status.HTTP_400_BAD_REQUEST)
+        decision = admission.status(voucher_id, ticket, str(request.user.pk))
+    if decision.status in (admission.SOLD_OUT, admission.EXPIRED, admission.NOT_FOUND):
+        return _admission_refused(decision)
+    response = Response(
+        {'ticket': ticket, 'status': decision.status, 'position': decision.position},
+        status=status.HTTP_201_CREATED if request.method == 'POST' else status.HTTP_200_OK,
+    )
+    if decision.status == admission.WAITING:
+        response['Retry-After'] = str(admission.RETRY_AFTER_SECONDS)
+    return response
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@idempotent
 def redeem_voucher(request):
     """Redeem a single voucher"""
     
     voucher_id = request.data.get('voucher_id')
-    quantity = request.data.get('quantity', 1)
+    try:
+        quantity = int(request.data.get('quantity', 1))
+    except (TypeError, ValueError):
+        quantity = 0
 
     if not voucher_id:
         return Response({'error': 'Voucher ID is required'}, status=status.HTTP_400_BAD_REQUEST)
+    if quantity < 1:
+        return Response({'error': 'Quantity must be a positive integer'}, status=status.HTTP_400_BAD_REQUEST)
 
     try:
-        voucher = Voucher.objects.get(id=voucher_id, is_active=True)
-        # Apply promotion discount to points
-        tz_param = request.GET.get('tz')
-        eff_points, _meta = _effective_points(voucher, tz_param)
-        total_points = eff_points * quantity
-
-        profile = get_user_profile(request.user)
-
-        if profile.points < total_points:
-            return Response(
-                {'error': f'Insufficient points. You need {total_points} points '
-                          f'but have {profile.points}'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+        gate_id = int(voucher_id)
+    except (TypeError, ValueError):
+        gate_id = None
+    if gate_id is not None:
+        # Turn away requests that cannot succeed before touching the database
+        ticket = request.headers.get(ADMISSION_TICKET_HEADER) or request.data.get('ticket')
+        decision = admission.enter(gate_id, quantity, ticket, str(request.user.pk))
+        if not decision.admitted:
+            return _admission_refused(decision)
+        try:
+            return _redeem(request, voucher_id, quantity)
+        finally:
+            admission.leave(gate_id)
+    return _redeem(request, voucher_id, quantity)
 
-        if voucher.quantity_available < quantity:
-            return Response(
-                {'error': 'Insufficient quantity available'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
 
-        with transaction.atomic():
-            # Create redemption
-            redemption = Redemption.objects.create(
-                user=request.user,
-                voucher=voucher,
-                quantity=quantity,
-                points_used=total_points,
-                status='completed'
-            )
+def _admission_refused(decision):
+    """
+    Response for a redemption or ticket the admission gate did not let through.
 
-            # Update user points
-            profile.points -= total_points
-            profile.save()
+    Refusals are not stored under the request's Idempotency-Key: a retry
+    with a fresh ticket, or once the queue has moved, must be decided anew.
+    """
+    if decision.status == admission.NOT_FOUND:
+        # Same response as a redemption of an unknown or inactive voucher
+        return not_stored(Response({'error': 'Voucher not found'}, status=status.HTTP_404_NOT_FOUND))
+    if decision.status == admission.SOLD_OUT:
+        # Same status as a redemption that finds the stock gone
+        return not_stored(Response(
+            {'error': 'Insufficient quantity available', 'admission': decision.status},
+            status=status.HTTP_400_BAD_REQUEST,
+        ))
+    if decision.status == admission.EXPIRED:
+        return not_stored(Response(
+            {'error': 'Admission ticket is invalid or expired; join the queue again', 'admission': decision.status},
+            status=status.HTTP_409_CONFLICT,
+        ))
+    response = not_stored(Response(
+        {'error': 'Too many redemptions in progress; join the queue and retry',
+         'admission': decision.status, 'position': decision.position},
+        status=status.HTTP_429_TOO_MANY_REQUESTS,
+    ))
+    response['Retry-After'] = str(admission.RETRY_AFTER_SECONDS)
+    return response
+
+
+def _redeem(request, voucher_id, quantity):
+    try:
+        voucher = Voucher.objects.get(id=voucher_id, is_active=True)
+    except (Voucher.DoesNotExist, ValueError):
+        return Response(
+            {'error': 'Voucher not found'},
+            status=status.HTTP_404_NOT_FOUND
+        )
 
-            # Update voucher quantity
-            voucher.quantity_available -= quantity
-            voucher.save()
+    # Apply promotion discount to points
+    tz_param = request.GET.get('tz')
+    eff_points, _meta = _effective_points(voucher, tz_param)
+    total_points = eff_points * quantity
+    get_user_profile(request.user)
 
-            # Generate PDF
-            try:
-                pdf_url = generate_voucher_pdf(redemption)
-                redemption.pdf_url = pdf_url
-            except Exception as e:
-                print(f"PDF generation error: {e}")
-                pdf_url = None
-            redemption.completed_at = timezone.now()
-            redemption.save()
-
-            create_notification(
-                request.user,
-                f"Successfully redeemed {voucher.title} for {total_points} points"
-            )
+    with transaction.atomic():
+        # Balance and stock are checked and debited by conditional updates
+        try:
+            redemption = redemption_service.redeem(request.user, voucher, quantity, eff_points)
+        except redemption_service.RedemptionError as e:
+            return Response({'error': e.message}, status=status.HTTP_400_BAD_REQUEST)
 
-            return Response({
-                'message': 'Voucher redeemed successfully',
-                'redemption_id': str(redemption.id),
-                'coupon_code': redemption.coupon_code,
-                'pdf_url': pdf_url,
-                'points_remaining': profile.points
-            }, status=status.HTTP_201_CREATED)
+        # The PDF is rendered by the process_pdf_jobs worker after commit
+        pdf_jobs.enqueue([redemption])
 
-    except Voucher.DoesNotExist:
-        return Response(
-            {'error': 'Voucher not found'},
-            status=status.HTTP_404_NOT_FOUND
+        create_notification(
+            request.user,
+            f"Successfully redeemed {voucher.title} for {total_points} points"
         )
 
+        return Response({
+            'message': 'Voucher redeemed successfully',
+            'redemption_id': str(redemption.id),
+            'coupon_code': redemption.coupon_code,
+            'pdf_url': None,
+            'pdf_status': pdf_jobs.PENDING,
+            'points_remaining': redemption_service.current_points(request.user)
+        }, status=status.HTTP_201_CREATED)
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@idempotent
 def checkout_cart(request):
     """Checkout entire cart"""
     cart = get_user_cart(request.user)
-    cart_items = cart.items.all()
+    cart_items = list(cart.items.select_related('voucher'))
 
-    if not cart_items.exists():
+    if not cart_items:
         return Response(
             {'error': 'Cart is empty'},
             status=status.HTTP_400_BAD_REQUEST
         )
 
     # Apply promotion discount per item
-    total_points = 0
-    tz_param = request.GET.get('tz')
+    promo = _get_active_promotion(request.GET.get('tz'))
+    lines = []
     for item in cart_items:
-        eff_points, _meta = _effective_points(item.voucher, tz_param)
-        total_points += item.quantity * eff_points
-    profile = get_user_profile(request.user)
-
-    if profile.points < total_points:
-        return Response(
-            {'error': f'Insufficient points. You need {total_points} points '
-                     f'but have {profile.points}'},
-            status=status.HTTP_400_BAD_REQUEST
-        )
-
-    # Check availability for all items
-    for item in cart_items:
-        if item.voucher.quantity_available < item.quantity:
-            return Response(
-                {'error': f'Insufficient quantity available for {item.voucher.title}'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-
-    redemptions = []
+        eff_points, _meta = _apply_promotion(item.voucher.points, item.voucher.category_id, promo)
+        lines.append(redemption_service.CheckoutLine(item.voucher, item.quantity, eff_points))
+    total_points = sum(line.unit_points * line.quantity for line in lines)
+    get_user_profile(request.user)
 
     with transaction.atomic():
-        # Create all redemptions first
-        for item in cart_items:
-            # Create redemption
-            redemption = Redemption.objects.create(
-                user=request.user,
-                voucher=item.voucher,
-                quantity=item.quantity,
-                points_used=item.voucher.points * item.quantity,
-                status='completed',
-                completed_at=timezone.now()
-            )
-
-            # Update voucher quantity
-            item.voucher.quantity_available -= item.quantity
-            item.voucher.save()
-
-            redemptions.append(redemption)
+        # Debit points, stock and create redemptions in a fixed number of queries
+        try:
+            redemptions = redemption_service.checkout(request.user, lines)
+        except redemption_service.RedemptionError as e:
+            return Response({'error': e.message}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Generate PDF(s) based on number of items
-        pdf_url = None
-        if len(redemptions) == 1:
-            # Single voucher - generate individual PDF
-            try:
-                print(f"Generating single voucher PDF for: {redemptions[0].voucher.title}")
-                pdf_url = generate_voucher_pdf(redemptions[0])
-                redemptions[0].pdf_url = pdf_url
-                redemptions[0].save()
-                print(f"Single voucher PDF generated successfully: {pdf_url}")
-            except Exception as e:
-                print(f"Single PDF generation error: {e}")
-                import traceback
-                traceback.print_exc()
-                pdf_url = None
-        else:
-            # Multiple vouchers - generate single multi-voucher PDF
-            try:
-                print(f"Generating multi-voucher PDF for {len(redemptions)} vouchers:")
-                for i, redemption in enumerate(redemptions):
-                    print(f"  {i+1}. {redemption.voucher.title} (ID: {redemption.voucher.id})")
-                
-                multi_pdf_url = generate_multi_voucher_pdf(redemptions)
-                print(f"Multi-voucher PDF generated successfully: {multi_pdf_url}")
-                
-                # Set the same PDF URL for all redemptions
-                for redemption in redemptions:
-                    redemption.pdf_url = multi_pdf_url
-                    redemption.save()
-                pdf_url = multi_pdf_url
-            except Exception as e:
-                print(f"Multi-voucher PDF generation error: {e}")
-                import traceback
-                traceback.print_exc()
-                pdf_url = None
+        # One PDF (combined for multi-item carts) is rendered by the worker after commit
+        pdf_jobs.enqueue(redemptions)
 
         # Prepare response data
         redemption_data = []
@@ -930,15 +998,12 @@ def checkout_cart(request):
                 'redemption_id': str(redemption.id),
                 'voucher_title': redemption.voucher.title,
                 'coupon_code': redemption.coupon_code,
-                'pdf_url': redemption.pdf_url
+                'pdf_url': None,
+                'pdf_status': pdf_jobs.PENDING,
             })
 
-        # Update user points
-        profile.points -= total_points
-        profile.save()
-
         # Clear cart
-        cart_items.delete()
+        cart_store.clear(cart)
 
         create_notification(
             request.user,
@@ -949,31 +1014,52 @@ def checkout_cart(request):
             'message': 'Cart checked out successfully',
             'redemptions': redemption_data,
             'total_points_used': total_points,
-            'points_remaining': profile.points,
+            'points_remaining': redemption_service.current_points(request.user),
             'is_multi_voucher': len(redemptions) > 1,
-            'pdf_url': pdf_url
+            'pdf_url': None,
+            'pdf_status': pdf_jobs.PENDING,
         }, status=status.HTTP_201_CREATED)
 
 
 # --- Active promotion endpoint ---
+# Upper bound on how long clients may reuse an active-promotion answer, so
+# admin edits to promotions still reach them reasonably quickly
+PROMOTION_MAX_AGE = 300
+
+
+def _promotion_max_age(request) -> int:
+    """Seconds until the active promotion for ``?tz=`` next changes, capped."""
+    now = timezone.now()
+    next_change = promotion_engine.next_transition(request.GET.get('tz'), now)
+    if next_change is None:
+        return PROMOTION_MAX_AGE
+    return max(0, min(PROMOTION_MAX_AGE, int((next_change - now).total_seconds())))
+
+
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@conditional_etag(versioning.PROMOTIONS, promotion_aware=True, max_age=_promotion_max_age)
 def active_promotion(request):
-    """Expose the currently active promotion window and discount, if any."""
-    promo = _get_active_promotion()
+    """Expose the promotion window and discount active in ``?tz=``, and when that next changes."""
+    tz_name = request.GET.get('tz')
+    now = timezone.now()
+    next_change = promotion_engine.next_transition(tz_name, now)
+    next_change_at = next_change.isoformat() if next_change else None
+    promo = promotion_engine.resolve(tz_name, now)
     if not promo:
-        return Response({"active": False})
-    promo_tz_name = os.getenv("PROMO_TIMEZONE", "Asia/Singapore")
-    try:
-        tz = ZoneInfo(promo_tz_name)
-    except Exception:
-        tz = ZoneInfo("UTC")
-    now = timezone.now().astimezone(tz)
+        return Response({"active": False, "next_change_at": next_change_at})
+    now = now.astimezone(promotion_engine.get_zone(tz_name))
     ends_in_seconds = None
+    ends_at = None
     try:
-        # Compute time remaining today until promo end in configured timezone
+        # Compute time remaining today until promo end in the requested timezone
         end_dt = now.replace(hour=promo.end_time.hour, minute=promo.end_time.minute, second=0, microsecond=0)
+        if promo.start_time > promo.end_time and now.time() >= promo.start_time:
+            # Overnight window: it ends tomorrow
+            end_dt += timedelta(days=1)
         ends_in_seconds = max(0, int((end_dt - now).total_seconds()))
+        # Absolute end, so a revalidated (304) copy still counts down correctly
+        ends_at = end_dt.isoformat()
     except Exception:
         pass
     return Response({
@@ -984,6 +1070,8 @@ def active_promotion(request):
         "start_time": getattr(promo, "start_time", None),
         "end_time": getattr(promo, "end_time", None),
         "ends_in_seconds": ends_in_seconds,
+        "ends_at": ends_at,
+        "next_change_at": next_change_at,
     })
 
 # Notification Views
@@ -992,7 +1080,13 @@ def active_promotion(request):
 def notification_list(request):
     """Get user notifications"""
     try:
-        notifications = Notification.objects.filter(user=request.user).order_by('-created_at')
+        notifications = Notification.objects.filter(user=request.user)
+        page = None
+        if is_paginated(request):
+            page = paginate_queryset(notifications, ('-created_at', '-id'), get_page_params(request))
+            notifications = page.items
+        else:
+            notifications = notifications.order_by('-created_at')
         data = []
         for notification in notifications:
             data.append({
@@ -1001,7 +1095,11 @@ def notification_list(request):
                 'read': notification.read,
                 'created_at': notification.created_at.isoformat()
             })
+        if page is not None:
+            return Response(paginated_response_data(request, page, data))
         return Response(data)
+    except PaginationError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
@@ -1052,95 +1150,26 @@ def generate_voucher_pdf_platypus(redemption):
         buffer = BytesIO()
         doc = SimpleDocTemplate(buffer, pagesize=letter, 
                               rightMargin=72, leftMargin=72, 
-                              topMargin=72, bottomMargin=18)
-        
-        # Define custom styles
-        styles = getSampleStyleSheet()
-        
-        # Custom styles for professional look
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=28,
-            spaceAfter=30,
-            alignment=TA_CENTER,
-            textColor=HexColor('#2E86AB'),
-            fontName='Helvetica-Bold'
-        )
-        
-        voucher_title_style = ParagraphStyle(
-            'VoucherTitle',
-            parent=styles['Heading2'],
-            fontSize=20,
-            spaceAfter=20,
-            alignment=TA_CENTER,
-            textColor=HexColor('#A23B72'),
-            fontName='Helvetica-Bold'
-        )
-        
-        coupon_style = ParagraphStyle(
-            'CouponCode',
-            parent=styles['Normal'],
-            fontSize=16,
-            spaceAfter=15,
-            alignment=TA_CENTER,
-            textColor=HexColor('#F18F01'),
-            fontName='Helvetica-Bold',
-            backColor=HexColor('#FFF8E1'),
-            borderWidth=2,
-            borderColor=HexColor('#F18F01'),
-            borderPadding=10
-        )
-        
-        section_style = ParagraphStyle(
-            'Section',
-            parent=styles['Heading3'],
-            fontSize=14,
-            spaceAfter=10,
-            spaceBefore=15,
-            textColor=HexColor('#2E86AB'),
-            fontName='Helvetica-Bold'
-        )
+                              topMargin=72, bottomMargin=18, invariant=1)
         
-        detail_style = ParagraphStyle(
-            'Detail',
-            parent=styles['Normal'],
-            fontSize=11,
-            spaceAfter=5,
-            textColor=HexColor('#333333'),
-            fontName='Helvetica'
-        )
+        # Shared styles and fixed flowables, built once per process
+        theme = pdf_theme.get('classic')
+        styles = theme.styles
         
-        terms_style = ParagraphStyle(
-            'Terms',
-            parent=styles['Normal'],
-            fontSize=9,
-            spaceAfter=5,
-            textColor=HexColor('#666666'),
-            fontName='Helvetica',
-            leftIndent=20
-        )
-
         # Build the story (content)
         story = []
         
         # Header with company branding
-        story.append(Paragraph("OPTIMA REWARDS", title_style))
-        story.append(Spacer(1, 20))
+        story.extend(theme.static('header'))
         
         # Voucher Image (if available)
         if redemption.voucher.image_url:
             try:
-                print(f"Attempting to load image from URL: {redemption.voucher.image_url}")
-                response = requests.get(redemption.voucher.image_url, timeout=10)
-                print(f"Image response status: {response.status_code}")
+                image_path = image_cache.get(redemption.voucher.image_url)
                 
-                if response.status_code == 200:
-                    print(f"Image downloaded successfully, size: {len(response.content)} bytes")
-                    
+                if image_path:
                     # Use ImageReader for better compatibility
-                    img_buffer = BytesIO(response.content)
-                    img_reader = ImageReader(img_buffer)
+                    img_reader = ImageReader(image_path)
                     
                     # Get original dimensions
                     img_width, img_height = img_reader.getSize()
@@ -1155,13 +1184,11 @@ def generate_voucher_pdf_platypus(redemption):
                         print(f"Scaled image dimensions: {img_width} x {img_height}")
                     
                     # Create Image object with proper sizing
-                    img = Image(img_buffer, width=img_width, height=img_height)
+                    img = Image(image_path, width=img_width, height=img_height)
                     img.hAlign = 'CENTER'
                     story.append(img)
                     story.append(Spacer(1, 20))
                     print("Image added to PDF successfully")
-                else:
-                    print(f"Failed to download image, status code: {response.status_code}")
                     
             except Exception as img_error:
                 print(f"Error loading voucher image: {img_error}")
@@ -1171,15 +1198,15 @@ def generate_voucher_pdf_platypus(redemption):
             print("No image URL found for voucher")
         
         # Voucher Title
-        story.append(Paragraph(redemption.voucher.title, voucher_title_style))
+        story.append(Paragraph(redemption.voucher.title, styles['voucher_title']))
         
         # Coupon Code in highlighted box
         coupon_text = f"<b>COUPON CODE: {redemption.coupon_code}</b>"
-        story.append(Paragraph(coupon_text, coupon_style))
+        story.append(Paragraph(coupon_text, styles['coupon']))
         story.append(Spacer(1, 20))
         
         # Redemption Details Section
-        story.append(Paragraph("REDEMPTION DETAILS", section_style))
+        story.extend(theme.static('details_heading'))
         
         redeemed_time = redemption.completed_at or timezone.now()
         details_text = f"""
@@ -1188,45 +1215,30 @@ def generate_voucher_pdf_platypus(redemption):
         <b>Redeemed On:</b> {redeemed_time.strftime('%B %d, %Y at %I:%M %p')}<br/>
         <b>Status:</b> <font color="green">ACTIVE</font>
         """
-        story.append(Paragraph(details_text, detail_style))
+        story.append(Paragraph(details_text, styles['detail']))
         story.append(Spacer(1, 20))
         
         # Description Section
-        story.append(Paragraph("DESCRIPTION", section_style))
+        story.extend(theme.static('description_heading'))
         description_text = redemption.voucher.description.replace('\n', '<br/>')
-        story.append(Paragraph(description_text, detail_style))
+        story.append(Paragraph(description_text, styles['detail']))
         story.append(Spacer(1, 20))
         
         # Terms and Conditions Section
-        story.append(Paragraph("TERMS AND CONDITIONS", section_style))
+        story.extend(theme.static('terms_heading'))
         terms_text = redemption.voucher.terms.replace('\n', '<br/>')
-        story.append(Paragraph(terms_text, terms_style))
+        story.append(Paragraph(terms_text, styles['terms']))
         story.append(Spacer(1, 30))
         
         # Footer
-        footer_text = """
-        <para align="center" fontSize="8" textColor="#999999">
-        This voucher is valid until redeemed. Please present this voucher at the time of purchase.<br/>
-        For customer support, contact us at support@optima.com or call 1-800-OPTIMA-1
-        </para>
-        """
-        story.append(Paragraph(footer_text, styles['Normal']))
+        story.extend(theme.static('footer'))
         
         # Build PDF
         doc.build(story)
         buffer.seek(0)
 
-        # Save PDF to media directory
-        filename = f"voucher_{redemption.id}.pdf"
-        vouchers_dir = os.path.join(settings.MEDIA_ROOT, 'vouchers')
-        os.makedirs(vouchers_dir, exist_ok=True)
-        filepath = os.path.join(vouchers_dir, filename)
-
-        with open(filepath, 'wb') as f:
-            f.write(buffer.getvalue())
-
-        # Return relative URL that works with Django's media serving
-        return f"{settings.MEDIA_URL}vouchers/{filename}"
+        # Stored by content; identical renders share one file
+        return pdf_store.save(buffer.getvalue())
         
     except Exception as e:
         print(f"Platypus PDF generation error: {e}")
@@ -1236,7 +1248,7 @@ def generate_voucher_pdf_canvas(redemption):
     """Generate PDF using canvas method (fallback)"""
     try:
         buffer = BytesIO()
-        p = canvas.Canvas(buffer, pagesize=letter)
+        p = canvas.Canvas(buffer, pagesize=letter, invariant=1)
         width, height = letter
 
         # Title
@@ -1247,14 +1259,10 @@ def generate_voucher_pdf_canvas(redemption):
         image_height = 0
         if redemption.voucher.image_url:
             try:
-                print(f"Canvas: Attempting to load image from URL: {redemption.voucher.image_url}")
-                response = requests.get(redemption.voucher.image_url, timeout=10)
-                print(f"Canvas: Image response status: {response.status_code}")
+                image_path = image_cache.get(redemption.voucher.image_url)
                 
-                if response.status_code == 200:
-                    print(f"Canvas: Image downloaded successfully, size: {len(response.content)} bytes")
-                    img_buffer = BytesIO(response.content)
-                    img = ImageReader(img_buffer)
+                if image_path:
+                    img = ImageReader(image_path)
                     
                     # Calculate image dimensions (max width 200px, maintain aspect ratio)
                     img_width, img_height = img.getSize()
@@ -1272,8 +1280,6 @@ def generate_voucher_pdf_canvas(redemption):
                     p.drawImage(img, x_pos, height - 150 - img_height, width=img_width, height=img_height)
                     image_height = img_height + 20  # Add some spacing
                     print("Canvas: Image added to PDF successfully")
-                else:
-                    print(f"Canvas: Failed to download image, status code: {response.status_code}")
                     
             except Exception as img_error:
                 print(f"Canvas: Error loading voucher image: {img_error}")
@@ -1321,17 +1327,8 @@ def generate_voucher_pdf_canvas(redemption):
 
         buffer.seek(0)
 
-        # Save PDF to media directory
-        filename = f"voucher_{redemption.id}.pdf"
-        vouchers_dir = os.path.join(settings.MEDIA_ROOT, 'vouchers')
-        os.makedirs(vouchers_dir, exist_ok=True)
-        filepath = os.path.join(vouchers_dir, filename)
-
-        with open(filepath, 'wb') as f:
-            f.write(buffer.getvalue())
-
-        # Return relative URL that works with Django's media serving
-        return f"{settings.MEDIA_URL}vouchers/{filename}"
+        # Stored by content; identical renders share one file
+        return pdf_store.save(buffer.getvalue())
         
     except Exception as e:
         print(f"Canvas PDF generation error: {e}")
@@ -1344,53 +1341,17 @@ def generate_multi_voucher_pdf_platypus(redemptions):
         buffer = BytesIO()
         doc = SimpleDocTemplate(buffer, pagesize=letter, 
                               rightMargin=72, leftMargin=72, 
-                              topMargin=72, bottomMargin=18)
-        
-        # Define custom styles
-        styles = getSampleStyleSheet()
-        
-        # Custom styles for professional look
-        title_style = ParagraphStyle(
-            'MultiTitle',
-            parent=styles['Heading1'],
-            fontSize=28,
-            spaceAfter=30,
-            alignment=TA_CENTER,
-            textColor=HexColor('#2E86AB'),
-            fontName='Helvetica-Bold'
-        )
+                              topMargin=72, bottomMargin=18, invariant=1)
         
-        voucher_title_style = ParagraphStyle(
-            'VoucherTitle',
-            parent=styles['Heading2'],
-            fontSize=18,
-            spaceAfter=15,
-            alignment=TA_CENTER,
-            textColor=HexColor('#A23B72'),
-            fontName='Helvetica-Bold'
-        )
-        
-        coupon_style = ParagraphStyle(
-            'CouponCode',
-            parent=styles['Normal'],
-            fontSize=14,
-            spaceAfter=10,
-            alignment=TA_CENTER,
-            textColor=HexColor('#F18F01'),
-            fontName='Helvetica-Bold',
-            borderWidth=2,
-            borderColor=HexColor('#F18F01'),
-            borderPadding=8,
-            backColor=HexColor('#FFF8E7')
-        )
+        # Shared styles and fixed flowables, built once per process
+        theme = pdf_theme.get('classic_collection')
+        styles = theme.styles
         
         # Build the story (content)
         story = []
         
         # Main title
-        story.append(Paragraph("OPTIMA REWARDS", title_style))
-        story.append(Paragraph("Your Voucher Collection", styles['Heading2']))
-        story.append(Spacer(1, 20))
+        story.extend(theme.static('header'))
         
         # Add each voucher
         for i, redemption in enumerate(redemptions, 1):
@@ -1399,17 +1360,15 @@ def generate_multi_voucher_pdf_platypus(redemptions):
                 
                 # Voucher separator (except for first one)
                 if i > 1:
-                    story.append(Spacer(1, 20))
-                    story.append(HRFlowable(width="100%", thickness=2, color=HexColor('#E0E0E0')))
-                    story.append(Spacer(1, 20))
+                    story.extend(theme.static('separator'))
                 
                 # Voucher title - handle None values
                 voucher_title = redemption.voucher.title or f"Voucher {i}"
-                story.append(Paragraph(f"Voucher {i}: {voucher_title}", voucher_title_style))
+                story.append(Paragraph(f"Voucher {i}: {voucher_title}", styles['voucher_title']))
                 
                 # Coupon code - handle None values
                 coupon_code = redemption.coupon_code or "N/A"
-                story.append(Paragraph(f"Coupon Code: {coupon_code}", coupon_style))
+                story.append(Paragraph(f"Coupon Code: {coupon_code}", styles['coupon']))
                 
                 # Voucher details
                 details = [
@@ -1419,59 +1378,43 @@ def generate_multi_voucher_pdf_platypus(redemptions):
                 ]
                 
                 for detail in details:
-                    story.append(Paragraph(detail, styles['Normal']))
+                    story.append(Paragraph(detail, styles['normal']))
                     story.append(Spacer(1, 8))
                 
                 # Description - handle None values
                 if redemption.voucher.description:
-                    story.append(Paragraph("Description:", styles['Heading3']))
+                    story.extend(theme.static('description_heading'))
                     description_text = redemption.voucher.description.replace('\n', '<br/>')
-                    story.append(Paragraph(description_text, styles['Normal']))
+                    story.append(Paragraph(description_text, styles['normal']))
                     story.append(Spacer(1, 12))
                 
                 # Terms (condensed for multi-voucher) - handle None values
                 if redemption.voucher.terms:
-                    story.append(Paragraph("Terms:", styles['Heading4']))
+                    story.extend(theme.static('terms_heading'))
                     terms_text = redemption.voucher.terms.replace('\n', '<br/>')
                     # Limit terms length for multi-voucher PDF
                     if len(terms_text) > 200:
                         terms_text = terms_text[:200] + "..."
-                    story.append(Paragraph(terms_text, styles['Normal']))
+                    story.append(Paragraph(terms_text, styles['normal']))
                 
                 print(f"Successfully processed voucher {i}")
                 
             except Exception as e:
                 print(f"Error processing voucher {i}: {e}")
                 # Add a fallback entry for this voucher
-                story.append(Paragraph(f"Voucher {i}: {redemption.voucher.title or 'Unknown'}", voucher_title_style))
-                story.append(Paragraph(f"Error processing this voucher: {str(e)}", styles['Normal']))
+                story.append(Paragraph(f"Voucher {i}: {redemption.voucher.title or 'Unknown'}", styles['voucher_title']))
+                story.append(Paragraph(f"Error processing this voucher: {str(e)}", styles['normal']))
                 continue
         
         # Footer
-        story.append(Spacer(1, 30))
-        story.append(HRFlowable(width="100%", thickness=1, color=HexColor('#CCCCCC')))
-        story.append(Paragraph("Thank you for choosing Optima Rewards!", 
-                              ParagraphStyle('Footer', parent=styles['Normal'], 
-                                           alignment=TA_CENTER, fontSize=10)))
+        story.extend(theme.static('footer'))
         
         # Build PDF
         doc.build(story)
         buffer.seek(0)
         
-        # Save PDF to media directory
-        # Use first redemption ID for filename, but indicate it's multi-voucher
-        first_redemption = redemptions[0]
-        filename = f"multi_vouchers_{first_redemption.id}_{len(redemptions)}_items.pdf"
-        vouchers_dir = os.path.join(settings.MEDIA_ROOT, 'vouchers')
-        os.makedirs(vouchers_dir, exist_ok=True)
-        filepath = os.path.join(vouchers_dir, filename)
-        print(f"Generating multi-voucher PDF: {filepath}")
-
-        with open(filepath, 'wb') as f:
-            f.write(buffer.getvalue())
-
-        # Return relative URL that works with Django's media serving
-        return f"{settings.MEDIA_URL}vouchers/{filename}"
+        # Stored by content; identical renders share one file
+        return pdf_store.save(buffer.getvalue())
         
     except Exception as e:
         print(f"Multi-voucher Platypus PDF generation error: {e}")
@@ -1481,7 +1424,7 @@ def generate_multi_voucher_pdf_canvas(redemptions):
     """Generate a single PDF containing all purchased vouchers using canvas (fallback)"""
     try:
         buffer = BytesIO()
-        p = canvas.Canvas(buffer, pagesize=letter)
+        p = canvas.Canvas(buffer, pagesize=letter, invariant=1)
         width, height = letter
         
         y_position = height - 50
@@ -1558,18 +1501,8 @@ def generate_multi_voucher_pdf_canvas(redemptions):
         
         buffer.seek(0)
         
-        # Save PDF to media directory
-        first_redemption = redemptions[0]
-        filename = f"multi_vouchers_{first_redemption.id}_{len(redemptions)}_items.pdf"
-        vouchers_dir = os.path.join(settings.MEDIA_ROOT, 'vouchers')
-        os.makedirs(vouchers_dir, exist_ok=True)
-        filepath = os.path.join(vouchers_dir, filename)
-
-        with open(filepath, 'wb') as f:
-            f.write(buffer.getvalue())
-
-        # Return relative URL that works with Django's media serving
-        return f"{settings.MEDIA_URL}vouchers/{filename}"
+        # Stored by content; identical renders share one file
+        return pdf_store.save(buffer.getvalue())
         
     except Exception as e:
         print(f"Multi-voucher Canvas PDF generation error: {e}")
@@ -1578,30 +1511,23 @@ def generate_multi_voucher_pdf_canvas(redemptions):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def download_voucher_pdf(request, redemption_id):
-    """Download voucher PDF"""
+    """Report whether a voucher PDF is ready, and its URL once it is"""
     try:
         redemption = Redemption.objects.get(id=redemption_id, user=request.user)
-        
-        # If PDF URL doesn't exist, try to generate it
-        if not redemption.pdf_url:
-            pdf_url = generate_voucher_pdf(redemption)
-            if pdf_url:
-                redemption.pdf_url = pdf_url
-                redemption.save()
-            else:
-                return Response(
-                    {'error': 'PDF generation failed'},
-                    status=status.HTTP_500_INTERNAL_SERVER_ERROR
-                )
-
-        # Return PDF URL for frontend to download
-        return Response({'pdf_url': redemption.pdf_url})
     except Redemption.DoesNotExist:
         return Response(
             {'error': 'Redemption not found'},
             status=status.HTTP_404_NOT_FOUND
         )
 
+    data = pdf_jobs.pdf_status(redemption)
+    if data['pdf_status'] == pdf_jobs.READY:
+        return Response(data)
+    if data['pdf_status'] == pdf_jobs.FAILED:
+        return Response({'error': 'PDF generation failed', **data},
+                        status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    return Response(data, status=status.HTTP_202_ACCEPTED)
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def serve_voucher_pdf(request, redemption_id):
@@ -1609,16 +1535,14 @@ def serve_voucher_pdf(request, redemption_id):
     try:
         redemption = Redemption.objects.get(id=redemption_id, user=request.user)
         
-        # Generate PDF if it doesn't exist
-        if not redemption.pdf_url:
-            pdf_url = generate_voucher_pdf(redemption)
-            if not pdf_url:
-                return Response(
-                    {'error': 'PDF generation failed'},
-                    status=status.HTTP_500_INTERNAL_SERVER_ERROR
-                )
-            redemption.pdf_url = pdf_url
-            redemption.save()
+        # Rendering happens in the PDF worker; report progress until it is ready
+        data = pdf_jobs.pdf_status(redemption)
+        if data['pdf_status'] == pdf_jobs.FAILED:
+            return Response({'error': 'PDF generation failed', **data},
+                            status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        if data['pdf_status'] == pdf_jobs.PENDING:
+            return Response(data, status=status.HTTP_202_ACCEPTED)
+        redemption.pdf_url = data['pdf_url']
         
         # Get the file path from the PDF URL
         if not redemption.pdf_url:
@@ -1627,31 +1551,43 @@ def serve_voucher_pdf(request, redemption_id):
                 status=status.HTTP_404_NOT_FOUND
             )
         
-        # Extract filename from PDF URL
+        # Content-addressed PDFs are read through the PDF store
         pdf_url = redemption.pdf_url
-        if pdf_url.startswith(settings.MEDIA_URL):
-            # Remove MEDIA_URL prefix to get relative path
-            relative_path = pdf_url[len(settings.MEDIA_URL):]
-            filepath = os.path.join(settings.MEDIA_ROOT, relative_path)
-        else:
-            # Fallback to old naming pattern
+        name = pdf_store.name_for_url(pdf_url)
+        if name is not None:
+            content = pdf_store.read(name)
+            if content is None:
+                return Response(
+                    {'error': f'PDF file not found: {name}'},
+                    status=status.HTTP_404_NOT_FOUND
+                )
             filename = f"voucher_{redemption.id}.pdf"
-            filepath = os.path.join(settings.MEDIA_ROOT, 'vouchers', filename)
-        
-        if not os.path.exists(filepath):
-            return Response(
-                {'error': f'PDF file not found at {filepath}'},
-                status=status.HTTP_404_NOT_FOUND
-            )
-        
-        # Extract filename for download
-        filename = os.path.basename(filepath)
-        
+        else:
+            # PDFs from before the store, until migrate_voucher_pdfs moves them
+            if pdf_url.startswith(settings.MEDIA_URL):
+                # Remove MEDIA_URL prefix to get relative path
+                relative_path = pdf_url[len(settings.MEDIA_URL):]
+                filepath = os.path.join(settings.MEDIA_ROOT, relative_path)
+            else:
+                # Fallback to old naming pattern
+                filename = f"voucher_{redemption.id}.pdf"
+                filepath = os.path.join(settings.MEDIA_ROOT, 'vouchers', filename)
+
+            if not os.path.exists(filepath):
+                return Response(
+                    {'error': f'PDF file not found at {filepath}'},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+
+            # Extract filename for download
+            filename = os.path.basename(filepath)
+            with open(filepath, 'rb') as f:
+                content = f.read()
+
         # Serve the file
-        with open(filepath, 'rb') as f:
-            response = HttpResponse(f.read(), content_type='application/pdf')
-            response['Content-Disposition'] = f'attachment; filename="{filename}"'
-            return response
+        response = HttpResponse(content, content_type='application/pdf')
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
             
     except Redemption.DoesNotExist:
         return Response(
@@ -1705,6 +1641,7 @@ def get_user_tier_info(request):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@conditional_etag(versioning.TIERS, private=True)
 def get_all_tiers(request):
     """Get all available reward tiers."""
     try:
@@ -1742,9 +1679,16 @@ def get_tier_benefits(request, tier_id):
 def get_user_activities(request):
     """Get user's tier activities."""
     try:
-        activities = TierActivity.objects.filter(user=request.user).order_by('-created_at')[:20]
+        activities = TierActivity.objects.filter(user=request.user)
+        if is_paginated(request):
+            page = paginate_queryset(activities, ('-created_at', '-id'), get_page_params(request))
+            serializer = TierActivitySerializer(page.items, many=True)
+            return Response(paginated_response_data(request, page, serializer.data), status=status.HTTP_200_OK)
+        activities = activities.order_by('-created_at')[:20]
         serializer = TierActivitySerializer(activities, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
+    except PaginationError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         return Response(
             {'error': f'Failed to get activities: {str(e)}'},
@@ -1837,7 +1781,6 @@ def get_realtime_analytics(request):
     """Get real-time analytics data for the login page chart with enhanced real-time features."""
     try:
         from django.utils import timezone
-        from datetime import timedelta
         import random
         
         # Get current time and calculate time ranges
@@ -1937,7 +1880,6 @@ def get_live_user_count(request):
     """Get live user count for real-time updates with enhanced metrics."""
     try:
         from django.utils import timezone
-        from datetime import timedelta
         import random
         
         now = timezone.now()
@@ -2023,6 +1965,7 @@ def get_mini_games(request):
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@idempotent
 def submit_game_score(request):
     """Submit game score and award points"""
     try:
@@ -2126,12 +2069,11 @@ def submit_game_score(request):
         )
         
         # Award points to user profile
-        profile, _ = UserProfile.objects.get_or_create(
+        UserProfile.objects.get_or_create(
             user=request.user,
             defaults={'points': 10000}
         )
-        profile.points += points_earned
-        profile.save()
+        points_ledger.credit(request.user, points_earned, points_ledger.GAME, game_session.id)
         
         # Create tier activity
         TierActivity.objects.create(
@@ -2147,7 +2089,7 @@ def submit_game_score(request):
         return Response({
             'success': True,
             'points_earned': points_earned,
-            'total_points': profile.points,
+            'total_points': points_ledger.balance(request.user),
             'game_session_id': game_session.id,
             'cooldown_seconds': cfg['cooldown_seconds'],
             'daily_points_used': today_points + points_earned,
@@ -2166,9 +2108,10 @@ def submit_game_score(request):
 def get_user_game_history(request):
     """Get user's game history"""
     try:
-        sessions = GameSession.objects.filter(user=request.user).order_by('-played_at')[:20]
+        sessions = GameSession.objects.filter(user=request.user).select_related('game')
+        page = paginate_queryset(sessions, ('-played_at', '-id'), get_page_params(request))
         history = []
-        for session in sessions:
+        for session in page.items:
             history.append({
                 'id': session.id,
                 'game_name': session.game.name,
@@ -2178,7 +2121,9 @@ def get_user_game_history(request):
                 'played_at': session.played_at.isoformat(),
                 'duration_seconds': session.duration_seconds
             })
-        return Response({'history': history})
+        return Response({'history': history, 'next': next_link(request, page)})
+    except PaginationError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         return Response(
             {'error': f'Failed to get game history: {str(e)}'},
@@ -15,6 +15,7 @@ import os
 from pathlib import Path
 from dotenv import load_dotenv
 import environ
+from corsheaders.defaults import default_headers
 
 # Initialize environment variables
 env = environ.Env()  # type: ignore
@@ -196,6 +197,10 @@ CORS_ALLOW_ALL_ORIGINS = os.getenv("CORS_ALLOW_ALL_ORIGINS", "True") == "True"
 CORS_ALLOW_CREDENTIALS = True
 CORS_ALLOWED_ORIGINS = [o for o in os.getenv("CORS_ALLOWED_ORIGINS", "").split(",") if o]
 CSRF_TRUSTED_ORIGINS = [o for o in os.getenv("CSRF_TRUSTED_ORIGINS", "").split(",") if o]
+# Let browsers send Idempotency-Key on retried redemptions and score submissions,
+# and Admission-Ticket on redemptions admitted through a voucher's waiting room
+CORS_ALLOW_HEADERS = (*default_headers, "idempotency-key", "admission-ticket")
+CORS_EXPOSE_HEADERS = ["Idempotent-Replayed", "Retry-After"]
 
 # For production, specify allowed origins instead:
 # CORS_ALLOWED_ORIGINS = [
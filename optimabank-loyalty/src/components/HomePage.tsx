@@ -565,7 +565,7 @@ const HomePage: React.FC<HomePageProps> = ({ onShowSnackbar, onLogout }) => {
       const result = await redemptionApi.checkoutCart();
       
       // Handle PDF download based on whether it's single or multiple vouchers
-      if (result.is_multi_voucher && result.pdf_url && result.redemptions && result.redemptions.length > 0) {
+      if (result.is_multi_voucher && result.redemptions && result.redemptions.length > 0) {
         // Multiple vouchers - download the single combined PDF
         const filename = `Multi_Voucher_Redemption_${new Date().toISOString().split('T')[0]}.pdf`;
         try {
@@ -22,7 +22,7 @@ import {
   Timer as TimerIcon
 } from '@mui/icons-material';
 import { useTimezone } from '../contexts/TimezoneContext';
-import { promotionsApi, ActivePromotion } from '../services/api';
+import { promotionsApi, ActivePromotion, secondsUntilPromotionEnds } from '../services/api';
 
 interface TimezonePromotionsProps {
   variant?: 'compact' | 'expanded';
@@ -47,7 +47,7 @@ const TimezonePromotions: React.FC<TimezonePromotionsProps> = ({ variant = 'comp
         const promo = await promotionsApi.getActive();
         if (mounted) {
           setBackendPromotion(promo);
-          setEndsIn(promo?.active ? (promo.ends_in_seconds ?? null) : null);
+          setEndsIn(promo?.active ? secondsUntilPromotionEnds(promo) : null);
         }
       } catch (e) {
         // ignore fetch errors and keep UI graceful
@@ -20,7 +20,7 @@ import {
 } from '@mui/icons-material';
 import { getUserTimezone } from '../utils/timezone';
 import { useTimezone } from '../contexts/TimezoneContext';
-import { promotionsApi, ActivePromotion } from '../services/api';
+import { promotionsApi, ActivePromotion, secondsUntilPromotionEnds } from '../services/api';
 
 interface TimezoneSelectorProps {
   variant?: 'icon' | 'button' | 'chip';
@@ -135,8 +135,9 @@ const TimezoneSelector: React.FC<TimezoneSelectorProps> = ({
         // Initialize countdowns
         const cd: Record<string, number> = {};
         Object.entries(map).forEach(([tz, ap]) => {
-          if (ap.active && typeof ap.ends_in_seconds === 'number') {
-            cd[tz] = ap.ends_in_seconds;
+          const remaining = ap.active ? secondsUntilPromotionEnds(ap) : null;
+          if (remaining !== null) {
+            cd[tz] = remaining;
           }
         });
         if (!cancelled) setCountdowns(cd);
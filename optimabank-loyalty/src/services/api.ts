@@ -15,12 +15,13 @@ export const gamesApi = {
     return data.games;
   },
 
-  submitScore: async (gameId: number, score: number, durationSeconds: number): Promise<GameScoreResult> => {
+  submitScore: async (gameId: number, score: number, durationSeconds: number, idempotencyKey: string = newIdempotencyKey()): Promise<GameScoreResult> => {
     const response = await fetch(`${API_BASE_URL}/accounts/games/submit-score/`, {
       method: 'POST',
       headers: {
         ...getAuthHeaders(),
         'Content-Type': 'application/json',
+        'Idempotency-Key': idempotencyKey,
       },
       body: JSON.stringify({
         game_id: gameId,
@@ -168,6 +169,30 @@ export interface Voucher {
   created_at: string;
 }
 
+export interface VoucherBatchItem {
+  id: number;
+  found: boolean;
+  voucher?: Voucher;
+  error?: string;
+}
+
+export interface FacetCount {
+  id?: number;
+  key?: string;
+  name?: string;
+  min?: number;
+  max?: number | null;
+  count: number;
+}
+
+export interface VoucherFacets {
+  total: number;
+  categories: FacetCount[];
+  points: FacetCount[];
+  featured: { featured: number; standard: number };
+  promotion: string | null;
+}
+
 export interface VoucherCategory {
   id: number;
   name: string;
@@ -192,6 +217,7 @@ export interface CartItem {
     id: number;
     title: string;
     points: number;
+    effective_points?: number; // after the active promotion, if any
     image_url: string;
   };
   quantity: number;
@@ -201,17 +227,35 @@ export interface CartItem {
 export interface Cart {
   id: number;
   items: CartItem[];
+  item_count?: number;
   total_points: number;
+  effective_total_points?: number;
   created_at: string;
 }
 
+export type CartOperation =
+  | { op: 'add'; voucher_id: number; quantity?: number }
+  | { op: 'set'; voucher_id?: number; item_id?: number; quantity: number }
+  | { op: 'remove'; voucher_id?: number; item_id?: number };
+
 // Redemption interfaces
+// PDFs are rendered by a background worker after the redemption commits
+export type PdfStatus = 'pending' | 'ready' | 'failed';
+
 export interface Redemption {
   id: string;
   redemption_id?: string; // For cart checkout responses
   voucher_title: string;
   coupon_code: string;
-  pdf_url: string;
+  pdf_url: string | null;
+  pdf_status?: PdfStatus;
+}
+
+// Waiting room for redemptions of a busy voucher
+export interface AdmissionTicket {
+  ticket: string;
+  status: 'admitted' | 'waiting';
+  position: number;
 }
 
 export interface RedemptionResponse {
@@ -219,7 +263,8 @@ export interface RedemptionResponse {
   id?: string;
   redemption_id?: string;
   coupon_code?: string;
-  pdf_url?: string;
+  pdf_url?: string | null;
+  pdf_status?: PdfStatus;
   points_remaining?: number;
   redemptions?: Redemption[];
   total_points_used?: number;
@@ -319,8 +364,30 @@ export interface ActivePromotion {
   start_time?: string;
   end_time?: string;
   ends_in_seconds?: number;
+  ends_at?: string | null;
+  // When the active promotion next starts or ends; responses are cacheable until then
+  next_change_at?: string | null;
 }
 
+// Seconds left in an active promotion. Prefers the absolute ends_at so a
+// cached (304-revalidated) response still yields an accurate countdown.
+export const secondsUntilPromotionEnds = (promo: ActivePromotion): number | null => {
+  if (promo.ends_at) {
+    const endsAt = Date.parse(promo.ends_at);
+    if (!Number.isNaN(endsAt)) {
+      return Math.max(0, Math.floor((endsAt - Date.now()) / 1000));
+    }
+  }
+  return typeof promo.ends_in_seconds === 'number' ? promo.ends_in_seconds : null;
+};
+
+// Idempotency keys let the server replay a retried redeem/checkout/score
+// submission instead of running it twice; reuse the same key across retries
+export const newIdempotencyKey = (): string =>
+  (typeof crypto !== 'undefined' && 'randomUUID' in crypto)
+    ? crypto.randomUUID()
+    : `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+
 // API Functions
 
 // Voucher APIs
@@ -363,6 +430,36 @@ export const voucherApi = {
     return response.json();
   },
 
+  // Get several vouchers in one request; unknown ids come back with found: false
+  getVouchersBatch: async (voucherIds: number[]): Promise<VoucherBatchItem[]> => {
+    const response = await fetch(`${API_BASE_URL}/accounts/vouchers/batch/?ids=${voucherIds.join(',')}`, {
+      headers: getAuthHeaders(),
+    });
+    
+    if (!response.ok) {
+      throw new Error('Failed to fetch vouchers');
+    }
+    
+    const data = await response.json();
+    return data.results;
+  },
+
+  // Get sidebar counts per category, points bucket and featured flag
+  getFacets: async (category?: string, search?: string): Promise<VoucherFacets> => {
+    const params = new URLSearchParams();
+    if (category) params.append('category', category);
+    if (search) params.append('search', search);
+    const response = await fetch(`${API_BASE_URL}/accounts/vouchers/facets/?${params}`, {
+      headers: getAuthHeaders(),
+    });
+    
+    if (!response.ok) {
+      throw new Error('Failed to fetch voucher facets');
+    }
+    
+    return response.json();
+  },
+
   // Get voucher categories
   getCategories: async (): Promise<VoucherCategory[]> => {
     const response = await fetch(`${API_BASE_URL}/accounts/categories/`, {
@@ -507,12 +604,29 @@ export const cartApi = {
     
     return data;
   },
+
+  // Apply several add/set/remove operations atomically; returns the updated cart
+  applyBatch: async (operations: CartOperation[], idempotencyKey: string = newIdempotencyKey()): Promise<Cart> => {
+    const response = await fetch(`${API_BASE_URL}/accounts/cart/batch/`, {
+      method: 'POST',
+      headers: { ...getAuthHeaders(), 'Idempotency-Key': idempotencyKey },
+      body: JSON.stringify({ operations }),
+    });
+    
+    const data = await response.json();
+    
+    if (!response.ok) {
+      throw new Error(data.error || 'Failed to update cart');
+    }
+    
+    return data;
+  },
 };
 
 // Redemption APIs
 export const redemptionApi = {
   // Redeem a single voucher
-  redeemVoucher: async (voucherId: number, quantity: number = 1): Promise<RedemptionResponse> => {
+  redeemVoucher: async (voucherId: number, quantity: number = 1, idempotencyKey: string = newIdempotencyKey(), admissionTicket?: string): Promise<RedemptionResponse> => {
     console.log('redeemVoucher called with:', { voucherId, quantity });
     
     const headers = getAuthHeaders();
@@ -521,11 +635,15 @@ export const redemptionApi = {
     try {
       const authHeaders: Record<string, string> = {
         'Content-Type': 'application/json',
+        'Idempotency-Key': idempotencyKey,
       };
       
       if ((headers as any).Authorization) {
         authHeaders['Authorization'] = (headers as any).Authorization;
       }
+      if (admissionTicket) {
+        authHeaders['Admission-Ticket'] = admissionTicket;
+      }
       
       const response = await fetch(`${API_BASE_URL}/accounts/redeem/`, {
         method: 'POST',
@@ -554,11 +672,42 @@ export const redemptionApi = {
     }
   },
 
+  // Join a busy voucher's waiting room; redeem with the ticket once admitted
+  joinRedemptionQueue: async (voucherId: number): Promise<AdmissionTicket> => {
+    const response = await fetch(`${API_BASE_URL}/accounts/vouchers/${voucherId}/queue/`, {
+      method: 'POST',
+      headers: getAuthHeaders(),
+    });
+    
+    const data = await response.json();
+    
+    if (!response.ok) {
+      throw new Error(data.error || 'Failed to join the queue');
+    }
+    
+    return data;
+  },
+
+  // Poll a waiting-room ticket's position
+  getQueuePosition: async (voucherId: number, ticket: string): Promise<AdmissionTicket> => {
+    const response = await fetch(`${API_BASE_URL}/accounts/vouchers/${voucherId}/queue/?ticket=${encodeURIComponent(ticket)}`, {
+      headers: getAuthHeaders(),
+    });
+    
+    const data = await response.json();
+    
+    if (!response.ok) {
+      throw new Error(data.error || 'Failed to check queue position');
+    }
+    
+    return data;
+  },
+
   // Checkout entire cart
-  checkoutCart: async (): Promise<RedemptionResponse> => {
+  checkoutCart: async (idempotencyKey: string = newIdempotencyKey()): Promise<RedemptionResponse> => {
     const response = await fetch(`${API_BASE_URL}/accounts/checkout/`, {
       method: 'POST',
-      headers: getAuthHeaders(),
+      headers: { ...getAuthHeaders(), 'Idempotency-Key': idempotencyKey },
     });
     
     const data = await response.json();
@@ -571,7 +720,7 @@ export const redemptionApi = {
   },
 
   // Download voucher PDF
-  downloadVoucherPdf: async (redemptionId: string): Promise<{ pdf_url: string }> => {
+  downloadVoucherPdf: async (redemptionId: string): Promise<{ pdf_url: string | null; pdf_status: PdfStatus }> => {
     const response = await fetch(`${API_BASE_URL}/accounts/redemptions/${redemptionId}/pdf/`, {
       headers: getAuthHeaders(),
     });
@@ -585,18 +734,27 @@ export const redemptionApi = {
     return data;
   },
 
-  // Serve voucher PDF directly
-  serveVoucherPdf: async (redemptionId: string): Promise<Blob> => {
+  // Serve voucher PDF directly, waiting while the worker renders it (202 responses)
+  serveVoucherPdf: async (redemptionId: string, maxWaitMs: number = 60000): Promise<Blob> => {
     console.log(`Requesting PDF for redemption ID: ${redemptionId}`);
     const url = `${API_BASE_URL}/accounts/redemptions/${redemptionId}/serve/`;
     console.log(`PDF URL: ${url}`);
     
-    const response = await fetch(url, {
-      headers: getAuthHeaders(),
-    });
+    const deadline = Date.now() + maxWaitMs;
+    let delayMs = 500;
+    let response = await fetch(url, { headers: getAuthHeaders() });
+    while (response.status === 202 && Date.now() < deadline) {
+      await new Promise((resolve) => setTimeout(resolve, delayMs));
+      delayMs = Math.min(delayMs * 2, 5000);
+      response = await fetch(url, { headers: getAuthHeaders() });
+    }
     
     console.log(`PDF response status: ${response.status}`);
     
+    if (response.status === 202) {
+      throw new Error('PDF is still being generated. Please try again shortly.');
+    }
+    
     if (!response.ok) {
       const errorData = await response.json();
       console.error(`PDF serve error:`, errorData);